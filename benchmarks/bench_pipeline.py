@@ -0,0 +1,117 @@
+"""
+Сквозной бенчмарк конвейера RTDS -> Kafka -> historian без ПЛК, Kafka и PostgreSQL.
+
+Для каждого числа тегов:
+- этап RTDS (pipeline_rtds.py, каталог rtds): ConnectorTest в нагрузочном режиме,
+  цикл сканирования, запись в SQLite, producer в топик в памяти
+- этап historian (pipeline_historian.py, каталог historian): разбор сообщений топика
+  и запись пачек консумера в SQLite
+
+Этапы работают в отдельных процессах: у сервисов одинаковые имена пакетов (store, models, metrics).
+Для каждого этапа считаются точки в секунду и длительность одного вызова этапа (call_p50/p99/max, мс;
+вызов обрабатывает пачку точек, это не задержка отдельной точки), результат - JSON для сравнения между релизами.
+
+Пример запуска из корня репозитория:
+    python benchmarks/bench_pipeline.py --tags 1000,10000 --cycles 20 --wire-format binary --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.join(ROOT, 'benchmarks')
+STAGES = ['connector_read', 'scan_loop', 'store_write', 'producer_send', 'historian_deserialize', 'historian_insert']
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def stage_stats(samples):
+    if not samples:
+        return None
+    points = sum(count for count, _ in samples)
+    durations = [duration for _, duration in samples]
+    return {
+        'calls': len(samples),
+        'points': points,
+        'points_per_sec': round(points / sum(durations)) if sum(durations) else None,
+        'call_p50_ms': round(percentile(durations, 0.5) * 1000, 3),
+        'call_p99_ms': round(percentile(durations, 0.99) * 1000, 3),
+        'call_max_ms': round(max(durations) * 1000, 3),
+    }
+
+
+def run_stage(script, cwd, env, args):
+    result = subprocess.run([sys.executable, os.path.join(BENCHMARKS, script), *args],
+                            cwd=os.path.join(ROOT, cwd), env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f'{script} failed: {result.stderr[-2000:]}')
+    # последняя строка stdout - результат этапа, выше может быть вывод логгеров
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench(tags, args):
+    work_dir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    topic = os.path.join(work_dir, 'topic.bin')
+    env = dict(os.environ, LOG_LEVEL='WARNING', KAFKA_WIRE_FORMAT=args.wire_format)
+
+    try:
+        rtds = run_stage('pipeline_rtds.py', 'rtds',
+                         dict(env, STORE_DB_URL=f'sqlite:///{os.path.join(work_dir, "rtds.db")}'),
+                         ['--tags', str(tags), '--cycles', str(args.cycles), '--cycle', str(args.cycle), '--topic', topic])
+        historian = run_stage('pipeline_historian.py', 'historian',
+                              dict(env, STORE_DB_URL=f'sqlite:///{os.path.join(work_dir, "historian.db")}'),
+                              ['--topic', topic])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    samples = {**rtds['samples'], **historian['samples']}
+    return {
+        'tags': tags,
+        'cycles': args.cycles,
+        'messages': rtds['messages'],
+        'stages': {stage: stage_stats(samples.get(stage)) for stage in STAGES},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tags', default='1000,10000', help='comma separated tag counts')
+    parser.add_argument('--cycles', type=int, default=20, help='scan cycles per run')
+    parser.add_argument('--cycle', type=float, default=1.0, help='connector cycle, seconds (signal phase step)')
+    parser.add_argument('--wire-format', default='binary', choices=['json', 'binary'])
+    parser.add_argument('--output', help='write JSON to file')
+    args = parser.parse_args()
+
+    result = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'wire_format': args.wire_format,
+        'runs': [bench(int(tags), args) for tags in args.tags.split(',')],
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
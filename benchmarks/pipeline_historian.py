@@ -0,0 +1,66 @@
+"""
+Этап historian сквозного бенчмарка: сообщения топика из файла -> deserialize_message -> store.store.
+
+Пачки набираются как в консумере: по CONSUMER_BATCH_ROWS значений.
+Запускается из bench_pipeline.py в каталоге historian, таблицы истории создаются в SQLite,
+результат - JSON с замерами в stdout.
+"""
+import argparse
+import json
+import logging
+import struct
+import sys
+import time
+
+sys.path.extend(['.', '..'])
+
+from store import sqldb as store
+import app
+
+MESSAGE_SIZE = struct.Struct('<I')
+
+
+def read_messages(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        size = MESSAGE_SIZE.unpack_from(data, offset)[0]
+        offset += MESSAGE_SIZE.size
+        yield data[offset:offset + size]
+        offset += size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--topic', required=True, help='file with topic messages')
+    args = parser.parse_args()
+
+    app.log = logging.getLogger('kafka_consumer')
+    store.init_db()
+    store.Base.metadata.create_all(store.engine)
+
+    samples = {'historian_deserialize': [], 'historian_insert': []}
+    items = []
+
+    def flush():
+        start_time = time.perf_counter()
+        store.store(items)
+        samples['historian_insert'].append((len(items), time.perf_counter() - start_time))
+        items.clear()
+
+    for message in read_messages(args.topic):
+        start_time = time.perf_counter()
+        messages = app.deserialize_message(message)
+        samples['historian_deserialize'].append((len(messages), time.perf_counter() - start_time))
+        items.extend(messages)
+        if len(items) >= app.CONSUMER_BATCH_ROWS:
+            flush()
+    if items:
+        flush()
+
+    print(json.dumps({'samples': samples}))
+
+
+if __name__ == '__main__':
+    main()
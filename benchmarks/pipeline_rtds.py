@@ -0,0 +1,166 @@
+"""
+Этап RTDS сквозного бенчмарка: ConnectorTest -> цикл сканирования -> хранилище SQLite -> producer.
+
+Kafka заменена топиком в памяти: сообщения producer подтверждаются сразу и
+в конце пишутся в файл (длина I + тело) для этапа historian.
+Запускается из bench_pipeline.py в каталоге rtds, результат - JSON с замерами в stdout.
+"""
+import argparse
+import json
+import queue
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.extend(['.', '..'])
+
+from sqlalchemy.orm import Session
+from loggers import logger
+from models.value_batch import TagDirectory
+from store import sqldb as store
+from store.engine import get_engine
+from producers import kafka_producer as producer
+import app
+
+MESSAGE_SIZE = struct.Struct('<I')
+# сколько ждать пачку цикла в очереди хранилища, сек
+STORE_QUEUE_TIMEOUT = 10
+
+
+class Metadata:
+    partition = 0
+    offset = 0
+
+
+class LocalFuture:
+    """
+    Отправка, подтверждённая сразу.
+    """
+
+    def add_callback(self, callback):
+        callback(Metadata())
+        return self
+
+    def add_errback(self, errback):
+        return self
+
+
+class LocalTopic:
+    """
+    Замена KafkaProducer: сообщения топика в памяти процесса.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, topic, value, partition=None):
+        self.messages.append(producer.serialize(value))
+        return LocalFuture()
+
+    def partitions_for(self, topic):
+        return {0}
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def add_sample(samples, stage, points, duration):
+    samples.setdefault(stage, []).append((points, duration))
+
+
+def create_config(tags, cycle):
+    store.init_db()
+    with Session(get_engine()) as session:
+        session.add(store.Connector(
+            id='bench',
+            cycle=cycle,
+            is_read_only=True,
+            connection_string=f'connector=ConnectorTest;stress_tags={tags};stress_log=1',
+            description='pipeline benchmark',
+            updated_at=datetime.now(timezone.utc),
+        ))
+        session.commit()
+
+
+def send_history(samples):
+    """
+    Отправить в топик всю записанную историю.
+    """
+    while True:
+        cursor_id = producer.cursor_id
+        start_time = time.perf_counter()
+        producer.send_history_batch()
+        duration = time.perf_counter() - start_time
+        if producer.cursor_id == cursor_id:
+            return
+        add_sample(samples, 'producer_send', producer.in_flight[-1].rows_count, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tags', type=int, required=True)
+    parser.add_argument('--cycles', type=int, required=True)
+    parser.add_argument('--cycle', type=float, required=True)
+    parser.add_argument('--topic', required=True, help='file for topic messages')
+    args = parser.parse_args()
+
+    create_config(args.tags, args.cycle)
+    app.load_config()
+    connector = app.connectors['bench']
+    # очередь в процессе: коннектор читается в том же процессе, что и цикл сканирования
+    connector.read_queue = queue.Queue()
+
+    producer.log = logger.get_logger('producer')
+    producer.producer = LocalTopic()
+    producer.init()
+
+    samples = {}
+    names = []
+    batch = []
+    currents = {}
+    for _ in range(args.cycles):
+        start_time = time.perf_counter()
+        connector.read()
+        connector._read_done()
+        add_sample(samples, 'connector_read', len(connector.tags), time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        app.scan_cycle()
+        add_sample(samples, 'scan_loop', len(connector.tags), time.perf_counter() - start_time)
+
+        # empty() очереди mp.Queue бывает истинным, пока пачка ещё в потоке отправки,
+        # поэтому ждём все значения цикла: по одному на тег коннектора
+        received = 0
+        while received < len(connector.tags):
+            try:
+                item = app.store_queue.get(timeout=STORE_QUEUE_TIMEOUT)
+            except queue.Empty:
+                raise Exception(f'store queue: {received} of {len(connector.tags)} values received in {STORE_QUEUE_TIMEOUT} sec')
+            if isinstance(item, TagDirectory):
+                names = item.names
+                continue
+            start_time = time.perf_counter()
+            values = store.read_values(item, names)
+            store.add_values(values, batch, currents)
+            store.flush_values(batch, currents)
+            add_sample(samples, 'store_write', len(values), time.perf_counter() - start_time)
+            received += len(values)
+
+        send_history(samples)
+
+    producer.close_resources()
+    with open(args.topic, 'wb') as f:
+        for message in producer.producer.messages:
+            f.write(MESSAGE_SIZE.pack(len(message)))
+            f.write(message)
+
+    app.log_queue.cancel_join_thread()
+    print(json.dumps({'messages': len(producer.producer.messages), 'samples': samples}))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
 import argparse
-from pyModbusTCP.server import ModbusServer, DataBank
+import math
+import random
+import threading
+import time
+from array import array
+from pyModbusTCP.server import ModbusServer, DataBank, DataHandler
+from pyModbusTCP.constants import EXP_NONE, EXP_DATA_ADDRESS, EXP_SLAVE_DEVICE_BUSY, EXP_GATEWAY_TARGET_DEVICE_FAILED_TO_RESPOND
 from datetime import datetime
 import logging
 
-logging.basicConfig(level='DEBUG')
 log = logging.getLogger('ModbusEmulator')
 
+ADDRESS_SPACE = 0x10000
+PATTERNS = ['static', 'counter', 'saw', 'sin', 'random']
+
 class MyDataBank(DataBank):
     """A custom ModbusServerDataBank for override get_holding_registers method."""
 
@@ -59,15 +67,226 @@ class MyDataBank(DataBank):
 #            self._hregs[address + i] = value
         return True
 
+
+class SignalBank(DataBank):
+    """
+    Все 65536 адресов каждой области выделены заранее, сигнал пишется в первые count адресов
+    всех областей одним срезом под блокировкой области.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    def fill(self, words, bits):
+        count = len(words)
+        with self._h_regs_lock:
+            self._h_regs[:count] = words
+        with self._i_regs_lock:
+            self._i_regs[:count] = words
+        with self._coils_lock:
+            self._coils[:count] = bits
+        with self._d_inputs_lock:
+            self._d_inputs[:count] = bits
+
+
+class SignalPattern(threading.Thread):
+    """
+    Поток обновления банков по шаблону сигнала. Значение адреса i - элемент таблицы одного периода,
+    сдвинутой по времени, поэтому обновление - это поворот готового списка, а не расчёт каждого адреса.
+    """
+
+    def __init__(self, banks, pattern, count, period, update_interval):
+        super().__init__(daemon=True)
+        self.banks = banks
+        self.pattern = pattern
+        self.count = count
+        self.period = period
+        self.update_interval = update_interval
+        self.stop_event = threading.Event()
+        if pattern == 'sin':
+            self.table = [int(32767.5 + 32767 * math.sin(2 * math.pi * i / count)) for i in range(count)]
+        elif pattern == 'saw':
+            self.table = [i * 0xffff // count for i in range(count)]
+        else:
+            self.table = [i & 0xffff for i in range(count)]
+        self.ticks = 0
+
+    def words(self):
+        if self.pattern == 'random':
+            return array('H', random.randbytes(2 * self.count)).tolist()
+        if self.pattern == 'counter':
+            shift = self.ticks % self.count
+        elif self.pattern in ('sin', 'saw'):
+            shift = int(time.time() % self.period / self.period * self.count)
+        else:
+            shift = 0
+        return self.table[shift:] + self.table[:shift]
+
+    def update(self):
+        words = self.words()
+        bits = [word >= 0x8000 for word in words]
+        for bank in self.banks:
+            bank.fill(words, bits)
+        self.ticks += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.update_interval):
+            self.update()
+
+
+class EmulatorDataHandler(DataHandler):
+    """
+    Обработчик запросов одного порта: банк по unit id запроса, задержка ответа и ошибки с заданной вероятностью.
+    Каждое соединение pyModbusTCP обслуживается своим потоком, задержка не блокирует другие соединения.
+    """
+
+    def __init__(self, banks, latency=0.0, jitter=0.0, error_rate=0.0, error_code=EXP_SLAVE_DEVICE_BUSY):
+        super().__init__(data_bank=next(iter(banks.values())))
+        self.banks = banks
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        # счётчики для отчёта о нагрузке, без блокировки - приблизительные
+        self.requests = 0
+        self.words = 0
+        self.errors = 0
+
+    def _bank(self, srv_info):
+        """
+        Банк unit id запроса, None - ответ об ошибке.
+        """
+        self.requests += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return None, DataHandler.Return(exp_code=self.error_code)
+        bank = self.banks.get(srv_info.recv_frame.mbap.unit_id)
+        if bank is None:
+            self.errors += 1
+            return None, DataHandler.Return(exp_code=EXP_GATEWAY_TARGET_DEVICE_FAILED_TO_RESPOND)
+        return bank, None
+
+    def _read(self, get, address, count, srv_info):
+        bank, error = self._bank(srv_info)
+        if error:
+            return error
+        data = get(bank, address, count)
+        if data is None:
+            return DataHandler.Return(exp_code=EXP_DATA_ADDRESS)
+        self.words += count
+        return DataHandler.Return(exp_code=EXP_NONE, data=data)
+
+    def _write(self, set_, address, values, srv_info):
+        bank, error = self._bank(srv_info)
+        if error:
+            return error
+        if not set_(bank, address, values, srv_info):
+            return DataHandler.Return(exp_code=EXP_DATA_ADDRESS)
+        self.words += len(values)
+        return DataHandler.Return(exp_code=EXP_NONE)
+
+    def read_coils(self, address, count, srv_info):
+        return self._read(DataBank.get_coils, address, count, srv_info)
+
+    def read_d_inputs(self, address, count, srv_info):
+        return self._read(DataBank.get_discrete_inputs, address, count, srv_info)
+
+    def read_h_regs(self, address, count, srv_info):
+        return self._read(DataBank.get_holding_registers, address, count, srv_info)
+
+    def read_i_regs(self, address, count, srv_info):
+        return self._read(DataBank.get_input_registers, address, count, srv_info)
+
+    def write_coils(self, address, bits_l, srv_info):
+        return self._write(DataBank.set_coils, address, bits_l, srv_info)
+
+    def write_h_regs(self, address, words_l, srv_info):
+        return self._write(DataBank.set_holding_registers, address, words_l, srv_info)
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def run_clock(args):
+    # прежний режим: 6 регистров с текущей датой и временем
+    server = ModbusServer(host=args.host, port=args.port, data_bank=MyDataBank())
+    log.info(f"ModbusEmilitor server started on {args.host}:{args.port}")
+    server.start()
+
+
+def run_bank(args):
+    ports = parse_list(args.ports) if args.ports else [args.port]
+    units = parse_list(args.units)
+    count = min(args.signal_count, ADDRESS_SPACE)
+
+    handlers = {}
+    servers = []
+    banks = []
+    for port in ports:
+        port_banks = {unit: SignalBank() for unit in units}
+        banks.extend(port_banks.values())
+        handlers[port] = EmulatorDataHandler(port_banks, args.latency_ms / 1000, args.jitter_ms / 1000,
+                                             args.error_rate, args.error_code)
+        servers.append(ModbusServer(host=args.host, port=port, no_block=True, data_hdl=handlers[port]))
+
+    pattern = SignalPattern(banks, args.pattern, count, args.period, args.update_ms / 1000)
+    pattern.update()
+    pattern.start()
+    for server in servers:
+        server.start()
+    log.info(f'ModbusEmilitor bank mode started on {args.host}, ports: {ports}, units: {units}, '
+             f'pattern: {args.pattern}, signal addresses: {count}, latency: {args.latency_ms} ms, error rate: {args.error_rate}')
+
+    try:
+        last_time = time.time()
+        last_counts = {port: (0, 0, 0) for port in ports}
+        while True:
+            time.sleep(args.stats_sec)
+            now = time.time()
+            for port, handler in handlers.items():
+                requests, words, errors = handler.requests, handler.words, handler.errors
+                last_requests, last_words, last_errors = last_counts[port]
+                log.info(f'port {port}: {(requests - last_requests) / (now - last_time):.0f} req/s, '
+                         f'{(words - last_words) / (now - last_time):.0f} words/s, errors: {errors - last_errors}')
+                last_counts[port] = (requests, words, errors)
+            last_time = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pattern.stop_event.set()
+        for server in servers:
+            server.stop()
+
+
 if __name__ == '__main__':
-    log.info("Starting ModbusEmilitor server...")
     # parse args
     parser = argparse.ArgumentParser()
     parser.add_argument('-H', '--host', type=str, default='0.0.0.0', help='Host (default: localhost)')
     parser.add_argument('-p', '--port', type=int, default=5502, help='TCP port (default: 502)')
+    parser.add_argument('--mode', choices=['clock', 'bank'], default='clock',
+                        help='clock - 6 date/time registers, bank - full 65536 address banks with signal patterns')
+    parser.add_argument('--ports', type=str, help='bank mode: comma separated TCP ports, each port is a separate PLC')
+    parser.add_argument('--units', type=str, default='1', help='bank mode: comma separated unit ids served on each port')
+    parser.add_argument('--pattern', choices=PATTERNS, default='sin', help='bank mode: signal pattern')
+    parser.add_argument('--signal-count', type=int, default=ADDRESS_SPACE, help='bank mode: addresses updated by pattern')
+    parser.add_argument('--period', type=float, default=60, help='bank mode: sin/saw period, seconds')
+    parser.add_argument('--update-ms', type=float, default=100, help='bank mode: pattern update interval')
+    parser.add_argument('--latency-ms', type=float, default=0, help='bank mode: response delay')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='bank mode: random extra delay up to')
+    parser.add_argument('--error-rate', type=float, default=0, help='bank mode: share of requests answered with exception')
+    parser.add_argument('--error-code', type=int, default=EXP_SLAVE_DEVICE_BUSY, help='bank mode: modbus exception code')
+    parser.add_argument('--stats-sec', type=float, default=10, help='bank mode: load report interval')
+    parser.add_argument('--log-level', type=str, default='DEBUG')
     args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    log.info("Starting ModbusEmilitor server...")
     # init modbus server and start it
-    server = ModbusServer(host=args.host, port=args.port, data_bank=MyDataBank())
-    log.info(f"ModbusEmilitor server started on {args.host}:{args.port}")
-    server.start()
+    if args.mode == 'bank':
+        run_bank(args)
+    else:
+        run_clock(args)
     log.info("end of ModbusEmilitor server")
@@ -2,9 +2,13 @@
 
 import os, sys
 import json
+import signal
+import queue
+import multiprocessing as mp
 from typing import List
 import logging
 from kafka import KafkaConsumer
+from kafka.structs import OffsetAndMetadata, TopicPartition
 import time
 
 sys.path.extend(['.','..'])
@@ -12,6 +16,7 @@ sys.path.extend(['.','..'])
 # Подключение к вашим модулям
 from store import sqldb as store
 from models.history_message import HistoryMessage
+from models import wire_format
 from metrics import server as metrics
 from dotenv import load_dotenv
 
@@ -21,15 +26,28 @@ load_dotenv()
 KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092').split(',')
 KAFKA_TOPIC = os.getenv('KAFKA_TOPIC', 'history_data')
 KAFKA_GROUP_ID = os.getenv('KAFKA_GROUP_ID', 'history_consumer')
-KAFKA_AUTO_COMMIT_INTERVAL_MS = int(os.getenv('KAFKA_AUTO_COMMIT_INTERVAL_MS', '5000'))
 KAFKA_SESSION_TIMEOUT_MS = int(os.getenv('KAFKA_SESSION_TIMEOUT_MS', '10000'))
+# Пачка записи в БД: не больше CONSUMER_BATCH_ROWS значений и не дольше CONSUMER_LINGER_MS ожидания
+CONSUMER_BATCH_ROWS = int(os.getenv('CONSUMER_BATCH_ROWS', '5000'))
+CONSUMER_LINGER_MS = int(os.getenv('CONSUMER_LINGER_MS', '500'))
+# Пауза перед повторным чтением пачки после ошибки записи
+CONSUMER_RETRY_BACKOFF_MS = int(os.getenv('CONSUMER_RETRY_BACKOFF_MS', '1000'))
+
+# Режим супервизора: число процессов-консумеров одной группы, 0 - консумер в текущем процессе
+HISTORIAN_WORKERS = int(os.getenv('HISTORIAN_WORKERS', '0'))
+# Пауза перед перезапуском упавшего воркера
+HISTORIAN_RESTART_DELAY_SEC = float(os.getenv('HISTORIAN_RESTART_DELAY_SEC', '5'))
+# Сколько ждать завершения воркеров при остановке, затем они снимаются принудительно
+HISTORIAN_STOP_TIMEOUT_SEC = float(os.getenv('HISTORIAN_STOP_TIMEOUT_SEC', '30'))
+METRICS_PORT = int(os.getenv('METRICS_PORT', '4000'))
 
 
 def deserialize_message(value: bytes) -> List[HistoryMessage]:
     """
-    Десериализует JSON-сообщение в список объектов HistoryMessage.
+    Десериализует сообщение в список объектов HistoryMessage.
     
-    Ожидается, что сообщение — это JSON-массив:
+    Сообщение - двоичная пачка models/wire_format.py (первый байт - версия формата)
+    или JSON-массив:
     [
         {"tg": "...", "tm": "...", ...},
         ...
@@ -37,6 +55,12 @@ def deserialize_message(value: bytes) -> List[HistoryMessage]:
     """    
     try:
         start_time = time.time()
+        if wire_format.is_binary(value):
+            # порядок полей кортежа совпадает с HistoryMessage
+            messages = [HistoryMessage(*row) for row in wire_format.decode_batch(value)]
+            metrics.observe(metrics.MetricEnum.CONSUMER_DURATION, time.time() - start_time, ["deserialize_message", "ok"])
+            return messages
+
         data = json.loads(value.decode('utf-8'))
         if isinstance(data, str):            
             data = json.loads(data.strip('"'))
@@ -57,69 +81,221 @@ def deserialize_message(value: bytes) -> List[HistoryMessage]:
                 var_value=item.get('vv')
             )
             messages.append(msg)
-        metrics.CONSUMER_DURATION.labels("deserialize_message","ok").observe(time.time() - start_time)
+        metrics.observe(metrics.MetricEnum.CONSUMER_DURATION, time.time() - start_time, ["deserialize_message", "ok"])
         return messages
     except Exception as e:
         log.error(f"Failed to deserialize message: {e}", exc_info=True)
-        metrics.CONSUMER_DURATION.labels("deserialize_message","error").observe(time.time() - start_time)
+        metrics.observe(metrics.MetricEnum.CONSUMER_DURATION, time.time() - start_time, ["deserialize_message", "error"])
         return []
 
 
-def start_consumer():
-    """Запускает Kafka Consumer для чтения и сохранения данных."""
+class ConsumerBatch:
+    """
+    Пачка значений из нескольких сообщений Kafka и их смещения по партициям.
+    """
+
+    def __init__(self):
+        self.items: List[HistoryMessage] = []
+        self.first_offsets = {}
+        self.next_offsets = {}
+        self.start_time = None
+
+    def add(self, message, items: List[HistoryMessage]):
+        if self.start_time is None:
+            self.start_time = time.time()
+        partition = (message.topic, message.partition)
+        self.first_offsets.setdefault(partition, message.offset)
+        self.next_offsets[partition] = message.offset + 1
+        self.items.extend(items)
+
+    def is_empty(self):
+        return not self.next_offsets
+
+    def is_ready(self):
+        if self.is_empty():
+            return False
+        return (len(self.items) >= CONSUMER_BATCH_ROWS
+                or (time.time() - self.start_time) * 1000 >= CONSUMER_LINGER_MS)
+
+    def linger_left_ms(self):
+        if self.is_empty():
+            return CONSUMER_LINGER_MS
+        return max(0, int(CONSUMER_LINGER_MS - (time.time() - self.start_time) * 1000))
+
+
+def flush_batch(consumer: KafkaConsumer, batch: ConsumerBatch):
+    """
+    Записать пачку в БД одной транзакцией и только после этого зафиксировать смещения.
+    При ошибке консумер возвращается к первым смещениям пачки и прочитает её снова.
+    """
+    start_time = time.time()
+    try:
+        if batch.items:
+            store.store(batch.items)
+        consumer.commit({
+            TopicPartition(topic, partition): OffsetAndMetadata(offset, None, -1)
+            for (topic, partition), offset in batch.next_offsets.items()
+        })
+        log.debug(f"Stored {len(batch.items)} history messages")
+        metrics.observe(metrics.MetricEnum.CONSUMER_DURATION, time.time() - start_time, ["flush_batch", "ok"])
+    except Exception as e:
+        log.error(f"Failed to store batch of {len(batch.items)} items: {e}")
+        metrics.observe(metrics.MetricEnum.CONSUMER_DURATION, time.time() - start_time, ["flush_batch", "error"])
+        assigned = consumer.assignment()
+        for (topic, partition), offset in batch.first_offsets.items():
+            tp = TopicPartition(topic, partition)
+            # после ребалансировки партицию дочитает другой консумер группы
+            if tp in assigned:
+                consumer.seek(tp, offset)
+        time.sleep(CONSUMER_RETRY_BACKOFF_MS / 1000)
+
+
+def start_consumer(stop_event=None):
+    """
+    Запускает Kafka Consumer для чтения и сохранения данных.
+    stop_event - событие остановки от супервизора, по нему дописывается текущая пачка.
+    """
 
     log.info(f"Kafka consumer starting. KAFKA_BOOTSTRAP_SERVERS={KAFKA_BOOTSTRAP_SERVERS}, KAFKA_TOPIC={KAFKA_TOPIC} ...")
 
     # Инициализируем БД
     store.init_db()
 
-    # Создаём consumer
+    # Создаём consumer, смещения фиксируются вручную после записи пачки в БД
     consumer = KafkaConsumer(
         KAFKA_TOPIC,
         bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
         group_id=KAFKA_GROUP_ID,
         auto_offset_reset='earliest',  # начать с начала, если нет offset earliest | latest
-        enable_auto_commit=True,
-        auto_commit_interval_ms=KAFKA_AUTO_COMMIT_INTERVAL_MS,
+        enable_auto_commit=False,
         session_timeout_ms=KAFKA_SESSION_TIMEOUT_MS,
         value_deserializer=lambda v: v,  # десериализуем вручную
-        consumer_timeout_ms=-1,  # таймаут для проверки остановки
         heartbeat_interval_ms=3000,
     )
 
-    log.info(f"Kafka consumer started. Listening to topic '{KAFKA_TOPIC}'...")
+    log.info(f"Kafka consumer started. Listening to topic '{KAFKA_TOPIC}', batch rows: {CONSUMER_BATCH_ROWS}, linger ms: {CONSUMER_LINGER_MS}")
 
+    batch = ConsumerBatch()
     try:
-        for message in consumer:
-            if message.value is None:
-                log.debug("Received empty message (tombstone)")
-                continue
+        while stop_event is None or not stop_event.is_set():
+            records = consumer.poll(timeout_ms=batch.linger_left_ms())
+            for messages in records.values():
+                for message in messages:
+                    if message.value is None:
+                        log.debug("Received empty message (tombstone)")
+                        batch.add(message, [])
+                        continue
 
-            log.debug(f"Received message with {len(message.value)} bytes")
+                    log.debug(f"Received message with {len(message.value)} bytes")
 
-            # Десериализуем
-            items = deserialize_message(message.value)
-            if not items:
-                log.warning("No valid items in message")
-                continue
+                    # Десериализуем, битое сообщение пропускаем, но его смещение фиксируем
+                    items = deserialize_message(message.value)
+                    if not items:
+                        log.warning("No valid items in message")
+                    batch.add(message, items)
 
-            # Сохраняем пачку
-            try:
-                store.store(items)
-                log.debug(f"Stored {len(items)} history messages")
-            except Exception as e:
-                log.error(f"Failed to store batch: {e}")
-                continue
+            if batch.is_ready():
+                flush_batch(consumer, batch)
+                batch = ConsumerBatch()
+
+        if not batch.is_empty():
+            flush_batch(consumer, batch)
 
     except KeyboardInterrupt:
         log.info("Consumer stopped by user")
     except Exception as e:
         log.critical(f"Consumer crashed: {e}", exc_info=True)
     finally:
-        consumer.close()
+        consumer.close(autocommit=False)
         log.info("Kafka consumer stopped")
 
 
+def worker_run(worker_id, stop_event, metrics_queue):
+    """
+    Процесс-воркер: свой консумер в общей группе (Kafka раздаёт ему часть партиций)
+    и своё соединение с БД.
+    """
+    global log
+
+    # Ctrl+C получает вся группа процессов, остановкой управляет супервизор через stop_event;
+    # SIGTERM только этому воркеру прерывает его без записи текущей пачки
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    log = logging.getLogger(f'kafka_consumer.{worker_id}')
+    metrics.shared_metrics_queue = metrics_queue
+    start_consumer(stop_event)
+
+
+def start_worker(worker_id, stop_event, metrics_queue) -> mp.Process:
+    process = mp.Process(name=f'consumer_{worker_id}', target=worker_run, args=(worker_id, stop_event, metrics_queue), daemon=True)
+    process.start()
+    log.info(f'worker {process.name} started, pid: {process.pid}')
+    return process
+
+
+def start_supervisor(workers_count):
+    """
+    Запускает workers_count процессов-консумеров, перезапускает упавшие,
+    собирает их метрики и отдаёт на /metrics, по SIGTERM/SIGINT останавливает воркеры.
+    """
+    log.info(f'supervisor starting, workers: {workers_count}, metrics port: {METRICS_PORT}')
+
+    stop_event = mp.Event()
+    metrics_queue = mp.Queue()
+
+    def stop(signum, frame):
+        log.info(f'supervisor got signal {signum}, stopping workers')
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    metrics.run(METRICS_PORT)
+
+    workers = [start_worker(i, stop_event, metrics_queue) for i in range(workers_count)]
+    started = [time.time()] * workers_count
+
+    while not stop_event.is_set():
+        for i, process in enumerate(workers):
+            if process.is_alive() or time.time() - started[i] < HISTORIAN_RESTART_DELAY_SEC:
+                continue
+            log.error(f'worker {process.name} died, exitcode: {process.exitcode}, restarting')
+            workers[i] = start_worker(i, stop_event, metrics_queue)
+            started[i] = time.time()
+            metrics.WORKER_RESTARTS.inc()
+        metrics.WORKERS_ALIVE.set(sum(process.is_alive() for process in workers))
+
+        handle_metrics(metrics_queue, timeout=0.5)
+
+    # воркеры дописывают текущие пачки и фиксируют смещения
+    deadline = time.time() + HISTORIAN_STOP_TIMEOUT_SEC
+    for process in workers:
+        while process.is_alive() and time.time() < deadline:
+            handle_metrics(metrics_queue, timeout=0.1)
+            process.join(0)
+        if process.is_alive():
+            log.warning(f'worker {process.name} did not stop in time, terminating')
+            process.terminate()
+            process.join()
+    handle_metrics(metrics_queue, timeout=0)
+    metrics.WORKERS_ALIVE.set(0)
+    log.info('supervisor stopped')
+
+
+def handle_metrics(metrics_queue, timeout):
+    """
+    Зарегистрировать метрики воркеров из очереди, ждать первую не дольше timeout секунд.
+    """
+    try:
+        metric = metrics_queue.get(timeout=timeout) if timeout else metrics_queue.get_nowait()
+        while True:
+            metrics.handle_metric(metric)
+            metric = metrics_queue.get_nowait()
+    except queue.Empty:
+        pass
+
+
 # === Запуск ===
 if __name__ == '__main__':
     logging.basicConfig(
@@ -128,4 +304,7 @@ if __name__ == '__main__':
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     log = logging.getLogger('kafka_consumer')
-    start_consumer()
+    if HISTORIAN_WORKERS > 0:
+        start_supervisor(HISTORIAN_WORKERS)
+    else:
+        start_consumer()
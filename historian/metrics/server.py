@@ -1,4 +1,23 @@
-from prometheus_client import start_http_server, Counter, Histogram
+from enum import Enum
+from typing import Iterable
+from prometheus_client import start_http_server, Counter, Gauge, Histogram
+
+# Очередь метрик воркеров, в режиме супервизора метрики пишутся в неё,
+# а регистрирует их процесс супервизора
+shared_metrics_queue = None
+
+class MetricEnum(Enum):
+    CONSUMER_DURATION=0
+    STORE_DURATION=1
+    STORE_ROWS=2
+
+
+class Metric:
+    def __init__(self, name: MetricEnum, value: float, labels: Iterable[str]=None):
+        self.name = name
+        self.value = value
+        self.labels = labels
+
 
 # метрики консумера
 CONSUMER_DURATION = Histogram(
@@ -17,4 +36,42 @@ STORE_DURATION = Histogram(
     unit='sec',
     buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1)
 )
+STORE_ROWS = Counter(
+    name='store_rows',
+    documentation='rows written to history tables',
+    labelnames=['method']
+)
+
+# метрики супервизора
+WORKERS_ALIVE = Gauge(
+    name='historian_workers_alive',
+    documentation='running consumer worker processes'
+)
+WORKER_RESTARTS = Counter(
+    name='historian_worker_restarts',
+    documentation='consumer worker process restarts'
+)
+
+
+def observe(name: MetricEnum, value: float, labels: Iterable[str]=None):
+    """
+    Зарегистрировать метрику: в процессе воркера - отправить супервизору, иначе - сразу.
+    """
+    if shared_metrics_queue is not None:
+        shared_metrics_queue.put(Metric(name, value, labels))
+    else:
+        handle_metric(Metric(name, value, labels))
+
+
+def handle_metric(metric: Metric):
+    match metric.name:
+        case MetricEnum.CONSUMER_DURATION:
+            CONSUMER_DURATION.labels(*metric.labels).observe(metric.value)
+        case MetricEnum.STORE_DURATION:
+            STORE_DURATION.labels(*metric.labels).observe(metric.value)
+        case MetricEnum.STORE_ROWS:
+            STORE_ROWS.labels(*metric.labels).inc(metric.value)
+
 
+def run(port):
+    start_http_server(port)
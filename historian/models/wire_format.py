@@ -0,0 +1,194 @@
+"""
+Двоичный формат пачки истории для топика RTDS -> historian.
+
+Первый байт сообщения - версия формата. JSON-сообщение начинается с '[' или '"',
+поэтому консумер по первому байту отличает форматы и оба могут жить в топике
+одновременно.
+
+Версия 1, все числа little-endian:
+- заголовок: версия, число тегов в словаре, число строк
+- словарь тегов: для каждого тега длина имени (H), имя в UTF-8, код типа (B)
+- колонки по строкам: индекс тега (I), время в микросекундах от эпохи UTC (q),
+  статус (i), флаг наличия значения (B)
+- колонки значений только для строк с флагом, по типу тега:
+  bool (B), int (q), float (d), остальные - длины (I) и затем UTF-8 строки подряд
+
+Файл одинаковый в rtds/producers и historian/models, сервисы собираются отдельно.
+"""
+import struct
+from datetime import datetime, timedelta, timezone
+
+VERSION_1 = 1
+HEADER = struct.Struct('<BII')
+NAME_HEADER = struct.Struct('<H')
+TYPE_CODE = struct.Struct('<B')
+
+# код типа - индекс в списке, совпадает с TagType в RTDS
+TYPE_NAMES = ['bool', 'int', 'float', 'datetime', 'array', 'str']
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+BOOL, INT, FLOAT = 0, 1, 2
+# колонка строковых значений общая для datetime, array и str
+VAR = 3
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def is_binary(data: bytes) -> bool:
+    return len(data) > 0 and data[0] == VERSION_1
+
+
+def to_micros(tag_time: datetime) -> int:
+    """
+    Время в микросекундах от эпохи, время без зоны считается UTC.
+    """
+    if tag_time.tzinfo is None:
+        return (tag_time - EPOCH) // MICROSECOND
+    return (tag_time - EPOCH_UTC) // MICROSECOND
+
+
+def encode_batch(rows) -> bytes:
+    """
+    rows - кортежи (tag_id, tag_time, tag_type, status, bool_value, int_value, float_value, var_value),
+    tag_time - datetime UTC, tag_type - имя типа.
+    """
+    tags = {}
+    names = bytearray()
+    indexes = []
+    times = []
+    statuses = []
+    has_value = []
+    bools = []
+    ints = []
+    floats = []
+    var_lengths = []
+    var_data = []
+
+    for tag_id, tag_time, tag_type, status, bool_value, int_value, float_value, var_value in rows:
+        index = tags.get(tag_id)
+        if index is None:
+            type_code = TYPE_CODES.get(tag_type)
+            if type_code is None:
+                raise ValueError(f'unsupported tag type: {tag_type}')
+            index = tags[tag_id] = len(tags)
+            raw = tag_id.encode('utf-8')
+            names += NAME_HEADER.pack(len(raw)) + raw + TYPE_CODE.pack(type_code)
+        else:
+            type_code = TYPE_CODES[tag_type]
+
+        indexes.append(index)
+        times.append(to_micros(tag_time))
+        statuses.append(status or 0)
+
+        if type_code == BOOL:
+            value = bool_value
+        elif type_code == INT:
+            value = int_value
+        elif type_code == FLOAT:
+            value = float_value
+        else:
+            value = var_value
+        if value is None:
+            has_value.append(0)
+            continue
+        has_value.append(1)
+        if type_code == BOOL:
+            bools.append(1 if value else 0)
+        elif type_code == INT:
+            ints.append(value)
+        elif type_code == FLOAT:
+            floats.append(value)
+        else:
+            raw = str(value).encode('utf-8')
+            var_lengths.append(len(raw))
+            var_data.append(raw)
+
+    count = len(indexes)
+    return b''.join((
+        HEADER.pack(VERSION_1, len(tags), count),
+        names,
+        struct.pack(f'<{count}I', *indexes),
+        struct.pack(f'<{count}q', *times),
+        struct.pack(f'<{count}i', *statuses),
+        bytes(has_value),
+        bytes(bools),
+        struct.pack(f'<{len(ints)}q', *ints),
+        struct.pack(f'<{len(floats)}d', *floats),
+        struct.pack(f'<{len(var_lengths)}I', *var_lengths),
+        *var_data,
+    ))
+
+
+def decode_batch(data: bytes):
+    """
+    Разобрать пачку в список кортежей
+    (tag_id, tag_time, tag_type, status, bool_value, int_value, float_value, var_value),
+    tag_time - datetime в UTC.
+    """
+    version, tags_count, count = HEADER.unpack_from(data, 0)
+    if version != VERSION_1:
+        raise ValueError(f'unsupported wire format version: {version}')
+    offset = HEADER.size
+
+    names = []
+    types = []
+    for _ in range(tags_count):
+        size = NAME_HEADER.unpack_from(data, offset)[0]
+        offset += NAME_HEADER.size
+        names.append(data[offset:offset + size].decode('utf-8'))
+        offset += size
+        types.append(TYPE_CODE.unpack_from(data, offset)[0])
+        offset += TYPE_CODE.size
+
+    indexes = struct.unpack_from(f'<{count}I', data, offset)
+    offset += 4 * count
+    times = struct.unpack_from(f'<{count}q', data, offset)
+    offset += 8 * count
+    statuses = struct.unpack_from(f'<{count}i', data, offset)
+    offset += 4 * count
+    has_value = data[offset:offset + count]
+    offset += count
+
+    # сколько значений каждого типа, чтобы найти начала колонок
+    counts = [0, 0, 0, 0]
+    for index, flag in zip(indexes, has_value):
+        if flag:
+            counts[min(types[index], VAR)] += 1
+    bools = data[offset:offset + counts[BOOL]]
+    offset += counts[BOOL]
+    ints = struct.unpack_from(f'<{counts[INT]}q', data, offset)
+    offset += 8 * counts[INT]
+    floats = struct.unpack_from(f'<{counts[FLOAT]}d', data, offset)
+    offset += 8 * counts[FLOAT]
+    var_lengths = struct.unpack_from(f'<{counts[VAR]}I', data, offset)
+    offset += 4 * counts[VAR]
+
+    var_values = []
+    for size in var_lengths:
+        var_values.append(data[offset:offset + size].decode('utf-8'))
+        offset += size
+
+    # значения каждого типа идут в колонках в порядке строк
+    next_bool = iter(bools).__next__
+    next_int = iter(ints).__next__
+    next_float = iter(floats).__next__
+    next_var = iter(var_values).__next__
+    type_names = [TYPE_NAMES[type_code] for type_code in types]
+    rows = []
+    append = rows.append
+    for index, micros, status, flag in zip(indexes, times, statuses, has_value):
+        tag_time = EPOCH_UTC + timedelta(0, 0, micros)
+        if not flag:
+            append((names[index], tag_time, type_names[index], status, None, None, None, None))
+            continue
+        type_code = types[index]
+        if type_code == FLOAT:
+            append((names[index], tag_time, 'float', status, None, None, next_float(), None))
+        elif type_code == INT:
+            append((names[index], tag_time, 'int', status, None, next_int(), None, None))
+        elif type_code == BOOL:
+            append((names[index], tag_time, 'bool', status, next_bool() != 0, None, None, None))
+        else:
+            append((names[index], tag_time, type_names[index], status, None, None, None, next_var()))
+    return rows
@@ -1,8 +1,9 @@
 from typing import Optional, Iterable
 from sqlalchemy import create_engine, String, Integer, Boolean, Float, DateTime
-from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from datetime import datetime
 import sys, os, time
+import io
 from dotenv import load_dotenv
 
 sys.path.extend(['.', '..'])
@@ -17,6 +18,8 @@ log = None
 
 SQL_ENGINE_ECHO = os.getenv('STORE_SQL_ENGINE_ECHO', 'false').lower() in ('true', '1', 'on','yes')
 DB_URL = os.getenv('STORE_DB_URL')
+# insert - INSERT пачками, copy - COPY FROM STDIN (только PostgreSQL)
+INGEST_MODE = os.getenv('STORE_INGEST_MODE', 'insert').lower()
 
 engine = None
 
@@ -59,64 +62,126 @@ def init_db():
         raise Exception('DB_URL is not defined')
     engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
 #    Base.metadata.create_all(engine)
-    log.info('database initialized')
+    if INGEST_MODE == 'copy' and engine.dialect.driver != 'psycopg2':
+        log.warning(f'STORE_INGEST_MODE=copy is supported only for postgresql+psycopg2, insert will be used')
+    log.info(f'database initialized, ingest mode: {INGEST_MODE}')
+
+# Порядок колонок в кортежах строк для executemany
+HISTORY_COLUMNS = ['tag_time', 'tag_id', 'status', 'value']
+STRING_COLUMNS = ['tag_time', 'tag_id', 'tag_type', 'status', 'value']
 
 def store(items: Iterable[HistoryMessage]):
-    batch = []    
+    bools = []
+    integers = []
+    floats = []
+    strings = []
     
     if len(items) == 0:
         raise Exception('items is empty')
             
-    # получить значение из очереди если есть
+    # разложить значения по таблицам в виде кортежей
     for item in items:
         if item.tag_type == 'bool':
-            history = HistoryBool(
-                tag_id=item.tag_id,
-                tag_time=item.tag_time,
-                status=item.status,
-                value = item.bool_value
-            )
+            bools.append((item.tag_time, item.tag_id, item.status, item.bool_value))
         elif item.tag_type == 'int':
-            history = HistoryInteger(
-                tag_id=item.tag_id,
-                tag_time=item.tag_time,
-                status=item.status,
-                value = item.int_value
-            )
+            integers.append((item.tag_time, item.tag_id, item.status, item.int_value))
         elif item.tag_type == 'float':
-            history = HistoryFloat(
-                tag_id=item.tag_id,
-                tag_time=item.tag_time,
-                status=item.status,
-                value = item.float_value
-            )
+            floats.append((item.tag_time, item.tag_id, item.status, item.float_value))
         elif item.tag_type in ['str','datetime','array']:
-            history = HistoryString(
-                tag_id=item.tag_id,
-                tag_time=item.tag_time,
-                tag_type=item.tag_type,
-                status=item.status,
-                value = item.var_value
-            )
-        else:
-            continue
-        
-        batch.append(history)                    
+            strings.append((item.tag_time, item.tag_id, item.tag_type, item.status, item.var_value))
                     
-    batch_write(batch)        
-
-def batch_write(batch):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
-    with Session(engine) as session:
-        start_time = time.time()
-        try:
-            session.bulk_save_objects(batch)
-            session.commit()
-            log.debug(f'success stored batch: {len(batch)}')
-            metrics.STORE_DURATION.labels('batch_write','ok').observe(time.time() - start_time)
-        except Exception as e:
-            log.error(f'fail store batch: {len(batch)}, error: {e}')
-            metrics.STORE_DURATION.labels('batch_write','error').observe(time.time() - start_time)
+    batch_write([
+        (HistoryBool, HISTORY_COLUMNS, bools),
+        (HistoryInteger, HISTORY_COLUMNS, integers),
+        (HistoryFloat, HISTORY_COLUMNS, floats),
+        (HistoryString, STRING_COLUMNS, strings),
+    ])
+
+def _executemany(cursor, table, columns, rows, skip_duplicates=False):
+    names = ', '.join(columns)
+    on_conflict = ' ON CONFLICT (tag_time, tag_id) DO NOTHING' if skip_duplicates else ''
+    if engine.dialect.driver == 'psycopg2':
+        # execute_values отправляет строки пачками в многострочном VALUES
+        from psycopg2.extras import execute_values
+        execute_values(cursor, f'INSERT INTO {table} ({names}) VALUES %s{on_conflict}', rows, page_size=len(rows))
+    else:
+        marker = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+        cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({", ".join([marker] * len(columns))}){on_conflict}', rows)
+
+def _csv_field(value):
+    # в CSV для COPY NULL - пустое поле без кавычек, строки всегда в кавычках
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+def _copy(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(map(_csv_field, row)))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+def _copy_write(connection, tables):
+    """
+    Записать пачку через COPY, при дубликатах первичного ключа
+    повторить её через INSERT ... ON CONFLICT DO NOTHING
+    """
+    from psycopg2.errors import UniqueViolation
+
+    try:
+        cursor = connection.cursor()
+        for model, columns, rows in tables:
+            if rows:
+                _copy(cursor, model.__tablename__, columns, rows)
+        cursor.close()
+        connection.commit()
+        return 'copy'
+    except UniqueViolation as e:
+        connection.rollback()
+        log.warning(f'duplicates in batch, fallback to insert: {e}')
+
+    cursor = connection.cursor()
+    for model, columns, rows in tables:
+        if rows:
+            _executemany(cursor, model.__tablename__, columns, rows, skip_duplicates=True)
+    cursor.close()
+    connection.commit()
+    return 'insert_on_conflict'
+
+def batch_write(tables):
+    """
+    Записать строки во все таблицы истории в одной транзакции,
+    tables - список (модель, колонки, строки-кортежи).
+    При ошибке транзакция откатывается и исключение пробрасывается дальше.
+    """
+    start_time = time.time()
+    rows_count = sum(len(rows) for _, _, rows in tables)
+    connection = engine.raw_connection()
+    try:
+        if INGEST_MODE == 'copy' and engine.dialect.driver == 'psycopg2':
+            method = _copy_write(connection, tables)
+        else:
+            # повторно доставленные Kafka сообщения не должны ронять пачку
+            cursor = connection.cursor()
+            for model, columns, rows in tables:
+                if rows:
+                    _executemany(cursor, model.__tablename__, columns, rows, skip_duplicates=True)
+            cursor.close()
+            connection.commit()
+            method = 'insert'
+        log.debug(f'success stored batch: {rows_count}, method: {method}')
+        metrics.observe(metrics.MetricEnum.STORE_ROWS, rows_count, [method])
+        metrics.observe(metrics.MetricEnum.STORE_DURATION, time.time() - start_time, ['batch_write', 'ok'])
+    except Exception as e:
+        connection.rollback()
+        log.error(f'fail store batch: {rows_count}, error: {e}')
+        metrics.observe(metrics.MetricEnum.STORE_DURATION, time.time() - start_time, ['batch_write', 'error'])
+        raise
+    finally:
+        connection.close()
 
 if __name__ == '__main__':
     print('DB_URL=',DB_URL)
@@ -0,0 +1,146 @@
+import json
+import logging
+import threading
+import unittest
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+from kafka.structs import OffsetAndMetadata, TopicPartition
+import app
+
+
+def make_message(offset, rows=1, partition=0, topic='history'):
+    value = json.dumps([{'tg': f'tag_{i}', 'tm': '2026-10-18 12:00:00', 'tp': 'float', 'st': 0, 'fv': float(i)}
+                        for i in range(rows)]).encode('utf-8')
+    return SimpleNamespace(topic=topic, partition=partition, offset=offset, value=value)
+
+
+def make_batch(messages):
+    batch = app.ConsumerBatch()
+    for message in messages:
+        batch.add(message, app.deserialize_message(message.value))
+    return batch
+
+
+class ConsumerBatchMethods(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(app, create=True, log=logging.getLogger('test'), store=mock.Mock(),
+                                      CONSUMER_BATCH_ROWS=3, CONSUMER_LINGER_MS=50, CONSUMER_RETRY_BACKOFF_MS=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_offsets(self):
+        batch = make_batch([make_message(10), make_message(11), make_message(5, partition=1)])
+        self.assertEqual({('history', 0): 10, ('history', 1): 5}, batch.first_offsets)
+        self.assertEqual({('history', 0): 12, ('history', 1): 6}, batch.next_offsets)
+        self.assertEqual(3, len(batch.items))
+
+    def test_ready_by_rows(self):
+        batch = make_batch([make_message(0, rows=2)])
+        self.assertFalse(batch.is_ready())
+        batch.add(make_message(1), [])
+        self.assertFalse(batch.is_ready())
+        message = make_message(2)
+        batch.add(message, app.deserialize_message(message.value))
+        self.assertTrue(batch.is_ready())
+
+    def test_ready_by_linger(self):
+        batch = app.ConsumerBatch()
+        self.assertFalse(batch.is_ready())
+        self.assertEqual(50, batch.linger_left_ms())
+        batch.add(make_message(0), [])
+        self.assertFalse(batch.is_ready())
+        batch.start_time -= 0.06
+        self.assertTrue(batch.is_ready())
+        self.assertEqual(0, batch.linger_left_ms())
+
+    def test_flush_commits_next_offsets(self):
+        consumer = mock.Mock()
+        batch = make_batch([make_message(10), make_message(11), make_message(5, partition=1)])
+        app.flush_batch(consumer, batch)
+
+        app.store.store.assert_called_once_with(batch.items)
+        consumer.commit.assert_called_once_with({
+            TopicPartition('history', 0): OffsetAndMetadata(12, None, -1),
+            TopicPartition('history', 1): OffsetAndMetadata(6, None, -1),
+        })
+        consumer.seek.assert_not_called()
+
+    def test_flush_empty_batch_commits_without_store(self):
+        consumer = mock.Mock()
+        batch = app.ConsumerBatch()
+        batch.add(make_message(3), [])
+        app.flush_batch(consumer, batch)
+        app.store.store.assert_not_called()
+        consumer.commit.assert_called_once_with({TopicPartition('history', 0): OffsetAndMetadata(4, None, -1)})
+
+    def test_failed_store_seeks_assigned_partitions(self):
+        consumer = mock.Mock()
+        # партиция 1 после ребалансировки ушла другому консумеру
+        consumer.assignment.return_value = {TopicPartition('history', 0), TopicPartition('history', 2)}
+        app.store.store.side_effect = Exception('database is down')
+        batch = make_batch([make_message(10), make_message(11), make_message(5, partition=1)])
+
+        app.flush_batch(consumer, batch)
+
+        consumer.commit.assert_not_called()
+        consumer.seek.assert_called_once_with(TopicPartition('history', 0), 10)
+
+
+class ConsumerLoopMethods(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(app, create=True, log=logging.getLogger('test'), store=mock.Mock(),
+                                      KafkaConsumer=mock.Mock(), CONSUMER_BATCH_ROWS=3, CONSUMER_LINGER_MS=60000)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.consumer = app.KafkaConsumer.return_value
+        self.stop_event = threading.Event()
+
+    def poll_results(self, *results):
+        results = list(results)
+
+        def poll(timeout_ms):
+            if not results:
+                self.stop_event.set()
+                return {}
+            return results.pop(0)
+        self.consumer.poll.side_effect = poll
+
+    def stored_rows(self):
+        return [len(call.args[0]) for call in app.store.store.call_args_list]
+
+    def test_flush_at_batch_rows_and_on_stop(self):
+        partition = TopicPartition('history', 0)
+        self.poll_results({partition: [make_message(0, rows=2), make_message(1, rows=2)]},
+                          {partition: [make_message(2)]})
+
+        app.start_consumer(self.stop_event)
+
+        # пачка из 4 значений по CONSUMER_BATCH_ROWS, остаток - при остановке
+        self.assertEqual([4, 1], self.stored_rows())
+        commits = [call.args[0] for call in self.consumer.commit.call_args_list]
+        self.assertEqual([{partition: OffsetAndMetadata(2, None, -1)}, {partition: OffsetAndMetadata(3, None, -1)}], commits)
+        self.consumer.close.assert_called_once_with(autocommit=False)
+
+    def test_flush_after_linger(self):
+        partition = TopicPartition('history', 0)
+        self.poll_results({partition: [make_message(0)]}, {})
+        stopped = []
+        app.store.store.side_effect = lambda items: stopped.append(self.stop_event.is_set())
+
+        with mock.patch.object(app, 'CONSUMER_LINGER_MS', 0):
+            app.start_consumer(self.stop_event)
+
+        # пачка не набрала CONSUMER_BATCH_ROWS, но записана по истечении CONSUMER_LINGER_MS, до остановки
+        self.assertEqual([1], self.stored_rows())
+        self.assertEqual([False], stopped)
+        self.consumer.commit.assert_called_once_with({partition: OffsetAndMetadata(1, None, -1)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import csv
+import io
+import logging
+import unittest
+import sys
+from datetime import datetime
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+from psycopg2.errors import UniqueViolation
+from store import sqldb
+
+
+class FakeCursor:
+
+    def __init__(self):
+        self.sql = None
+        self.data = None
+
+    def copy_expert(self, sql, buffer):
+        self.sql = sql
+        self.data = buffer.read()
+
+    def close(self):
+        pass
+
+
+class CopyCsvMethods(unittest.TestCase):
+
+    def copy(self, rows, columns=sqldb.STRING_COLUMNS):
+        cursor = FakeCursor()
+        sqldb._copy(cursor, 'history_strings', columns, rows)
+        return cursor
+
+    def test_sql(self):
+        cursor = self.copy([(datetime(2026, 1, 1), 'tag', 'str', 0, 'x')])
+        self.assertEqual('COPY history_strings (tag_time, tag_id, tag_type, status, value) FROM STDIN WITH (FORMAT csv)', cursor.sql)
+
+    def test_null_and_empty_string(self):
+        cursor = self.copy([(datetime(2026, 1, 1), 'tag', 'str', 0, None),
+                            (datetime(2026, 1, 1), 'tag', 'str', 0, '')])
+        # NULL - пустое поле без кавычек, пустая строка - в кавычках
+        self.assertEqual(['2026-01-01 00:00:00,"tag","str",0,', '2026-01-01 00:00:00,"tag","str",0,""'],
+                         cursor.data.splitlines())
+
+    def test_round_trip(self):
+        time = datetime(2026, 10, 18, 12, 30, 15, 250000)
+        rows = [
+            (time, 'tag "quoted", comma', 'str', 0, 'line "a"\nline b'),
+            (time, 'array', 'array', -1, '1,2,3'),
+        ]
+        cursor = self.copy(rows)
+        parsed = list(csv.reader(io.StringIO(cursor.data)))
+        self.assertEqual([[str(time), row[1], row[2], str(row[3]), row[4]] for row in rows], parsed)
+
+    def test_values_through_str(self):
+        time = datetime(2026, 10, 18, 12, 30, 15)
+        cursor = self.copy([(time, 'b', 0, True), (time, 'f', 0, float('nan')), (time, 'f', 0, 1.5)], sqldb.HISTORY_COLUMNS)
+        parsed = list(csv.reader(io.StringIO(cursor.data)))
+        self.assertEqual([['2026-10-18 12:30:15', 'b', '0', 'True'],
+                          ['2026-10-18 12:30:15', 'f', '0', 'nan'],
+                          ['2026-10-18 12:30:15', 'f', '0', '1.5']], parsed)
+
+
+class CopyWriteMethods(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(sqldb, 'log', logging.getLogger('test'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicates_fallback_to_insert(self):
+        calls = mock.Mock()
+        cursor = calls.cursor_object
+        cursor.copy_expert.side_effect = UniqueViolation('duplicate key')
+        connection = calls.connection
+        connection.cursor.return_value = cursor
+        rows = [(datetime(2026, 1, 1), 'tag', 0, 1.0)]
+        tables = [(sqldb.HistoryFloat, sqldb.HISTORY_COLUMNS, rows), (sqldb.HistoryBool, sqldb.HISTORY_COLUMNS, [])]
+
+        with mock.patch.object(sqldb, '_executemany', calls.executemany):
+            self.assertEqual('insert_on_conflict', sqldb._copy_write(connection, tables))
+
+        calls.executemany.assert_called_once_with(cursor, 'history_floats', sqldb.HISTORY_COLUMNS, rows, skip_duplicates=True)
+        names = [name for name, _, _ in calls.mock_calls]
+        self.assertLess(names.index('connection.rollback'), names.index('executemany'))
+        self.assertEqual('connection.commit', names[-1])
+
+    def test_copy_commits(self):
+        connection = mock.Mock()
+        connection.cursor.return_value = FakeCursor()
+        tables = [(sqldb.HistoryFloat, sqldb.HISTORY_COLUMNS, [(datetime(2026, 1, 1), 'tag', 0, 1.0)])]
+        with mock.patch.object(sqldb, '_executemany') as executemany:
+            self.assertEqual('copy', sqldb._copy_write(connection, tables))
+        executemany.assert_not_called()
+        connection.commit.assert_called_once()
+        connection.rollback.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import logging
+import multiprocessing as mp
+import threading
+import time
+import unittest
+import sys
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+import app
+from metrics import server as metrics
+
+# воркер падает при первом запуске, создаётся до fork и общий для всех процессов
+crashed = mp.Event()
+
+
+def crashing_worker(worker_id, stop_event, metrics_queue):
+    # метрика воркера уходит супервизору через очередь
+    metrics_queue.put(metrics.Metric(metrics.MetricEnum.STORE_ROWS, 5, ['supervisor_test']))
+    if not crashed.is_set():
+        crashed.set()
+        sys.exit(1)
+    stop_event.wait()
+
+
+def stubborn_worker(worker_id, stop_event, metrics_queue):
+    # не реагирует на stop_event
+    time.sleep(60)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('condition timeout')
+        time.sleep(0.02)
+
+
+class SupervisorMethods(unittest.TestCase):
+
+    def setUp(self):
+        crashed.clear()
+        self.stop_events = []
+        start_worker = app.start_worker
+
+        def start_worker_spy(worker_id, stop_event, metrics_queue):
+            self.stop_events.append(stop_event)
+            process = start_worker(worker_id, stop_event, metrics_queue)
+            self.processes.append(process)
+            return process
+
+        self.processes = []
+        # сигналы ставятся только в главном потоке, супервизор в тесте работает в отдельном
+        patcher = mock.patch.multiple(app, create=True, log=logging.getLogger('test'), start_worker=start_worker_spy,
+                                      HISTORIAN_RESTART_DELAY_SEC=0, HISTORIAN_STOP_TIMEOUT_SEC=5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for target in (mock.patch.object(app.signal, 'signal'), mock.patch.object(metrics, 'run')):
+            target.start()
+            self.addCleanup(target.stop)
+        self.addCleanup(self.kill_workers)
+
+    def kill_workers(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def run_supervisor(self, workers_count):
+        supervisor = threading.Thread(target=app.start_supervisor, args=(workers_count,), daemon=True)
+        supervisor.start()
+        return supervisor
+
+    def stop_supervisor(self, supervisor, timeout):
+        start_time = time.time()
+        self.stop_events[0].set()
+        supervisor.join(timeout)
+        self.assertFalse(supervisor.is_alive())
+        return time.time() - start_time
+
+    def test_restart_dead_worker(self):
+        restarts = metrics.WORKER_RESTARTS._value.get()
+        rows = metrics.STORE_ROWS.labels('supervisor_test')._value.get()
+
+        with mock.patch.object(app, 'worker_run', crashing_worker):
+            supervisor = self.run_supervisor(1)
+            wait_for(lambda: len(self.processes) == 2 and self.processes[1].is_alive())
+            wait_for(lambda: metrics.WORKERS_ALIVE._value.get() == 1)
+            duration = self.stop_supervisor(supervisor, timeout=10)
+
+        self.assertEqual(1, self.processes[0].exitcode)
+        self.assertEqual(restarts + 1, metrics.WORKER_RESTARTS._value.get())
+        # метрики обоих запусков воркера собраны супервизором
+        self.assertEqual(rows + 10, metrics.STORE_ROWS.labels('supervisor_test')._value.get())
+        # воркер завершился сам по stop_event, без снятия по таймауту
+        self.assertEqual(0, self.processes[1].exitcode)
+        self.assertLess(duration, app.HISTORIAN_STOP_TIMEOUT_SEC)
+        self.assertEqual(0, metrics.WORKERS_ALIVE._value.get())
+
+    def test_stop_timeout_terminates_worker(self):
+        with mock.patch.object(app, 'worker_run', stubborn_worker), \
+                mock.patch.object(app, 'HISTORIAN_STOP_TIMEOUT_SEC', 0.3):
+            supervisor = self.run_supervisor(2)
+            wait_for(lambda: len(self.processes) == 2 and all(process.is_alive() for process in self.processes))
+            duration = self.stop_supervisor(supervisor, timeout=10)
+
+        self.assertEqual(2, len(self.processes))
+        for process in self.processes:
+            self.assertFalse(process.is_alive())
+            self.assertLess(process.exitcode, 0)
+        self.assertLess(duration, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
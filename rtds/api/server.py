@@ -2,6 +2,7 @@ import json
 import os
 import sys
 import tempfile
+from datetime import datetime, timezone
 from flask import Flask, Response, request, jsonify, send_file
 from flask_swagger import swagger
 from flask_swagger_ui import get_swaggerui_blueprint
@@ -17,6 +18,8 @@ from loggers import logger
 from configs import config_ods
 from store import sqldb as store
 from models.command import CommandEnum, Command
+from models.tag import get_type_name
+from models.tag_table import TagTable
 
 app = Flask(__name__)
 
@@ -25,6 +28,10 @@ API_PORT = int(os.getenv('API_PORT', '5001'))
 # Очередь для обмена данными между процессами
 API_COMMAND_QUEUE: mp.Queue = None
 
+# Таблица текущих значений в разделяемой памяти
+TAG_TABLE_NAME: str = None
+tag_table: TagTable = None
+
 # Путь для сохранения загруженных файлов
 UPLOAD_FOLDER = "uploads"
 ALLOWED_EXTENSIONS = {"ods"}
@@ -222,6 +229,34 @@ def get_history(start_time, size):
         error_message = err.args[0]
         return {'error': error_message}, 400
 
+def get_tag_table():
+    """
+    Подключиться к таблице тегов, переподключиться после перезагрузки конфигурации
+    """
+    global tag_table
+    if not TAG_TABLE_NAME:
+        return None
+    if tag_table is not None and tag_table.is_retired:
+        tag_table.close()
+        tag_table = None
+    if tag_table is None:
+        try:
+            tag_table = TagTable.attach(TAG_TABLE_NAME)
+        except FileNotFoundError:
+            return None
+    return tag_table
+
+def get_current_from_table(table: TagTable):
+    for index, name in enumerate(table.names):
+        slot = table.read(index)
+        yield {
+            "id": name,
+            "tm": f"{datetime.fromtimestamp(slot.update_time, timezone.utc).replace(tzinfo=None).isoformat()}Z",
+            "tp": get_type_name(slot.type_),
+            "st": slot.status,
+            "vl": slot.value
+        }
+
 @app.route('/api/current', methods=['GET'])
 def get_current():
     """
@@ -239,10 +274,12 @@ def get_current():
     app.logger.debug(f'get_current values')
 
     try:
+        table = get_tag_table()
+        items = get_current_from_table(table) if table else store.get_current()
         def generator():
           first = True
           yield "["
-          for item in store.get_current():
+          for item in items:
             if first:        
               first = False
             else:
@@ -290,10 +327,11 @@ def get_state():
         error_message = err.args[0]
         return {'error': error_message}, 400
 
-def run(log_queue=None, api_queue=None, metrics_queue=None):
-   global API_COMMAND_QUEUE   
+def run(log_queue=None, api_queue=None, metrics_queue=None, tag_table_name=None):
+   global API_COMMAND_QUEUE, TAG_TABLE_NAME
    
    API_COMMAND_QUEUE = api_queue
+   TAG_TABLE_NAME = tag_table_name
    
    custom_logger = logger.get_logger('api', log_queue)
    # Замена логгера Flask
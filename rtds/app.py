@@ -1,4 +1,6 @@
 import os, sys, time
+import heapq
+import selectors
 from pathlib import Path
 import multiprocessing as mp
 from dotenv import load_dotenv
@@ -8,17 +10,51 @@ sys.path.extend(['.','..'])
 from loggers import logger
 from configs import config_ods
 from models.tag import Tag, TagValue 
+from models.tag_table import TagTable
+from models.swinging_door import SwingingDoor
+from models.value_batch import ValueBatch, TagDirectory
 from models.command import CommandEnum, Command 
 from store import sqldb as store
 from api import server as api
 from metrics import server as metrics
 from producers import kafka_producer as producer
+from connectors.connector_runtime import ConnectorRuntime
+from scripts.script_runtime import ScriptRuntime
+from scripts.script_graph import ScriptGraph
 
 tags = {}
 connectors = {}
 scripts = {}
 processes = {}
 
+# таблица текущих значений в разделяемой памяти
+tag_table:TagTable = None
+tag_list = []
+tag_seen = []
+connector_indexes = {}
+
+# значения для хранилища, отправляются одним сообщением за цикл сканирования
+store_batch = ValueBatch()
+# состояние сжатия вращающейся дверью по индексам тегов
+swinging_door = SwingingDoor(0)
+
+# порядок коннекторов и скриптов по имени, считается один раз при загрузке конфигурации
+connector_list = []
+script_list = []
+# таймеры скриптов: куча (время следующего запуска, порядок, скрипт)
+script_timers = []
+# ожидание готовности очередей коннекторов, команд api и уведомлений таблицы тегов
+selector:selectors.BaseSelector = None
+EVENT_TAG_TABLE = 'tag_table'
+EVENT_API_COMMAND = 'api_command'
+EVENT_SCRIPT_DONE = 'script_done'
+# пул выполнения скриптов
+script_runtime:ScriptRuntime = None
+# граф зависимостей скриптов, индекс тега -> скрипты по изменению, изменённые скрипты
+script_graph:ScriptGraph = None
+tag_triggers = {}
+changed_scripts = set()
+
 log_queue:mp.Queue = mp.Queue()
 store_queue:mp.Queue = mp.Queue()
 api_command_queue:mp.Queue = None
@@ -30,6 +66,17 @@ API_ENABLED = os.getenv('API_ENABLED', 'False').lower() == 'true'
 METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
 KAFKA_ENABLED = os.getenv('KAFKA_ENABLED', 'False').lower() == 'true'
 PROCESS_STOP_TIMEOUT = float(os.getenv('PROCESS_STOP_TIMEOUT', '0.1'))
+# сколько ждать, пока хранилище заберёт последние значения перед остановкой, сек
+STORE_STOP_TIMEOUT = float(os.getenv('STORE_STOP_TIMEOUT', '5'))
+# process - процесс на каждый коннектор, asyncio - все коннекторы в одном процессе
+CONNECTOR_RUNTIME = os.getenv('CONNECTOR_RUNTIME', 'process').lower()
+CONNECTOR_RUNTIME_PROCESS = 'connectors'
+TAG_TABLE_ENABLED = os.getenv('TAG_TABLE_ENABLED', 'False').lower() == 'true'
+TAG_TABLE_NAME = os.getenv('TAG_TABLE_NAME', 'rtds_tags')
+# период проверки процессов и сбора метрик главного цикла, сек
+HOUSEKEEPING_INTERVAL = float(os.getenv('HOUSEKEEPING_INTERVAL', '1'))
+# потоки выполнения скриптов, 0 - скрипты выполняются в главном цикле
+SCRIPT_WORKERS = int(os.getenv('SCRIPT_WORKERS', '2'))
 
 log = logger.get_logger('server', log_queue)
 
@@ -46,15 +93,52 @@ def get(name):
     else:
         return None
 
+def _set_tag(tag, value, status):
+    if tag_triggers:
+        names = tag_triggers.get(tag.index)
+        if names and (value != tag.value or status != tag.status):
+            changed_scripts.update(names)
+    tag.update(value, status)
+    if tag_table is not None and tag.connector_name is None:
+        tag_table.write(tag.index, tag.type_, tag.status, tag.value)
+    update_time = tag.update_time.timestamp()
+    if tag.is_log and tag.is_sdt():
+        # в историю уходят точки излома коридора со своим временем, текущее значение - только в currents
+        is_logged = False
+        for point_time, point_value, point_status in swinging_door.add(
+                tag.index, update_time, tag.value, tag.status, tag.sdt_deviation, tag.max_silence):
+            store_batch.append(tag.index, tag.type_, point_status, point_value, point_time, True)
+            is_logged = point_time == update_time
+        if not is_logged:
+            store_batch.append(tag.index, tag.type_, tag.status, tag.value, update_time, False)
+        return
+    # в историю попадают только значения, прошедшие зону нечувствительности тега
+    store_batch.append(tag.index, tag.type_, tag.status, tag.value, update_time, tag.need_log())
+
 def _set(value):
     if isinstance(value, TagValue):
         tag = tags[value.name]
         if tag is not None:
-            new_value = tag.set(value.value, value.status)
-            store_queue.put(new_value)                            
+            _set_tag(tag, value.value, value.status)
     else:
         log.error(f'Unsupport type: {value}')
 
+def flush_store_batch():
+    if store_batch:
+        store_queue.put(store_batch.to_bytes())
+        store_batch.clear()
+
+def flush_swinging_door():
+    """
+    Дописать в историю неархивированные точки сжатия тегов (перед перезагрузкой конфигурации и остановкой),
+    иначе у медленных сигналов теряется конец последнего отрезка.
+    """
+    for tag in tag_list:
+        if tag.is_sdt():
+            for point_time, point_value, point_status in swinging_door.flush(tag.index):
+                store_batch.append(tag.index, tag.type_, point_status, point_value, point_time, True)
+    flush_store_batch()
+
 def set(value):
     if isinstance(value, TagValue):
         tag = tags[value.name]
@@ -68,6 +152,17 @@ def set(value):
     else:
         log.error(f'Unsupport type: {value}')
 
+def write_tag(tag, value, status):
+    """
+    Запись скрипта: в коннектор тега или в текущее значение расчётного тега
+    """
+    if tag.connector_name is not None:
+        connector = connectors[tag.connector_name]
+        if connector.write_queue is not None:
+            connector.write_queue.put(TagValue(name=tag.name, type_=tag.type_, status=status, value=value))
+    else:
+        _set_tag(tag, value, status)
+
 def storage_run(log_queue, store_queue, metrics_queue):
     log.info('storage process started')
 
@@ -76,11 +171,11 @@ def storage_run(log_queue, store_queue, metrics_queue):
     except Exception as e:
         log.error(f'storage process stoped, error: {e}')
 
-def api_run(log_queue, api_command_queue, metrics_queue):
+def api_run(log_queue, api_command_queue, metrics_queue, tag_table_name=None):
     log.info('api process started')
 
     try:
-        api.run(log_queue, api_command_queue, metrics_queue)
+        api.run(log_queue, api_command_queue, metrics_queue, tag_table_name)
     except Exception as e:
         log.error(f'api process stoped, error: {e}')
 
@@ -124,12 +219,26 @@ def connector_run(connector):
     except Exception as e:
         log.error(f'connector {connector.name} stoped, error: {e}')
 
+def connector_runtime_run(connectors, log_queue):
+    try:
+        ConnectorRuntime(connectors, log_queue).run()
+    except Exception as e:
+        log.error(f'connector runtime stoped, error: {e}')
+
 def connector_read(connector):
     log.debug(f'connector {connector.name} read process start ...')
 
+    if tag_table is not None:
+        for index, slot in tag_table.changed(connector_indexes[connector.name], tag_seen):
+            _set_tag(tag_list[index], slot.value, slot.status)
+
     while not connector.read_queue.empty():
-        value = connector.read_queue.get()
-        _set(value)
+        item = connector.read_queue.get()
+        if ValueBatch.is_batch(item):
+            for index, _, status, _, value, _ in ValueBatch.records_of(item):
+                _set_tag(tag_list[index], value, status)
+        else:
+            _set(item)
 
     log.debug(f'connector {connector.name} read process stop')
 
@@ -137,9 +246,119 @@ def connector_read(connector):
 def load_config():
     global connectors, tags, scripts    
     connectors, tags, scripts = store.get_config(server=sys.modules[__name__])
+    init_tag_table()
+    init_schedule()
     log.info(f'Loaded config, connectors: {len(connectors)}, tags: {len(tags)}, scripts: {len(scripts)}')
     return connectors, tags, scripts
 
+def init_tag_table():
+    global tag_table, tag_list, tag_seen, connector_indexes, swinging_door
+
+    # точки прежней конфигурации уходят в хранилище до нового справочника тегов
+    flush_swinging_door()
+    tag_list = list(tags.values())
+    for index, tag in enumerate(tag_list):
+        tag.index = index
+    swinging_door = SwingingDoor(len(tag_list))
+    store_queue.put(TagDirectory(names=[tag.name for tag in tag_list]))
+
+    if not TAG_TABLE_ENABLED:
+        return
+
+    if tag_table is not None:
+        tag_table.unlink()
+    tag_table = TagTable.create(tags, TAG_TABLE_NAME)
+    tag_seen = [tag_table.seq(index) for index in range(len(tag_list))]
+    connector_indexes = {}
+    for connector in connectors.values():
+        connector.tag_table = tag_table
+        connector_indexes[connector.name] = [tag.index for _, tag in connector.tags]
+    log.info(f'tag table {tag_table.name} created, slots: {tag_table.count}')
+
+def init_schedule():
+    """
+    Порядок обработки, таймеры скриптов и ожидание событий для загруженной конфигурации.
+    """
+    global connector_list, script_list, script_timers, selector, script_runtime, script_graph, tag_triggers, changed_scripts
+
+    connector_list = [connector for _, connector in sorted(connectors.items())]
+    script_list = [script for _, script in sorted(scripts.items())]
+    for script in script_list:
+        script.bind(tags)
+    script_graph = ScriptGraph([script for script in script_list if script.is_active], log)
+    tag_triggers = script_graph.triggers
+    # скрипты по изменению выполняются один раз после загрузки
+    changed_scripts = {script.name for script in script_list if script.is_change()}
+    if script_runtime is None:
+        script_runtime = ScriptRuntime(SCRIPT_WORKERS, log)
+    else:
+        script_runtime.reset()
+    now = time.monotonic()
+    script_timers = [(now + script.cycle, order, script) for order, script in enumerate(script_list)
+                     if script.is_active and not script.is_change()]
+    heapq.heapify(script_timers)
+
+    if selector is not None:
+        selector.close()
+    selector = selectors.DefaultSelector()
+    for connector in connector_list:
+        # у mp.Queue читающий конец канала готов к чтению, пока очередь не пуста
+        reader = getattr(connector.read_queue, '_reader', None)
+        if reader is not None:
+            selector.register(reader, selectors.EVENT_READ, connector)
+    if tag_table is not None:
+        selector.register(tag_table, selectors.EVENT_READ, EVENT_TAG_TABLE)
+    if api_command_queue is not None:
+        selector.register(api_command_queue._reader, selectors.EVENT_READ, EVENT_API_COMMAND)
+    if script_runtime.is_pool:
+        selector.register(script_runtime, selectors.EVENT_READ, EVENT_SCRIPT_DONE)
+
+def run_scripts(now):
+    """
+    Запустить скрипты, время запуска которых наступило, в порядке имён.
+    """
+    due = []
+    while script_timers and script_timers[0][0] <= now:
+        due.append(heapq.heappop(script_timers))
+    for run_time, order, script in due:
+        script_runtime.submit(script)
+        # пропущенные при долгом выполнении запуски не догоняются
+        run_time += script.cycle
+        if run_time <= now:
+            run_time = now + script.cycle
+        heapq.heappush(script_timers, (run_time, order, script))
+    return len(due)
+
+def run_changed_scripts():
+    """
+    Запустить скрипты, входные теги которых изменились, по графу зависимостей.
+    Каждый скрипт запускается не больше одного раза за вызов.
+    """
+    started = []
+    while changed_scripts:
+        ready = [script for script in script_graph.ready(changed_scripts, script_runtime.running) if script.name not in started]
+        if not ready:
+            break
+        for script in ready:
+            changed_scripts.discard(script.name)
+            started.append(script.name)
+            script_runtime.submit(script)
+    return len(started)
+
+def next_timeout(now, deadline):
+    """
+    Время ожидания событий до ближайшего таймера скрипта или deadline.
+    """
+    if script_timers:
+        deadline = min(deadline, script_timers[0][0])
+    return max(deadline - now, 0)
+
+def close_tag_table():
+    global tag_table
+    if tag_table is not None:
+        tag_table.unlink()
+        tag_table = None
+
 def start_process(process_name, target, args):
     p = mp.Process(target=target, args=args)
     p.start()
@@ -158,12 +377,27 @@ def stop_processes():
         except Exception as e:
             log.error(f'process {key}, stoped with error: {e}')
 
+def wait_store_queue():
+    # хранилище останавливается terminate, дать ему забрать последние пачки
+    storage = processes.get('storage')
+    deadline = time.time() + STORE_STOP_TIMEOUT
+    while storage is not None and storage.is_alive() and not store_queue.empty() and time.time() < deadline:
+        time.sleep(0.1)
+
 def check_processes():
     for key, process in processes.items():
         if not process.is_alive():
             raise Exception(f'process {key} stoped')            
 
 def start_connectors():
+    if CONNECTOR_RUNTIME == 'asyncio':
+        try:
+            log.info(f'start connector runtime, connectors: {len(connectors)} ...')
+            start_process(process_name=CONNECTOR_RUNTIME_PROCESS, target=connector_runtime_run, args=(list(connectors.values()), log_queue,))
+        except Exception as e:
+            log.error(f'Fail start connector runtime, error: {e}')
+        return
+
     for connector in connectors.values():
         try:
             log.info(f'start connector {connector.name} ...')
@@ -174,23 +408,30 @@ def start_connectors():
         except Exception as e:
             log.error(f'Fail start connector {connector.name}, error: {e}')
 
-def stop_connectors():
-    for connector in connectors.values():
-        process = processes.get(connector.name)
-        if process:
-            try:
-                if not process.is_alive():
-                    log.warning(f'connector process {connector.name} is already stoped')
-                    continue
-                log.info(f'connector process {connector.name} stoping ...')
+def stop_connector_process(process_name):
+    process = processes.get(process_name)
+    if process:
+        try:
+            if not process.is_alive():
+                log.warning(f'connector process {process_name} is already stoped')
+            else:
+                log.info(f'connector process {process_name} stoping ...')
                 process.terminate()
                 process.join(PROCESS_STOP_TIMEOUT)
-                log.info(f'connector process {connector.name}, stoped')
-            except Exception as e:
-                log.error(f'connector process {connector.name}, stoped with error: {e}')
-            processes.pop(connector.name)
-        else:
-            log.warning(f'connector process {connector.name} not found')
+                log.info(f'connector process {process_name}, stoped')
+        except Exception as e:
+            log.error(f'connector process {process_name}, stoped with error: {e}')
+        processes.pop(process_name)
+    else:
+        log.warning(f'connector process {process_name} not found')
+
+def stop_connectors():
+    if CONNECTOR_RUNTIME == 'asyncio':
+        stop_connector_process(CONNECTOR_RUNTIME_PROCESS)
+        return
+
+    for connector in connectors.values():
+        stop_connector_process(connector.name)
 
 
 def reload_config():   
@@ -216,16 +457,53 @@ def scan_cycle():
     if METRICS_ENABLED:
         start_time = time.time()
     
-    for _, connector in sorted(connectors.items()):
+    for connector in connector_list:
         connector_read(connector)
-    for _, script in sorted(scripts.items()):
-        script.run()
+    run_scripts(time.monotonic())
+    script_runtime.collect()
+    run_changed_scripts()
+    flush_store_batch()
     
     if METRICS_ENABLED:
         duration = time.time() - start_time
         metrics_queue.put(metrics.Metric(metrics.MetricEnum.SCAN_CYCLE_LATENCY, duration))
-    
-    
+
+def event_cycle(timeout):
+    """
+    Ждать готовности очередей или таймера скрипта, обработать только готовые коннекторы.
+    Возвращает False, если событий не было.
+    """
+    events = selector.select(timeout)
+    if METRICS_ENABLED:
+        start_time = time.time()
+
+    is_api_command = False
+    for key, _ in events:
+        if key.data is EVENT_API_COMMAND:
+            is_api_command = True
+        elif key.data is EVENT_SCRIPT_DONE:
+            script_runtime.collect()
+        elif key.data is EVENT_TAG_TABLE:
+            tag_table.wait(0)
+            for connector in connector_list:
+                connector_read(connector)
+        else:
+            connector_read(key.data)
+    is_scripts = run_scripts(time.monotonic()) + run_changed_scripts() > 0
+    if not events and not is_scripts:
+        return False
+    flush_store_batch()
+
+    if METRICS_ENABLED:
+        duration = time.time() - start_time
+        metrics_queue.put(metrics.Metric(metrics.MetricEnum.SCAN_CYCLE_LATENCY, duration))
+
+    # перезагрузка конфигурации пересоздаёт selector, поэтому команда обрабатывается последней
+    if is_api_command:
+        api_command_handler()
+    return True
+
+
 def run():
     try: 
         store.init_db(log_queue)   
@@ -233,7 +511,7 @@ def run():
         start_process(process_name='storage', target=storage_run, args=(log_queue, store_queue, metrics_queue, ))
         
         if API_ENABLED:
-            start_process(process_name='api', target=api_run, args=(log_queue, api_command_queue, metrics_queue, ))  
+            start_process(process_name='api', target=api_run, args=(log_queue, api_command_queue, metrics_queue, TAG_TABLE_NAME if TAG_TABLE_ENABLED else None, ))  
         if METRICS_ENABLED:
             start_process(process_name='metrics', target=metrics_run, args=(log_queue, metrics_queue,))  
         if KAFKA_ENABLED:
@@ -250,14 +528,18 @@ def run():
             metrics_queue.put(metrics.Metric(metrics.MetricEnum.CONNECTOR_COUNTER, len(connectors)))
 
         last_collect_metrics = time.time()
+        next_housekeeping = 0
         try:
             while True:
-                check_processes()
-                scan_cycle()
-                api_command_handler()
-                if time.time() - last_collect_metrics > 60:
-                    metrics.collect_process_metrics('app', metrics_queue)
-                time.sleep(0.1)
+                now = time.monotonic()
+                if now >= next_housekeeping:
+                    check_processes()
+                    if METRICS_ENABLED and time.time() - last_collect_metrics > 60:
+                        metrics.collect_process_metrics('app', metrics_queue)
+                        last_collect_metrics = time.time()
+                    next_housekeeping = now + HOUSEKEEPING_INTERVAL
+                # спим до данных коннекторов, команды api, таймера скрипта или проверки процессов
+                event_cycle(next_timeout(now, next_housekeeping))
         except BaseException as e:
             log.error(f'server loop stoped, error: {e}')
 
@@ -265,7 +547,15 @@ def run():
         log.error(f'server stoped, error: {e}')
     finally:
         stop_connectors()
+        try:
+            flush_swinging_door()
+            wait_store_queue()
+        except Exception as e:
+            log.error(f'fail flush history before stop, error: {e}')
         stop_processes()
+        close_tag_table()
+        if script_runtime is not None:
+            script_runtime.shutdown()
 
 if __name__ == '__main__':
    
@@ -0,0 +1,76 @@
+"""
+Производные теги группы: N обычных скриптов (по скрипту на тег) и один скрипт #!array
+(scripts/array_script.py) над той же группой.
+
+Для каждого варианта - время вычисления всей группы за цикл (call + применение записей), мс.
+
+Пример запуска из каталога rtds:
+    python benchmarks/bench_array_script.py --tags 1000 --runs 20
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+sys.path.extend(['.', '..'])
+
+from models.tag import Tag, TagType
+from scripts.script_factory import get_script
+
+
+class Server:
+    log_queue = None
+    metrics_queue = None
+
+    def write_tag(self, tag, value, status):
+        tag.update(value, status)
+
+
+def make_tags(count):
+    tags = {}
+    for i in range(count):
+        tags[f'T_{i:05}'] = Tag(name=f'T_{i:05}', type_=TagType.FLOAT, value=float(i))
+        tags[f'TF_{i:05}'] = Tag(name=f'TF_{i:05}', type_=TagType.FLOAT, value=0.0)
+    return tags
+
+
+def bench(scripts, runs):
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        for script in scripts:
+            script.execute()
+        durations.append(time.perf_counter() - start_time)
+    return {
+        'scripts': len(scripts),
+        'median_ms': round(statistics.median(durations) * 1000, 3),
+        'max_ms': round(max(durations) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tags', type=int, default=1000, help='tags in group')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    server = Server()
+    tags = make_tags(args.tags)
+    scalar = []
+    for i in range(args.tags):
+        script = get_script(server=server, name=f'conv_{i:05}', cycle=1, is_active=True,
+                            script=f"write('TF_{i:05}', value('T_{i:05}') * 1.8 + 32)")
+        script.bind(tags)
+        scalar.append(script)
+    array = get_script(server=server, name='conv', cycle=1, is_active=True,
+                       script='#!array in=prefix:T_ out=prefix:TF_\nx * 1.8 + 32')
+    array.bind(tags)
+
+    result = {'tags': args.tags, 'scalar': bench(scalar, args.runs), 'array': bench([array], args.runs)}
+    result['speedup'] = round(result['scalar']['median_ms'] / result['array']['median_ms'], 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
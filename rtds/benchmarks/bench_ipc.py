@@ -0,0 +1,92 @@
+"""
+Сравнение передачи значений между процессами:
+- tagvalue: отдельный TagValue на каждое значение (прежний путь)
+- batch: один пакет ValueBatch на цикл коннектора
+
+Пример запуска из каталога rtds:
+    python benchmarks/bench_ipc.py --tags 10000 --cycles 10
+"""
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import time
+
+sys.path.extend(['.', '..'])
+
+from models.tag import Tag, TagType, TagValue
+from models.value_batch import ValueBatch
+
+
+def make_tags(count):
+    tags = []
+    for i in range(count):
+        tag = Tag(name=f'tag_{i}', type_=TagType.FLOAT)
+        tag.index = i
+        tags.append(tag)
+    return tags
+
+
+def produce_tagvalues(queue, tags, cycles):
+    for cycle in range(cycles):
+        for tag in tags:
+            queue.put(TagValue(name=tag.name, type_=tag.type_, status=0, value=float(cycle)))
+    queue.put(None)
+
+
+def produce_batches(queue, tags, cycles):
+    batch = ValueBatch()
+    for cycle in range(cycles):
+        now = time.time()
+        for tag in tags:
+            batch.append(tag.index, tag.type_, 0, float(cycle), now)
+        queue.put(batch.to_bytes())
+        batch.clear()
+    queue.put(None)
+
+
+def consume(queue):
+    count = 0
+    while True:
+        item = queue.get()
+        if item is None:
+            return count
+        if isinstance(item, bytes):
+            for _ in ValueBatch.records_of(item):
+                count += 1
+        else:
+            count += 1
+
+
+def bench(name, target, tags, cycles):
+    queue = mp.Queue()
+    start_time = time.perf_counter()
+    process = mp.Process(target=target, args=(queue, tags, cycles))
+    process.start()
+    count = consume(queue)
+    duration = time.perf_counter() - start_time
+    process.join()
+    return {
+        'path': name,
+        'values': count,
+        'seconds': round(duration, 4),
+        'values_per_sec': round(count / duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tags', type=int, default=10000, help='tags per connector cycle')
+    parser.add_argument('--cycles', type=int, default=10, help='connector cycles')
+    args = parser.parse_args()
+
+    tags = make_tags(args.tags)
+    results = [
+        bench('tagvalue', produce_tagvalues, tags, args.cycles),
+        bench('batch', produce_batches, tags, args.cycles),
+    ]
+    print(json.dumps({'tags': args.tags, 'cycles': args.cycles, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Сжатие истории float-тега: зона нечувствительности (Tag.need_log) и вращающаяся дверь
+(models/swinging_door.py) на одном записанном сигнале.
+
+Для каждого метода:
+- compression_ratio: число точек сигнала / число точек в истории
+- max_error, rms_error: ошибка восстановления сигнала по истории
+  (deadband - удержание последнего значения, sdt - линейная интерполяция)
+- cpu_us_per_point: процессорное время на точку
+
+Сигнал читается из CSV (колонки: время в секундах, значение, первая строка может быть
+заголовком) или генерируется: медленная синусоида, ступени и шум датчика.
+
+Пример запуска из каталога rtds:
+    python benchmarks/bench_sdt.py --points 100000 --deviation 0.05
+    python benchmarks/bench_sdt.py --csv signal.csv --deviation 0.1
+"""
+import argparse
+import bisect
+import csv
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.extend(['.', '..'])
+
+from models.tag import Tag, TagType
+from models.swinging_door import SwingingDoor
+
+
+def generate_signal(count, step):
+    rnd = random.Random(1)
+    times = []
+    values = []
+    level = 0.0
+    for i in range(count):
+        if i % 5000 == 0:
+            level = rnd.choice([0.0, 2.0, 5.0])
+        t = i * step
+        times.append(t)
+        values.append(level + 10 * math.sin(t / 600) + rnd.gauss(0, 0.01))
+    return times, values
+
+
+def read_signal(path):
+    times = []
+    values = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            try:
+                t, value = float(row[0]), float(row[1])
+            except (ValueError, IndexError):
+                continue
+            times.append(t)
+            values.append(value)
+    return times, values
+
+
+def deadband_compress(times, values, deviation, max_interval):
+    tag = Tag(name='bench', type_=TagType.FLOAT, is_log=True, deadband=deviation, max_silence=max_interval)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    archived = []
+    for t, value in zip(times, values):
+        tag.update(value, 0)
+        tag.update_time = start + timedelta(seconds=t)
+        if tag.need_log():
+            archived.append((t, value))
+    return archived
+
+
+def sdt_compress(times, values, deviation, max_interval):
+    door = SwingingDoor(1)
+    archived = []
+    for t, value in zip(times, values):
+        for point_time, point_value, _ in door.add(0, t, value, 0, deviation, max_interval):
+            archived.append((point_time, point_value))
+    archived.extend((point_time, point_value) for point_time, point_value, _ in door.flush(0))
+    return archived
+
+
+def hold(archived, t, archived_times):
+    i = bisect.bisect_right(archived_times, t) - 1
+    return archived[max(i, 0)][1]
+
+
+def interpolate(archived, t, archived_times):
+    i = bisect.bisect_right(archived_times, t)
+    if i == 0:
+        return archived[0][1]
+    if i == len(archived):
+        return archived[-1][1]
+    (t0, v0), (t1, v1) = archived[i - 1], archived[i]
+    return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+
+
+def bench(name, compress, restore, times, values, deviation, max_interval):
+    start_time = time.process_time()
+    archived = compress(times, values, deviation, max_interval)
+    duration = time.process_time() - start_time
+
+    archived_times = [t for t, _ in archived]
+    errors = [restore(archived, t, archived_times) - value for t, value in zip(times, values)]
+    return {
+        'method': name,
+        'points': len(values),
+        'archived': len(archived),
+        'compression_ratio': round(len(values) / len(archived), 2),
+        'max_error': round(max(abs(e) for e in errors), 6),
+        'rms_error': round(math.sqrt(sum(e * e for e in errors) / len(errors)), 6),
+        'cpu_us_per_point': round(duration / len(values) * 1e6, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', help='recorded signal: time seconds, value')
+    parser.add_argument('--points', type=int, default=100000, help='generated signal points')
+    parser.add_argument('--step', type=float, default=0.1, help='generated signal step, seconds')
+    parser.add_argument('--deviation', type=float, default=0.05, help='deadband and SDT deviation')
+    parser.add_argument('--max-interval', type=float, default=0, help='forced archive interval, seconds')
+    args = parser.parse_args()
+
+    if args.csv:
+        times, values = read_signal(args.csv)
+    else:
+        times, values = generate_signal(args.points, args.step)
+
+    results = [
+        bench('deadband', deadband_compress, hold, times, values, args.deviation, args.max_interval),
+        bench('sdt', sdt_compress, interpolate, times, values, args.deviation, args.max_interval),
+    ]
+    print(json.dumps({
+        'signal': args.csv or 'generated',
+        'deviation': args.deviation,
+        'max_interval': args.max_interval,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Скорость записи истории в SQLite:
+- orm: объекты History через session.bulk_save_objects (прежний путь)
+- core: кортежи одним executemany (store.sqldb.batch_write)
+
+Пример запуска из каталога rtds:
+    python benchmarks/bench_store_write.py --rows 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.extend(['.', '..'])
+
+DB_DIR = tempfile.mkdtemp(prefix='bench_store_')
+os.environ['STORE_DB_URL'] = f'sqlite:///{os.path.join(DB_DIR, "history.db")}'
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from store import sqldb as store
+from store.engine import get_engine
+
+BATCH_SIZES = [100, 1000, 10000]
+
+
+def orm_write(rows):
+    with Session(get_engine()) as session:
+        session.bulk_save_objects([
+            store.History(tag_time=tag_time, tag_id=tag_id, status=status, bool_value=bool_value,
+                          int_value=int_value, float_value=float_value, var_value=var_value)
+            for tag_time, tag_id, status, bool_value, int_value, float_value, var_value in rows
+        ])
+        session.commit()
+
+
+def core_write(rows):
+    _, _, _, time_processor = store.get_write_statements()
+    store.batch_write([
+        (time_processor(tag_time), tag_id, status, bool_value, int_value, float_value, var_value)
+        for tag_time, tag_id, status, bool_value, int_value, float_value, var_value in rows
+    ])
+
+
+def bench(name, write, batch_size, total_rows):
+    now = datetime.now(timezone.utc)
+    rows = [(now, f'tag_{i % 1000}', 0, None, None, float(i), None) for i in range(batch_size)]
+    batches = max(1, total_rows // batch_size)
+    start_time = time.perf_counter()
+    for _ in range(batches):
+        write(rows)
+    duration = time.perf_counter() - start_time
+    with get_engine().begin() as connection:
+        connection.execute(delete(store.History))
+    return {
+        'path': name,
+        'batch_size': batch_size,
+        'rows': batches * batch_size,
+        'seconds': round(duration, 4),
+        'rows_per_sec': round(batches * batch_size / duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000, help='rows per measurement')
+    args = parser.parse_args()
+
+    store.init_db()
+    results = []
+    for batch_size in BATCH_SIZES:
+        results.append(bench('orm', orm_write, batch_size, args.rows))
+        results.append(bench('core', core_write, batch_size, args.rows))
+    print(json.dumps({'db': os.environ['STORE_DB_URL'], 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Сравнение форматов сообщений топика RTDS -> historian:
+- json: массив объектов с временем в ISO-строке (прежний путь)
+- binary: двоичная пачка producers/wire_format.py
+
+Декодирование json повторяет historian.deserialize_message: json.loads и разбор полей.
+
+Пример запуска из каталога rtds:
+    python benchmarks/bench_wire_format.py --rows 1000 --repeat 200
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.extend(['.', '..'])
+
+from producers import wire_format
+
+TYPES = ['float', 'float', 'float', 'int', 'bool', 'str']
+
+
+def make_rows(count):
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        type_ = TYPES[i % len(TYPES)]
+        rows.append((
+            f'tag_{i % 500}', now + timedelta(microseconds=i), type_, 0,
+            bool(i % 2) if type_ == 'bool' else None,
+            i if type_ == 'int' else None,
+            i * 0.5 if type_ == 'float' else None,
+            f'value {i}' if type_ == 'str' else None,
+        ))
+    return rows
+
+
+def json_encode(rows):
+    return json.dumps([{
+        "tg": tag_id, "tm": f'{tag_time.isoformat()}Z', "tp": tag_type, "st": status,
+        "bv": bool_value, "iv": int_value, "fv": float_value, "vv": var_value
+    } for tag_id, tag_time, tag_type, status, bool_value, int_value, float_value, var_value in rows], default=str).encode('utf-8')
+
+
+def json_decode(data):
+    return [(item.get('tg'), item.get('tm'), item.get('tp'), item.get('st'),
+             item.get('bv'), item.get('iv'), item.get('fv'), item.get('vv'))
+            for item in json.loads(data.decode('utf-8'))]
+
+
+def bench(name, encode, decode, rows, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        data = encode(rows)
+    encode_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        decode(data)
+    decode_time = time.perf_counter() - start_time
+
+    return {
+        'format': name,
+        'bytes_per_message': len(data),
+        'bytes_per_row': round(len(data) / len(rows), 1),
+        'encode_rows_per_sec': round(len(rows) * repeat / encode_time),
+        'decode_rows_per_sec': round(len(rows) * repeat / decode_time),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000, help='rows per message')
+    parser.add_argument('--repeat', type=int, default=200, help='messages to encode and decode')
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    results = [
+        bench('json', json_encode, json_decode, rows, args.repeat),
+        bench('binary', wire_format.encode_batch, wire_format.decode_batch, rows, args.repeat),
+    ]
+    print(json.dumps({'rows': args.rows, 'repeat': args.repeat, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
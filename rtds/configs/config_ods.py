@@ -3,12 +3,18 @@ from pathlib import Path
 from typing import OrderedDict
 from pyexcel_ods3 import get_data, save_data
 from models.tag import Tag, get_tag_type
-from scripts.script import Script
+from scripts.script_factory import get_script
 from connectors.connector_factory import get_connector
 from loggers import logger
 
 log = logger.get_logger('config')
 
+def _number(value, default=0):
+    # пустая ячейка приходит пустой строкой
+    if value is None or value == '':
+        return default
+    return float(value)
+
 def load_from_file(configFile: str):
     log.info(f'Loading config from file: {configFile}')
     data = get_data(configFile)
@@ -34,7 +40,12 @@ def load_from_dict(data:dict):
                   min_=item.get('min_', 0), 
                   source=item.get('source'),
                   value=item.get('value', 0),
-                  description=item.get('description'))
+                  description=item.get('description'),
+                  deadband=_number(item.get('deadband')),
+                  deadband_pct=_number(item.get('deadband_pct')),
+                  on_change=True if item.get('on_change') == 1 else False,
+                  max_silence=_number(item.get('max_silence')),
+                  sdt_deviation=_number(item.get('sdt_deviation')))
         tags[tag.name] = tag
     
     #load connectors
@@ -54,12 +65,13 @@ def load_from_dict(data:dict):
     rows = data['Scripts']
     for row in rows[1:]:
         item = dict(zip(rows[0], row))
-        script = Script(server=None,
-                        name=item['name'],
-                        cycle=item['cycle'],
-                        script=item['script'],
-                        is_active=True if item.get('is_active') == 1 else False,
-                        description=item.get('description'))
+        script = get_script(server=None,
+                            name=item['name'],
+                            cycle=item['cycle'],
+                            script=item['script'],
+                            is_active=True if item.get('is_active') == 1 else False,
+                            trigger=item.get('trigger'),
+                            description=item.get('description'))
         scripts[script.name] = script
 
     return connectors, tags, scripts
@@ -86,14 +98,20 @@ def export_to_file(connectors, tags, scripts, configFile: str):
         "min_", 
         "source", 
         "value", 
-        "description"
+        "description",
+        "deadband",
+        "deadband_pct",
+        "on_change",
+        "max_silence",
+        "sdt_deviation"
     ]]
     _scripts = [[
         "name", 
         "cycle", 
         "script", 
         "is_active", 
-        "description"
+        "description",
+        "trigger"
     ]]
         
     if connectors:
@@ -119,7 +137,12 @@ def export_to_file(connectors, tags, scripts, configFile: str):
                 tag.get("min_"),
                 tag.get("source") or "",
                 tag.get("value"),
-                tag.get("description") or ""
+                tag.get("description") or "",
+                tag.get("deadband") or 0,
+                tag.get("deadband_pct") or 0,
+                1 if tag.get("on_change") else 0,
+                tag.get("max_silence") or 0,
+                tag.get("sdt_deviation") or 0
             ])
         
         data.update({"Tags": _tags})
@@ -131,7 +154,8 @@ def export_to_file(connectors, tags, scripts, configFile: str):
                 script.get("cycle"), 
                 script.get("script"), 
                 1 if script.get("is_active") else 0, 
-                script.get("description") or ""
+                script.get("description") or "",
+                script.get("trigger") or "cycle"
             ])
 
         data.update({"Scripts": _scripts})
@@ -1,8 +1,14 @@
 from abc import ABC
+import asyncio
 from multiprocessing import Queue
 import time
 from dataclasses import dataclass
 import metrics.server as metrics
+from models.tag import TagValue
+from models.value_batch import ValueBatch
+
+# статус тега после неудачной записи в источник, значение тега восстановит следующий цикл чтения
+STATUS_WRITE_ERROR = -2
 
 @dataclass
 class ConnectorABC(ABC):
@@ -18,6 +24,9 @@ class ConnectorABC(ABC):
     metrics_queue:Queue = None
     start_cycle_time:float = None
     last_collect_metrics:float = None
+    runtime:object = None
+    tag_table:object = None
+    batch:ValueBatch = None
 
     def __init__(self, 
                  log, 
@@ -46,6 +55,38 @@ class ConnectorABC(ABC):
         self.log.info(f'loaded {len(self.tags)} tags')
 
 
+    def _put_value(self, key, tag, status, value):
+        # значение пишется в слот таблицы тегов, если она подключена, иначе в пакет цикла
+        if tag.index is None:
+            self.read_queue.put(TagValue(name=key, type_=tag.type_, status=status, value=value))
+        elif self.tag_table is not None:
+            self.tag_table.write(tag.index, tag.type_, status, value)
+        else:
+            if self.batch is None:
+                self.batch = ValueBatch()
+            self.batch.append(tag.index, tag.type_, status, value, time.time())
+
+    def _put_write_results(self, results):
+        """
+        Результаты записи (key, tag, status, value) отдельным сообщением: пишущий поток не трогает пакет цикла чтения.
+        """
+        batch = ValueBatch()
+        for key, tag, status, value in results:
+            if tag.index is None:
+                self.read_queue.put(TagValue(name=key, type_=tag.type_, status=status, value=value))
+            else:
+                batch.append(tag.index, tag.type_, status, value, time.time())
+        if batch:
+            self.read_queue.put(batch.to_bytes())
+
+    def _read_done(self):
+        # одно сообщение на цикл чтения вместо сообщения на каждый тег
+        if self.batch:
+            self.read_queue.put(self.batch.to_bytes())
+            self.batch.clear()
+        if self.tag_table is not None:
+            self.tag_table.notify()
+
     def open(self):
         pass
 
@@ -58,6 +99,28 @@ class ConnectorABC(ABC):
     def write(self):
         pass
 
+    async def open_async(self):
+        await asyncio.to_thread(self.open)
+
+    async def close_async(self):
+        await asyncio.to_thread(self.close)
+
+    async def read_async(self):
+        await asyncio.to_thread(self.read)
+
+    async def write_async(self):
+        await asyncio.to_thread(self.write)
+
+    def _put_duration(self, method, status, start_time):
+        if self.metrics_queue:
+            self.metrics_queue.put(
+                metrics.Metric(
+                    name   = metrics.MetricEnum.CONNECTOR_DURATION, 
+                    labels = [self.name, method, status],
+                    value  = time.time() - start_time
+                )
+            )
+
     def __pause(self):
         pause = self.cycle - (time.time() - self.start_cycle_time)
         self.log.debug(f'pause: {pause} sec')
@@ -81,6 +144,7 @@ class ConnectorABC(ABC):
                 
                 start_time = time.time()
                 self.read()
+                self._read_done()
                 if self.metrics_queue:
                     self.metrics_queue.put(
                         metrics.Metric(
@@ -132,3 +196,47 @@ class ConnectorABC(ABC):
             finally:
                 self.close()
 
+    async def __pause_async(self):
+        pause = self.cycle - (time.time() - self.start_cycle_time)
+        self.log.debug(f'pause: {pause} sec')
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    async def run_async(self):
+        while True:
+            self.start_cycle_time = time.time()
+            try:
+                start_time = time.time()
+                await self.open_async()
+                self._put_duration('open', 'ok', start_time)
+
+                start_time = time.time()
+                await self.read_async()
+                self._read_done()
+                self._put_duration('read', 'ok', start_time)
+
+                start_time = time.time()
+                await self.write_async()
+                self._put_duration('write', 'ok', start_time)
+
+                await self.__pause_async()
+                self._put_duration('cycle', 'ok', self.start_cycle_time)
+
+                if self.metrics_queue and self.start_cycle_time - self.last_collect_metrics > 10:
+                    metrics.collect_process_metrics('connectors', self.metrics_queue)
+                    self.last_collect_metrics = self.start_cycle_time
+
+            except asyncio.CancelledError:
+                self.log.warning(f'connector {self.name} cancelled')
+                raise
+
+            except Exception as e:
+                self.log.error(f'connector {self.name} cycle error: {e}')
+                self._put_duration('cycle', 'error', self.start_cycle_time)
+                await self.__pause_async()
+            finally:
+                try:
+                    await self.close_async()
+                except Exception as e:
+                    self.log.error(f'connector {self.name} close error: {e}')
+
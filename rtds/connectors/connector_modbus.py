@@ -1,17 +1,28 @@
 from multiprocessing import Queue
+import asyncio
 import queue
+import threading
+import time
 from dataclasses import dataclass
 from pyModbusTCP.client import ModbusClient
 from loggers import logger
 from models.tag import TagType, Tag, TagValue
-from connectors.connector_abc import ConnectorABC
+from connectors.connector_abc import ConnectorABC, STATUS_WRITE_ERROR
+from connectors.modbus_async import AsyncModbusClient
+from connectors.modbus_planner import ReadBlock, ReadItem, WriteBlock, WriteItem, parse_source, build_read_plan, encode_write, build_write_plan
 
 
 @dataclass
 class ConnectorModbus(ConnectorABC):
     '''
     ConnectorModbus v0.1
-    connection_string: host=xx.xx.xx.xx; port=502; unit_id=1, timeout=xx; auto_open=true; auto_close=true
+    connection_string: host=xx.xx.xx.xx; port=502; unit_id=1, timeout=xx; auto_open=true; auto_close=true; max_gap=0
+    max_gap - допустимый разрыв адресов при объединении тегов в один запрос (по умолчанию 0)
+
+    Запись (is_read_only=false): ожидающие записи объединяются по тегу (остаётся последнее значение),
+    подряд идущие адреса - в запросы FC15/FC16. Запись идёт в отдельном потоке со своим клиентом
+    (asyncio - в отдельной задаче со своим соединением) и не задерживает цикл чтения,
+    результат возвращается через read_queue: значение со статусом 0 или STATUS_WRITE_ERROR.
     '''
     host:str=None
     port:int=502
@@ -19,7 +30,16 @@ class ConnectorModbus(ConnectorABC):
     timeout:float=30
     auto_open:bool=True
     auto_close:bool=True
+    max_gap:int=0
     client:ModbusClient=None   
+    async_client:AsyncModbusClient=None
+    read_plan:list=None
+    invalid_items:list=None
+    write_sources:dict=None
+    writer:threading.Thread=None
+    async_write_client:AsyncModbusClient=None
+    write_task:asyncio.Task=None
+    pending_writes:dict=None
 
     def __init__(self, 
                  log, 
@@ -51,6 +71,7 @@ class ConnectorModbus(ConnectorABC):
             self.unit_id=int(self.connection_string['unit_id'])
             self.auto_open=self.connection_string['auto_open'].lower() in ['true']
             self.auto_close=self.connection_string['auto_close'].lower() in ['true']
+            self.max_gap=int(self.connection_string.get('max_gap', 0))
         except Exception as e:
             log.error(f'''
 connection_string must be:
@@ -65,24 +86,29 @@ but got:
                                    auto_open=self.auto_open,
                                    auto_close=self.auto_close,
                                    timeout=self.timeout)
+        self.pending_writes = {}
+        self._build_plan()
         self.log.debug(self)
 
     def _source_parse(self, source):
         #source = 'C:0:10' | 'DI:0:10' | 'RI:0:10' | 'RH:0:10'
-        sl = source.upper().split(':')
-        if len(sl) != 3:
-            raise ValueError(f'source wrong format: {sl}')
-        if sl[0] not in ['C','DI', 'RI', 'RH']:
-            raise ValueError(f'source wrong format: {sl}, must be in list: C, DI, RI, RH')
-        try:
-            sl[1] = int(sl[1])
-        except:
-            raise ValueError(f'source wrong format: {sl}, addr {sl[1]} must be int')
-        try:
-            sl[2] = int(sl[2])
-        except:
-            raise ValueError(f'source wrong format: {sl}, count {sl[2]} must be int')
-        return sl
+        sl = parse_source(source)
+        return [sl.area, sl.addr, sl.count]
+
+    def _build_plan(self):
+        items = []
+        self.invalid_items = []
+        self.write_sources = {}
+        for key, tag in self.tags:
+            try:
+                source = parse_source(tag.source)
+                items.append(ReadItem(key=key, tag=tag, source=source))
+                self.write_sources[key] = (key, tag, source)
+            except (ValueError, AttributeError) as e:
+                self.log.error(f'tag {key}: {e}')
+                self.invalid_items.append((key, tag))
+        self.read_plan = build_read_plan(items, self.max_gap)
+        self.log.info(f'read plan: {len(items)} tags in {len(self.read_plan)} blocks')
         
     def _read_coils(self, addr, count):
         return self.client.read_coils(addr, count)
@@ -96,20 +122,15 @@ but got:
     def _read_holding_registers(self, addr, count):
         return self.client.read_holding_registers(addr, count)
 
-    def _read(self, source):
-        try:
-            sl = self._source_parse(source)
-        except ValueError as e:
-            self.log.error(e.message)
-            return None
-        if sl[0] == 'C':
-            return self._read_coils(sl[1], sl[2])
-        elif sl[0] == 'DI':
-            return self._read_discrete_inputs(sl[1], sl[2])
-        elif sl[0] == 'RI':
-            return self._read_input_registers(sl[1], sl[2])
-        elif sl[0] == 'RH':
-            return self._read_holding_registers(sl[1], sl[2])
+    def _read(self, block:ReadBlock):
+        if block.area == 'C':
+            return self._read_coils(block.addr, block.count)
+        elif block.area == 'DI':
+            return self._read_discrete_inputs(block.addr, block.count)
+        elif block.area == 'RI':
+            return self._read_input_registers(block.addr, block.count)
+        elif block.area == 'RH':
+            return self._read_holding_registers(block.addr, block.count)
         
     def open(self):
         if not self.auto_open:
@@ -119,35 +140,208 @@ but got:
         if not self.auto_close:
             self.client.close()
         
+    def _put_block(self, block:ReadBlock, result_list):
+        if result_list is None:
+            self.log.error(f'fail read modbus block: {block.area}:{block.addr}:{block.count}')
+            for item in block.items:
+                self._put_value(item.key, item.tag, -1, None)
+            return
+        # блок упаковывается в байты один раз, каждый тег декодируется своим кодеком
+        buffers = block.buffers(result_list)
+        for item in block.items:
+            value = item.source.codec.decode(buffers, item.offset)
+            self.log.debug(f'read modbus address: {item.tag.source} and get value: {value}')
+            self._put_value(item.key, item.tag, 0, value)
+
+    def _put_invalid(self):
+        for key, tag in self.invalid_items:
+            self._put_value(key, tag, -1, None)
+
     def read(self):
         self.log.debug(f'read cycle process start')
 
-        for key, tag in self.tags:
-            result_list = self._read(tag.source)
-            status = 0
-            if result_list is None:
-                value = None
-                status=-1
-                self.log.error(f'fail read modbus address: {tag.source}')
-            elif len(result_list) == 1:
-                value = result_list[0]
-            elif len(result_list) > 1:
-                value = result_list
-            else:
-                value = result_list
-            self.log.debug(f'read modbus address: {tag.source} and get value: {value}')
-            tgv = TagValue(name=key, type_=tag.type_, status=status, value=value)
-            self.read_queue.put(tgv)
+        for block in self.read_plan:
+            self._put_block(block, self._read(block))
+        self._put_invalid()
 
         self.log.debug(f'read cycle processed')
 
+    async def _read_async(self, block:ReadBlock):
+        try:
+            async with self.runtime.host_limit(self.host):
+                if block.area == 'C':
+                    return await self.async_client.read_coils(block.addr, block.count)
+                elif block.area == 'DI':
+                    return await self.async_client.read_discrete_inputs(block.addr, block.count)
+                elif block.area == 'RI':
+                    return await self.async_client.read_input_registers(block.addr, block.count)
+                elif block.area == 'RH':
+                    return await self.async_client.read_holding_registers(block.addr, block.count)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.error(f'fail read modbus block: {block.area}:{block.addr}:{block.count}, error: {e}')
+            return None
+
+    async def open_async(self):
+        if self.async_client is None:
+            self.async_client = AsyncModbusClient(host=self.host,
+                                                  port=self.port,
+                                                  unit_id=self.unit_id,
+                                                  timeout=self.timeout)
+        try:
+            await self.async_client.open()
+        except Exception as e:
+            # теги получат статус ошибки в цикле чтения
+            self.log.error(f'fail open modbus connection {self.host}:{self.port}, error: {e}')
+
+    async def close_async(self):
+        if self.auto_close and self.async_client is not None:
+            await self.async_client.close()
+
+    async def read_async(self):
+        self.log.debug(f'async read cycle process start')
+
+        # все блоки отправляются сразу и конвейеризуются в одном соединении
+        results = await asyncio.gather(*(self._read_async(block) for block in self.read_plan))
+        for block, result_list in zip(self.read_plan, results):
+            self._put_block(block, result_list)
+        self._put_invalid()
+
+        self.log.debug(f'async read cycle processed')
+
+    def _add_write(self, pending, value):
+        """
+        Добавить запись в ожидающие, по тегу остаётся последнее значение
+        """
+        if not isinstance(value, TagValue):
+            self.log.error(f'Unsupport type: {value}')
+            return
+        entry = self.write_sources.get(value.name)
+        if entry is None:
+            self.log.error(f'write: unknown tag {value.name}')
+            return
+        key, tag, source = entry
+        try:
+            words = encode_write(source, value.value)
+        except (ValueError, TypeError) as e:
+            self.log.error(f'write tag {key}: {e}')
+            self._put_write_results([(key, tag, STATUS_WRITE_ERROR, None)])
+            return
+        # перезаписанный тег встаёт в конец: при пересечении адресов побеждает последняя запись
+        pending.pop(key, None)
+        pending[key] = WriteItem(key=key, tag=tag, source=source, value=value.value, words=words)
+
+    def _drain_writes(self, pending):
+        try:
+            while True:
+                self._add_write(pending, self.write_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+    def _write_results(self, blocks, results):
+        # тег записан, если записаны все блоки с его адресами
+        failed = {item.key for block, ok in zip(blocks, results) if not ok for item in block.items}
+        items = {item.key: item for block in blocks for item in block.items}
+        self._put_write_results([
+            (key, item.tag, STATUS_WRITE_ERROR, None) if key in failed else (key, item.tag, 0, item.value)
+            for key, item in items.items()
+        ])
+
+    def _write_block(self, client, block:WriteBlock):
+        if block.area == 'C':
+            if block.count == 1:
+                return client.write_single_coil(block.addr, block.values[0])
+            return client.write_multiple_coils(block.addr, block.values)
+        if block.count == 1:
+            return client.write_single_register(block.addr, block.values[0])
+        return client.write_multiple_registers(block.addr, block.values)
+
+    def _write_pending(self, client, pending):
+        blocks = build_write_plan(list(pending.values()))
+        results = []
+        for block in blocks:
+            start_time = time.time()
+            try:
+                ok = bool(self._write_block(client, block))
+            except Exception as e:
+                self.log.error(f'write modbus block error: {e}')
+                ok = False
+            if not ok:
+                self.log.error(f'fail write modbus block: {block.area}:{block.addr}:{block.count}')
+            self._put_duration('write_block', 'ok' if ok else 'error', start_time)
+            results.append(ok)
+        self._write_results(blocks, results)
+
+    def _write_loop(self):
+        # свой клиент: ModbusClient не потокобезопасен, а чтение идёт в основном потоке
+        client = ModbusClient(host=self.host,
+                              port=self.port,
+                              unit_id=self.unit_id,
+                              auto_open=True,
+                              auto_close=self.auto_close,
+                              timeout=self.timeout)
+        while True:
+            pending = {}
+            self._add_write(pending, self.write_queue.get())
+            self._drain_writes(pending)
+            if pending:
+                self._write_pending(client, pending)
+
     def write(self):
-        self.log.debug(f'write cycle process start')
-        if not self.is_read_only and self.write_queue is not None:
-            while not self.write_queue.empty():
-                value = self.write_queue.get()
-                log.dbug(f'write tag: {value}')
-        self.log.debug(f'write cycle processed')
+        # запись выполняет поток записи, цикл чтения только проверяет, что он жив
+        if self.write_queue is not None and (self.writer is None or not self.writer.is_alive()):
+            if self.writer is not None:
+                self.log.error(f'connector {self.name} writer stoped, restart')
+            self.writer = threading.Thread(target=self._write_loop, name=f'{self.name}-writer', daemon=True)
+            self.writer.start()
+
+    async def _write_block_async(self, block:WriteBlock):
+        client = self.async_write_client
+        start_time = time.time()
+        try:
+            async with self.runtime.host_limit(self.host):
+                if block.area == 'C':
+                    if block.count == 1:
+                        await client.write_single_coil(block.addr, block.values[0])
+                    else:
+                        await client.write_multiple_coils(block.addr, block.values)
+                elif block.count == 1:
+                    await client.write_single_register(block.addr, block.values[0])
+                else:
+                    await client.write_multiple_registers(block.addr, block.values)
+            self._put_duration('write_block', 'ok', start_time)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.error(f'fail write modbus block: {block.area}:{block.addr}:{block.count}, error: {e}')
+            self._put_duration('write_block', 'error', start_time)
+            return False
+
+    async def _write_pending_async(self, pending):
+        if self.async_write_client is None:
+            self.async_write_client = AsyncModbusClient(host=self.host,
+                                                        port=self.port,
+                                                        unit_id=self.unit_id,
+                                                        timeout=self.timeout)
+        blocks = build_write_plan(list(pending.values()))
+        try:
+            # блоки не пересекаются по адресам и конвейеризуются в одном соединении
+            results = await asyncio.gather(*(self._write_block_async(block) for block in blocks))
+        finally:
+            if self.auto_close:
+                await self.async_write_client.close()
+        self._write_results(blocks, results)
+
+    async def write_async(self):
+        if self.write_queue is None:
+            return
+        self._drain_writes(self.pending_writes)
+        # пока идёт предыдущая запись, новые значения копятся и объединяются
+        if self.pending_writes and (self.write_task is None or self.write_task.done()):
+            pending, self.pending_writes = self.pending_writes, {}
+            self.write_task = asyncio.create_task(self._write_pending_async(pending))
 
 if __name__ == '__main__':
     log = logger.get_logger('ConnectorModbus') 
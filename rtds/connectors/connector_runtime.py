@@ -0,0 +1,52 @@
+import asyncio
+import os
+from typing import Dict, List
+from dotenv import load_dotenv
+from loggers import logger
+
+load_dotenv()
+
+# Максимальное число одновременных запросов к одному хосту
+CONNECTOR_HOST_CONCURRENCY = int(os.getenv('CONNECTOR_HOST_CONCURRENCY', '4'))
+
+
+class ConnectorRuntime:
+    """
+    Среда выполнения коннекторов на одном event loop.
+
+    Все коннекторы работают в одном процессе, каждый в своей задаче asyncio.
+    Число одновременных запросов к одному хосту ограничивается семафором.
+    """
+
+    def __init__(self, connectors: List, log_queue=None, host_concurrency=CONNECTOR_HOST_CONCURRENCY):
+        self.connectors = connectors
+        self.host_concurrency = host_concurrency
+        self.log = logger.get_logger('connectors', log_queue)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def host_limit(self, host) -> asyncio.Semaphore:
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = asyncio.Semaphore(self.host_concurrency)
+            self._host_limits[host] = limit
+        return limit
+
+    async def _run_connector(self, connector):
+        try:
+            await connector.run_async()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.error(f'connector {connector.name} stoped, error: {e}')
+
+    async def main(self):
+        for connector in self.connectors:
+            connector.runtime = self
+        self.log.info(f'connector runtime started, connectors: {len(self.connectors)}')
+        await asyncio.gather(*(self._run_connector(connector) for connector in self.connectors))
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            self.log.warning('KeyboardInterrupt received. Exiting connector runtime...')
@@ -1,114 +1,189 @@
-import math
 from multiprocessing import Queue
 import queue
-import random as rnd
-from typing import Dict
+import time
+import numpy as np
 from connectors.connector_abc import ConnectorABC
 from models.tag import TagType, Tag, TagValue
+from models.value_batch import ValueBatch, RECORD_SIZE, FLAG_VALUE
 from loggers import logger
 
-class ConnectorTest(ConnectorABC): 
-    sources: Dict[str, dict] = {}
-
-    def __init__(self, 
-                 log, 
-                 name:str, 
-                 cycle:int, 
-                 connection_string:str, 
-                 tags, 
-                 read_queue:Queue=None, 
-                 is_read_only:bool=True, 
-                 write_queue:Queue=None, 
-                 description:str=None, 
+FUNCS = ['sin', 'cos', 'sawtooth', 'square', 'rnd', 'line']
+# функции тегов нагрузочного режима по кругу
+STRESS_FUNCS = ['sin', 'cos', 'sawtooth', 'square', 'rnd']
+
+# запись ValueBatch (index, type, flags, status, update_time, value), значение bool/int - int64, float - float64
+RECORD_DTYPE = np.dtype([
+    ('index', '<u4'), ('type', 'u1'), ('flags', 'u1'), ('pad', 'V2'),
+    ('status', '<i4'), ('update_time', '<f8'), ('value', '<f8'),
+])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+
+def parse_source(source: str):
+    """
+    Разобрать источник тега: func=sin;period=10;scale=100
+    """
+    params = dict(map(str.strip, sub.split('=', 1)) for sub in source.split(';') if '=' in sub)
+    func = params.get('func', '').lower()
+    if func not in FUNCS:
+        raise Exception(f'Function "{func}" is not supported.')
+    return func, float(params.get('period', 1)), float(params.get('scale', 1))
+
+
+class ConnectorTest(ConnectorABC):
+    """
+    Генератор тестовых сигналов, значения всех тегов считаются векторно одним шагом за цикл.
+
+    Параметры строки подключения:
+    - stress_tags=N - добавить N сгенерированных float-тегов {name}.stress_{i} для нагрузочного теста
+    - stress_log=0|1 - писать сгенерированные теги в историю (по умолчанию 1)
+    """
+
+    def __init__(self,
+                 log,
+                 name:str,
+                 cycle:int,
+                 connection_string:str,
+                 tags,
+                 read_queue:Queue=None,
+                 is_read_only:bool=True,
+                 write_queue:Queue=None,
+                 description:str=None,
                  metrics_queue:Queue=None):
         super().__init__(log, name, cycle, connection_string, tags, read_queue, is_read_only, write_queue, description, metrics_queue)
-        for _, tag in self.tags:
+        self.tags = list(self.tags)
+        self.tags.extend(self.stress_tags())
+
+        count = len(self.tags)
+        self.funcs = np.array([FUNCS.index('line')] * count, dtype=np.int8)
+        self.period = np.ones(count)
+        self.scale = np.zeros(count)
+        self.phase = np.zeros(count)
+        for i, (_, tag) in enumerate(self.tags):
             if tag.source:
-                # Парсим строку источника
-                source_params = dict(map(str.strip, sub.split('=', 1)) for sub in tag.source.split(';') if '=' in sub)
-                func = source_params.get('func').lower()
-                period = float(source_params.get('period', 1))
-                scale = float(source_params.get('scale', 1))
-                if func not in ['sin', 'cos', 'sawtooth', 'square', 'rnd', 'line']:
-                    raise Exception(f'Function "{func}" is not supported.')
-                source = {
-                    'func': func,
-                    'period': period,
-                    'scale': scale,
-                    'phase': 0.0
-                }
-                self.sources[tag.name] = source
-        self.log.debug(f'lodaed tags sourcecs {self.sources}')
-        
-    def calc_value(self, tag_name: str):
-        source = self.sources.get(tag_name)
-        if source:
-            if source['func'] == 'line':
-                return source['scale']
-            elif source['func'] == 'rnd':
-                return rnd.uniform(0, source['scale'])
-            elif source['func'] == 'square':
-                source['phase'] += self.cycle / source['period']
-                if source['phase'] > source['period']:
-                    source['phase'] = 0.0
-                    source['scale'] *= -1
-                return source['scale']
-            elif source['func'] == 'sawtooth':
-                source['phase'] += self.cycle / source['period']
-                if source['phase'] > source['scale']:
-                    source['phase'] = 0.0
-                return source['phase']
-            elif source['func'] == 'sin':
-                result = source['scale'] * math.sin(math.radians(source['phase']))
-            elif source['func'] == 'cos':
-                result = source['scale'] * math.cos(math.radians(source['phase']))
-            else:
-                raise ValueError(f"Unsupported function: {source['func']}")
-
-            # Инкрементируем фазу для периодических функций
-            if source['func'] in ['sin', 'cos']:
-                delta_phi = (360  * self.cycle) / (60.0 * source['period']) 
-                source['phase'] += delta_phi
-                if source['phase'] >= 360:
-                    source['phase'] %= 360
-                
-                self.log.debug(f"{tag_name}.phase={source['phase']}")
-
-            return result
-        else:
-            return 0.0
+                func, self.period[i], self.scale[i] = parse_source(tag.source)
+                self.funcs[i] = FUNCS.index(func)
+        self.masks = {func: self.funcs == code for code, func in enumerate(FUNCS)}
+        self.masks['trig'] = self.masks['sin'] | self.masks['cos']
+        self.masks['ramp'] = self.masks['sawtooth'] | self.masks['square']
+        self.rng = np.random.default_rng()
+
+        self.records = None
+        self.log.debug(f'loaded tags sources: {count}')
+
+    def stress_tags(self):
+        count = int(self.connection_string.get('stress_tags', 0))
+        is_log = self.connection_string.get('stress_log', '1') == '1'
+        # теги, сохранённые при прошлой загрузке конфигурации, уже есть среди тегов коннектора
+        names = {key for key, _ in self.tags}
+        tags = []
+        for i in range(count):
+            if f'{self.name}.stress_{i}' in names:
+                continue
+            tag = Tag(name=f'{self.name}.stress_{i}',
+                      type_=TagType.FLOAT,
+                      source=f'func={STRESS_FUNCS[i % len(STRESS_FUNCS)]};period={1 + i % 60};scale=100',
+                      connector_name=self.name,
+                      is_log=is_log)
+            tags.append((tag.name, tag))
+        if count:
+            self.log.info(f'generated {len(tags)} of {count} stress tags')
+        return tags
+
+    def calc_values(self):
+        """
+        Значения всех тегов за один цикл, фаза периодических функций сдвигается на cycle.
+        """
+        masks = self.masks
+        values = np.zeros(len(self.tags))
+
+        values[masks['line']] = self.scale[masks['line']]
+
+        rnd = masks['rnd']
+        values[rnd] = self.rng.uniform(0, self.scale[rnd])
+
+        # меандр и пила: фаза растёт на cycle / period, меандр меняет знак при переполнении фазы
+        ramp = masks['ramp']
+        self.phase[ramp] += self.cycle / self.period[ramp]
+        square_flip = masks['square'] & (self.phase > self.period)
+        self.scale[square_flip] *= -1
+        self.phase[square_flip] = 0.0
+        self.phase[masks['sawtooth'] & (self.phase > self.scale)] = 0.0
+        values[masks['square']] = self.scale[masks['square']]
+        values[masks['sawtooth']] = self.phase[masks['sawtooth']]
+
+        # синус и косинус: фаза в градусах, period - период в минутах
+        trig = masks['trig']
+        radians = np.radians(self.phase)
+        values[masks['sin']] = (self.scale * np.sin(radians))[masks['sin']]
+        values[masks['cos']] = (self.scale * np.cos(radians))[masks['cos']]
+        self.phase[trig] = (self.phase[trig] + 360 * self.cycle / (60.0 * self.period[trig])) % 360
+        return values
+
+    def _init_records(self):
+        # заготовка записей пакета, каждый цикл меняются только время и значения
+        types = np.array([tag.type_.value for _, tag in self.tags], dtype=np.uint8)
+        self.float_mask = types == TagType.FLOAT.value
+        self.int_mask = np.isin(types, [TagType.BOOL.value, TagType.INT.value])
+        self.var_indexes = [i for i, (_, tag) in enumerate(self.tags) if not (self.float_mask[i] or self.int_mask[i])]
+        self.records = np.zeros(len(self.tags), dtype=RECORD_DTYPE)
+        self.records['index'] = [tag.index for _, tag in self.tags]
+        self.records['type'] = types
+        self.records['flags'] = FLAG_VALUE
+        self.records = self.records[self.float_mask | self.int_mask]
+        self.record_float_mask = self.float_mask[self.float_mask | self.int_mask]
 
     def read(self):
         self.log.debug(f'read cycle process start')
-        for key, tag in self.tags:
-            value = TagValue(name=key, type_=tag.type_, status=0, value=self.calc_value(key))
-            self.read_queue.put(value)
-            self.log.debug(f'read tag: {value}')
-        self.log.debug(f'read cycle processed')
+        values = self.calc_values()
+
+        if self.tag_table is None and self.tags and self.tags[0][1].index is not None:
+            if self.records is None:
+                self._init_records()
+            self._put_records(values)
+        else:
+            for i, (key, tag) in enumerate(self.tags):
+                self._put_value(key, tag, 0, values[i].item())
+        self.log.debug(f'read cycle processed, tags: {len(values)}')
+
+    def _put_records(self, values):
+        # пакет цикла собирается одним массивом, bool/int - целая часть значения в int64
+        numeric = values[self.float_mask | self.int_mask]
+        raw = numeric.copy()
+        int_values = raw.view('<i8')
+        int_values[~self.record_float_mask] = numeric[~self.record_float_mask].astype(np.int64)
+        self.records['update_time'] = time.time()
+        self.records['value'] = raw
+        if self.batch is None:
+            self.batch = ValueBatch()
+        self.batch.extend(self.records.tobytes(), len(self.records))
+        for i in self.var_indexes:
+            key, tag = self.tags[i]
+            self._put_value(key, tag, 0, values[i].item())
 
     def write(self):
         self.log.debug(f'write cycle process start')
         if not self.is_read_only and self.write_queue is not None:
             while not self.write_queue.empty():
                 value = self.write_queue.get()
-                log.debug(f'write tag: {value}')
+                self.log.debug(f'write tag: {value}')
         self.log.debug(f'write cycle processed')
 
 if __name__ == '__main__':
     log = logger.get_logger('ConnectorTest')
-    log.info('test begin')    
-    tags = {}
+    log.info('test begin')
+    tags = []
     read_queue = queue.Queue()
     write_queue = queue.Queue()
-    
+
     for i in range(1000):
-        tag = Tag(name=f'tag_{i}', type_=TagType.INT, connector_name='connector_test', value=i)
-        tags[tag.name] = tag
-        
-    for key in list(tags):
-        tag = tags[key]
+        tag = Tag(name=f'tag_{i}', type_=TagType.INT, connector_name='connector_test', value=i, source='func=sin;period=1;scale=100')
+        tags.append((tag.name, tag))
+
+    for _, tag in tags:
         write_queue.put(TagValue(tag=tag))
-        
-    connector = ConnectorTest(name='test', cycle=0.5, connection_string='connstr', tags=tags, read_queue=read_queue, write_queue=write_queue)
+
+    connector = ConnectorTest(log=log, name='test', cycle=0.5, connection_string='connector=ConnectorTest', tags=tags,
+                              read_queue=read_queue, write_queue=write_queue, is_read_only=False)
     connector.run()
-    log.info('test end')    
+    log.info('test end')
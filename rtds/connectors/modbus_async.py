@@ -0,0 +1,150 @@
+import asyncio
+import struct
+
+# Коды функций modbus
+READ_COILS = 0x01
+READ_DISCRETE_INPUTS = 0x02
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+WRITE_SINGLE_COIL = 0x05
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_COILS = 0x0F
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+MBAP_HEADER = struct.Struct('>HHHB')
+
+
+class ModbusError(Exception):
+    pass
+
+
+class AsyncModbusClient:
+    """
+    Асинхронный клиент modbus/tcp.
+
+    Запросы конвейеризуются в одном сокете: каждый запрос получает свой
+    transaction id, ответы сопоставляются с ожидающими запросами по нему,
+    поэтому несколько запросов могут находиться "в полёте" одновременно.
+    """
+
+    def __init__(self, host, port=502, unit_id=1, timeout=30):
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._recv_task = None
+        self._pending = {}
+        self._transaction_id = 0
+        # одновременные запросы на закрытом соединении открывают его один раз
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def open(self):
+        async with self._open_lock:
+            if self.is_open:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            self._recv_task = asyncio.create_task(self._recv_loop())
+
+    async def close(self):
+        if self._recv_task:
+            self._recv_task.cancel()
+            self._recv_task = None
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+        self._fail_pending(ModbusError('connection closed'))
+
+    def _fail_pending(self, error):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def _recv_loop(self):
+        try:
+            while True:
+                header = await self._reader.readexactly(MBAP_HEADER.size)
+                transaction_id, _, length, _ = MBAP_HEADER.unpack(header)
+                pdu = await self._reader.readexactly(length - 1)
+                future = self._pending.pop(transaction_id, None)
+                if future is None or future.done():
+                    continue
+                if pdu[0] & 0x80:
+                    future.set_exception(ModbusError(f'modbus exception code: {pdu[1]}'))
+                else:
+                    future.set_result(pdu)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail_pending(ModbusError(f'connection lost: {e}'))
+            if self._writer:
+                self._writer.close()
+                self._writer = None
+
+    async def request(self, function, payload: bytes) -> bytes:
+        if not self.is_open:
+            await self.open()
+        self._transaction_id = self._transaction_id % 0xFFFF + 1
+        transaction_id = self._transaction_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[transaction_id] = future
+        pdu = bytes([function]) + payload
+        self._writer.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, self.unit_id) + pdu)
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(transaction_id, None)
+
+    async def _read_bits(self, function, addr, count):
+        pdu = await self.request(function, struct.pack('>HH', addr, count))
+        data = pdu[2:2 + pdu[1]]
+        return [bool(data[i // 8] >> (i % 8) & 1) for i in range(count)]
+
+    async def _read_registers(self, function, addr, count):
+        pdu = await self.request(function, struct.pack('>HH', addr, count))
+        return list(struct.unpack(f'>{count}H', pdu[2:2 + count * 2]))
+
+    async def read_coils(self, addr, count):
+        return await self._read_bits(READ_COILS, addr, count)
+
+    async def read_discrete_inputs(self, addr, count):
+        return await self._read_bits(READ_DISCRETE_INPUTS, addr, count)
+
+    async def read_holding_registers(self, addr, count):
+        return await self._read_registers(READ_HOLDING_REGISTERS, addr, count)
+
+    async def read_input_registers(self, addr, count):
+        return await self._read_registers(READ_INPUT_REGISTERS, addr, count)
+
+    async def write_single_coil(self, addr, value):
+        await self.request(WRITE_SINGLE_COIL, struct.pack('>HH', addr, 0xFF00 if value else 0x0000))
+        return True
+
+    async def write_single_register(self, addr, value):
+        await self.request(WRITE_SINGLE_REGISTER, struct.pack('>HH', addr, value))
+        return True
+
+    async def write_multiple_coils(self, addr, values):
+        data = bytearray((len(values) + 7) // 8)
+        for i, value in enumerate(values):
+            if value:
+                data[i // 8] |= 1 << (i % 8)
+        await self.request(WRITE_MULTIPLE_COILS, struct.pack('>HHB', addr, len(values), len(data)) + bytes(data))
+        return True
+
+    async def write_multiple_registers(self, addr, values):
+        count = len(values)
+        await self.request(WRITE_MULTIPLE_REGISTERS, struct.pack(f'>HHB{count}H', addr, count, count * 2, *values))
+        return True
@@ -0,0 +1,181 @@
+"""
+Декодирование значений тегов из слов регистров modbus.
+
+Тип и параметры задаются в источнике тега после количества регистров:
+    RH:10:2:float32
+    RH:10:2:float32:wo=little
+    RI:0:1:int16:scale=0.1:offset=-40
+    RH:5:1:bit=3
+    RH:20:8:float32 - массив из 4 значений
+
+Кодек собирается при загрузке конфигурации: struct.Struct тега и функция декодирования,
+выбранная по типу, масштабу и биту. Блок регистров один раз упаковывается в байты,
+каждый тег читается одним unpack_from со своего смещения, без ветвлений по типу в цикле чтения.
+"""
+import struct
+
+# тип -> (формат struct, регистров на значение)
+REGISTER_TYPES = {
+    'int16': ('h', 1),
+    'uint16': ('H', 1),
+    'int32': ('i', 2),
+    'uint32': ('I', 2),
+    'float32': ('f', 2),
+    'int64': ('q', 4),
+    'uint64': ('Q', 4),
+    'float64': ('d', 4),
+}
+DEFAULT_TYPE = 'uint16'
+ORDERS = ('big', 'little')
+OPTIONS = ('bo', 'wo', 'scale', 'offset', 'bit')
+
+
+class BitCodec:
+    """
+    Катушки и дискретные входы: значение - bool, при count > 1 - список.
+    """
+    swap = False
+
+    def __init__(self, count):
+        self.count = count
+        self.decode = self._decode_value if count == 1 else self._decode_list
+
+    def _decode_value(self, buffers, offset):
+        return buffers[0][offset]
+
+    def _decode_list(self, buffers, offset):
+        return buffers[0][offset:offset + self.count]
+
+    def encode(self, value):
+        values = list(value) if self.count > 1 else [value]
+        if len(values) != self.count:
+            raise ValueError(f'value size {len(values)} does not match source count {self.count}')
+        return [bool(item) for item in values]
+
+
+class RegisterCodec:
+    """
+    Регистры: count слов -> count / ширина типа значений.
+
+    bo - порядок байт в слове, wo - порядок слов в многословном значении, по умолчанию big (ABCD).
+    Слова блока упаковываются big-endian (буфер 0) и, если нужно, little-endian (буфер 1).
+    Порядок байт значения сводится к выбору буфера и порядка формата struct:
+        ABCD (bo=big, wo=big)       - буфер 0, '>'
+        CDAB (bo=big, wo=little)    - буфер 1, '<'
+        BADC (bo=little, wo=big)    - буфер 1, '>'
+        DCBA (bo=little, wo=little) - буфер 0, '<'
+    """
+
+    def __init__(self, count, type_=DEFAULT_TYPE, bo='big', wo='big', scale=1.0, offset=0.0, bit=None):
+        if type_ not in REGISTER_TYPES:
+            raise ValueError(f'type {type_} must be in list: {", ".join(REGISTER_TYPES)}')
+        if bo not in ORDERS or wo not in ORDERS:
+            raise ValueError(f'byte and word order must be in list: {", ".join(ORDERS)}')
+        char, width = REGISTER_TYPES[type_]
+        if count % width:
+            raise ValueError(f'count {count} must be a multiple of {width} for type {type_}')
+        if bit is not None and not 0 <= bit < width * 16:
+            raise ValueError(f'bit {bit} must be in range 0..{width * 16 - 1} for type {type_}')
+        if bit is not None and char in 'fd':
+            raise ValueError(f'bit can not be extracted from type {type_}')
+        self.count = count
+        self.type_ = type_
+        self.values = count // width
+        self.scale = scale
+        self.offset = offset
+        self.bit = bit
+        self.swap = bo != wo
+        self.is_integer = char not in 'fd'
+        self.struct = struct.Struct(f'{">" if wo == "big" else "<"}{self.values}{char}')
+        self.words = struct.Struct(f'{"<" if self.swap else ">"}{count}H')
+
+        is_scaled = scale != 1 or offset != 0
+        is_array = self.values > 1
+        if bit is not None:
+            self.decode = self._decode_bits if is_array else self._decode_bit
+        elif is_scaled:
+            self.decode = self._decode_scaled_list if is_array else self._decode_scaled
+        else:
+            self.decode = self._decode_list if is_array else self._decode_value
+
+    def _decode_value(self, buffers, offset):
+        return self.struct.unpack_from(buffers[self.swap], offset * 2)[0]
+
+    def _decode_list(self, buffers, offset):
+        return list(self.struct.unpack_from(buffers[self.swap], offset * 2))
+
+    def _decode_scaled(self, buffers, offset):
+        return self.struct.unpack_from(buffers[self.swap], offset * 2)[0] * self.scale + self.offset
+
+    def _decode_scaled_list(self, buffers, offset):
+        scale, shift = self.scale, self.offset
+        return [value * scale + shift for value in self.struct.unpack_from(buffers[self.swap], offset * 2)]
+
+    def _decode_bit(self, buffers, offset):
+        return bool(self.struct.unpack_from(buffers[self.swap], offset * 2)[0] >> self.bit & 1)
+
+    def _decode_bits(self, buffers, offset):
+        bit = self.bit
+        return [bool(value >> bit & 1) for value in self.struct.unpack_from(buffers[self.swap], offset * 2)]
+
+    def encode(self, value):
+        """
+        Значение тега -> слова регистров, обратное декодированию.
+        """
+        if self.bit is not None:
+            raise ValueError('write of a single bit is not supported, write the whole register')
+        values = list(value) if self.values > 1 else [value]
+        if len(values) != self.values:
+            raise ValueError(f'value size {len(values)} does not match {self.values} values of type {self.type_}')
+        if self.scale != 1 or self.offset != 0:
+            values = [(item - self.offset) / self.scale for item in values]
+        if self.is_integer:
+            values = [int(round(item)) for item in values]
+        if self.type_ == DEFAULT_TYPE:
+            # слово без типа: отрицательные значения пишутся дополнительным кодом, как раньше
+            values = [item & 0xFFFF for item in values]
+        try:
+            return list(self.words.unpack(self.struct.pack(*values)))
+        except struct.error as e:
+            raise ValueError(f'value {value} does not fit type {self.type_}: {e}')
+
+
+def parse_options(fields):
+    """
+    ['float32', 'wo=little', 'scale=0.1'] -> {'type_': 'float32', 'wo': 'little', 'scale': 0.1}
+    """
+    options = {}
+    for item in fields:
+        key, sep, value = item.partition('=')
+        key = key.strip().lower()
+        if not sep:
+            if 'type_' in options:
+                raise ValueError(f'type is set twice: {options["type_"]}, {key}')
+            options['type_'] = key
+        elif key in ('bo', 'wo'):
+            options[key] = value.strip().lower()
+        elif key in ('scale', 'offset'):
+            try:
+                options[key] = float(value)
+            except ValueError:
+                raise ValueError(f'{key} {value} must be float')
+        elif key == 'bit':
+            try:
+                options[key] = int(value)
+            except ValueError:
+                raise ValueError(f'bit {value} must be int')
+        else:
+            raise ValueError(f'option {key} must be in list: {", ".join(OPTIONS)}')
+    return options
+
+
+def make_codec(area, count, fields=()):
+    """
+    Кодек источника: fields - поля источника после количества.
+    """
+    if area in ('C', 'DI'):
+        if fields:
+            raise ValueError(f'area {area} has no data types, got: {":".join(fields)}')
+        return BitCodec(count)
+    return RegisterCodec(count, **parse_options(fields))
+
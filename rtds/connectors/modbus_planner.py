@@ -0,0 +1,195 @@
+import struct
+from dataclasses import dataclass, field
+from typing import List
+from connectors.modbus_codec import make_codec
+
+# Области адресов modbus: катушки, дискретные входы, входные и holding регистры
+AREAS = ('C', 'DI', 'RI', 'RH')
+
+# Ограничения протокола на количество элементов в одном запросе
+MAX_COUNT = {
+    'C': 2000,
+    'DI': 2000,
+    'RI': 125,
+    'RH': 125,
+}
+
+
+@dataclass
+class ModbusSource:
+    area: str
+    addr: int
+    count: int
+    codec: object = None
+
+    def __post_init__(self):
+        if self.codec is None:
+            self.codec = make_codec(self.area, self.count)
+
+
+@dataclass
+class ReadItem:
+    key: str
+    tag: object
+    source: ModbusSource
+    offset: int = 0
+
+
+@dataclass
+class ReadBlock:
+    area: str
+    addr: int
+    count: int
+    items: List[ReadItem] = field(default_factory=list)
+    words: object = None
+    swapped_words: object = None
+
+    @property
+    def end(self):
+        return self.addr + self.count
+
+    def prepare(self):
+        """
+        Форматы упаковки слов блока, второй - только если он нужен тегам блока.
+        """
+        if self.area in ('RI', 'RH'):
+            self.words = struct.Struct(f'>{self.count}H')
+            if any(item.source.codec.swap for item in self.items):
+                self.swapped_words = struct.Struct(f'<{self.count}H')
+
+    def buffers(self, result_list):
+        """
+        Результат чтения -> буферы для декодеров тегов: байты регистров или список битов.
+        """
+        if self.words is None:
+            return (result_list, None)
+        return (self.words.pack(*result_list),
+                self.swapped_words.pack(*result_list) if self.swapped_words is not None else None)
+
+
+def parse_source(source: str) -> ModbusSource:
+    #source = 'C:0:10' | 'DI:0:10' | 'RI:0:10' | 'RH:0:10' | 'RH:0:2:float32:wo=little:scale=0.1'
+    sl = source.upper().split(':')
+    if len(sl) < 3:
+        raise ValueError(f'source wrong format: {sl}')
+    if sl[0] not in AREAS:
+        raise ValueError(f'source wrong format: {sl}, must be in list: C, DI, RI, RH')
+    try:
+        addr = int(sl[1])
+    except:
+        raise ValueError(f'source wrong format: {sl}, addr {sl[1]} must be int')
+    try:
+        count = int(sl[2])
+    except:
+        raise ValueError(f'source wrong format: {sl}, count {sl[2]} must be int')
+    if count < 1 or count > MAX_COUNT[sl[0]]:
+        raise ValueError(f'source wrong format: {sl}, count must be in range 1..{MAX_COUNT[sl[0]]}')
+    try:
+        codec = make_codec(sl[0], count, sl[3:])
+    except ValueError as e:
+        raise ValueError(f'source wrong format: {sl}, {e}')
+    return ModbusSource(area=sl[0], addr=addr, count=count, codec=codec)
+
+
+def build_read_plan(items: List[ReadItem], max_gap: int = 0) -> List[ReadBlock]:
+    """
+    Группирует теги по областям и объединяет близкие диапазоны адресов в блоки.
+
+    Диапазоны объединяются, если разрыв между ними не больше max_gap
+    и итоговый блок не превышает ограничение протокола для области.
+    Для каждого тега вычисляется смещение внутри блока.
+    """
+    blocks = []
+    for area in AREAS:
+        area_items = sorted(
+            (item for item in items if item.source.area == area),
+            key=lambda item: (item.source.addr, item.source.count)
+        )
+        block = None
+        for item in area_items:
+            item_end = item.source.addr + item.source.count
+            if block is not None \
+                    and item.source.addr <= block.end + max_gap \
+                    and max(block.end, item_end) - block.addr <= MAX_COUNT[area]:
+                block.count = max(block.end, item_end) - block.addr
+            else:
+                block = ReadBlock(area=area, addr=item.source.addr, count=item.source.count)
+                blocks.append(block)
+            item.offset = item.source.addr - block.addr
+            block.items.append(item)
+    for block in blocks:
+        block.prepare()
+    return blocks
+
+
+# Области, доступные для записи, и ограничения протокола на запись (FC15 / FC16)
+WRITE_AREAS = ('C', 'RH')
+MAX_WRITE_COUNT = {
+    'C': 1968,
+    'RH': 123,
+}
+
+
+@dataclass
+class WriteItem:
+    key: str
+    tag: object
+    source: ModbusSource
+    value: object
+    words: list = field(default_factory=list)
+
+
+@dataclass
+class WriteBlock:
+    area: str
+    addr: int
+    values: list = field(default_factory=list)
+    items: List[WriteItem] = field(default_factory=list)
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    @property
+    def end(self):
+        return self.addr + len(self.values)
+
+
+def encode_write(source: ModbusSource, value) -> list:
+    """
+    Значение тега -> значения адресов источника: bool для катушек, слова 0..65535 для регистров
+    (кодеком типа источника).
+    """
+    if source.area not in WRITE_AREAS:
+        raise ValueError(f'area {source.area} is read only')
+    return source.codec.encode(value)
+
+
+def build_write_plan(items: List[WriteItem]) -> List[WriteBlock]:
+    """
+    Объединяет записи в блоки FC15/FC16.
+
+    Записи накладываются на карту адресов в порядке поступления (при пересечении побеждает последняя),
+    подряд идущие адреса объединяются в блок не длиннее ограничения протокола. Разрывы не заполняются:
+    запись лишних адресов изменила бы значения, которые никто не писал.
+    """
+    blocks = []
+    for area in WRITE_AREAS:
+        addresses = {}
+        owners = {}
+        for item in items:
+            if item.source.area != area:
+                continue
+            for offset, value in enumerate(item.words):
+                addresses[item.source.addr + offset] = value
+                owners[item.source.addr + offset] = item
+        block = None
+        for addr in sorted(addresses):
+            if block is None or addr != block.end or block.count >= MAX_WRITE_COUNT[area]:
+                block = WriteBlock(area=area, addr=addr)
+                blocks.append(block)
+            block.values.append(addresses[addr])
+            item = owners[addr]
+            if not block.items or block.items[-1] is not item:
+                block.items.append(item)
+    return blocks
@@ -21,6 +21,8 @@ class MetricEnum(Enum):
     KAFKA_PRODUCER_DURATION=8
     PROCESS_CPU_USAGE=9
     PROCESS_MEMORY_USAGE=10    
+    PRODUCER_LAG_ROWS=11
+    PRODUCER_LAG_SECONDS=12
 
 
 class Metric:
@@ -100,6 +102,18 @@ STORE_ROWS_GAUGE = Gauge(
     unit='count'
 )
 
+# Отставание kafka producer
+PRODUCER_LAG_ROWS = Gauge(
+    name='producer_lag_rows',
+    documentation='history rows not yet acknowledged by kafka',
+    unit='count'
+)
+PRODUCER_LAG_SECONDS = Gauge(
+    name='producer_lag',
+    documentation='age of the oldest history row not yet acknowledged by kafka',
+    unit='seconds'
+)
+
 PROCESS_CPU_USAGE = Gauge(
     name ='process_cpu_percent',
     documentation='Загрузка CPU процессом, %',
@@ -152,6 +166,10 @@ def handle_metrics():
                         PROCESS_CPU_USAGE.labels(*metric.labels).set(metric.value)
                     case MetricEnum.PROCESS_MEMORY_USAGE:
                         PROCESS_MEMORY_USAGE.labels(*metric.labels).set(metric.value)
+                    case MetricEnum.PRODUCER_LAG_ROWS:
+                        PRODUCER_LAG_ROWS.set(metric.value)
+                    case MetricEnum.PRODUCER_LAG_SECONDS:
+                        PRODUCER_LAG_SECONDS.set(metric.value)
                     case _:
                         log.warning(f'Unsupported metric: {metric}')
             except KeyboardInterrupt:
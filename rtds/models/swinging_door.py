@@ -0,0 +1,112 @@
+"""
+Сжатие истории float-тегов методом вращающейся двери (swinging door trending, SDT).
+
+Для каждого тега хранится последняя архивная точка A и последняя принятая точка L.
+Новая точка P сужает коридор наклонов из A: верхняя дверь - наклон на (P + deviation),
+нижняя - на (P - deviation). Пока коридор не закрылся (нижний наклон <= верхнего),
+из A есть прямая, проходящая не дальше deviation от всех точек до P.
+Когда коридор закрывается, в архив уходит точка L, она становится новой A.
+В архив пишутся измеренные значения, а не точки на прямой коридора, поэтому ошибка
+линейной интерполяции между архивными точками в худшем случае до 2 * deviation.
+
+Состояние всех тегов лежит в массивах array по индексу тега (Tag.index),
+без объекта на тег.
+"""
+from array import array
+
+NO_POINTS = ()
+INF = float('inf')
+
+# состояние тега
+EMPTY = 0      # архивной точки нет
+ARCHIVED = 1   # есть архивная точка, принятых после неё нет
+PENDING = 2    # после архивной точки есть неархивированная L
+
+
+class SwingingDoor:
+
+    def __init__(self, size):
+        self.size = size
+        self.state = array('b', bytes(size))
+        self.status = array('i', bytes(4 * size))
+        self.archived_time = array('d', bytes(8 * size))
+        self.archived_value = array('d', bytes(8 * size))
+        self.last_time = array('d', bytes(8 * size))
+        self.last_value = array('d', bytes(8 * size))
+        self.slope_up = array('d', bytes(8 * size))
+        self.slope_low = array('d', bytes(8 * size))
+
+    def _archive(self, index, time, value, status):
+        self.state[index] = ARCHIVED
+        self.status[index] = status
+        self.archived_time[index] = time
+        self.archived_value[index] = value
+
+    def flush(self, index):
+        """
+        Отдать неархивированную точку L (например, перед остановкой), состояние сбрасывается.
+        """
+        points = NO_POINTS
+        if self.state[index] == PENDING:
+            points = ((self.last_time[index], self.last_value[index], self.status[index]),)
+        self.state[index] = EMPTY
+        return points
+
+    def add(self, index, time, value, status, deviation, max_interval=0):
+        """
+        Принять точку тега, вернуть точки для записи в историю: кортежи (time, value, status).
+        time - секунды (timestamp), max_interval - принудительная запись не реже, секунд (0 - нет).
+        """
+        state = self.state[index]
+
+        # пропуск значения или смена статуса: дописать L и начать заново с текущей точки
+        if value is None or state == EMPTY or status != self.status[index]:
+            points = self.flush(index)
+            if value is None:
+                return points + ((time, None, status),)
+            self._archive(index, time, value, status)
+            return points + ((time, value, status),)
+
+        archived_time = self.archived_time[index]
+        archived_value = self.archived_value[index]
+        dt = time - archived_time
+        if dt <= 0:
+            # время не растёт - точка не даёт наклона, считаем её принятой
+            if state == ARCHIVED:
+                self.slope_up[index] = INF
+                self.slope_low[index] = -INF
+            self.state[index] = PENDING
+            self.last_time[index] = time
+            self.last_value[index] = value
+            return NO_POINTS
+
+        up = (value + deviation - archived_value) / dt
+        low = (value - deviation - archived_value) / dt
+        points = NO_POINTS
+        if state == PENDING:
+            up = min(up, self.slope_up[index])
+            low = max(low, self.slope_low[index])
+            if low > up:
+                # коридор закрылся: L в архив, коридор строится заново от неё
+                last_time = self.last_time[index]
+                last_value = self.last_value[index]
+                points = ((last_time, last_value, status),)
+                self._archive(index, last_time, last_value, status)
+                archived_time, archived_value = last_time, last_value
+                dt = time - archived_time
+                if dt > 0:
+                    up = (value + deviation - archived_value) / dt
+                    low = (value - deviation - archived_value) / dt
+                else:
+                    up, low = INF, -INF
+
+        if max_interval and time - archived_time >= max_interval:
+            self._archive(index, time, value, status)
+            return points + ((time, value, status),)
+
+        self.state[index] = PENDING
+        self.last_time[index] = time
+        self.last_value[index] = value
+        self.slope_up[index] = up
+        self.slope_low[index] = low
+        return points
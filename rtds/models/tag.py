@@ -73,8 +73,18 @@ class Tag:
     is_log: bool = False
     connector_name = None
     description: str = None
+    index: int = None
+    # Сжатие истории: абсолютная зона нечувствительности, зона в % от диапазона (max_ - min_),
+    # запись только при изменении, принудительная запись раз в max_silence секунд
+    deadband: float = 0
+    deadband_pct: float = 0
+    on_change: bool = False
+    max_silence: float = 0
+    # допуск сжатия вращающейся дверью для float-тегов (0 - выключено), см. models.swinging_door
+    sdt_deviation: float = 0
 
-    def __init__(self, name, type_, source=None, min_=None, max_=None, connector_name=None, is_log=False, value=0, description=None):
+    def __init__(self, name, type_, source=None, min_=None, max_=None, connector_name=None, is_log=False, value=0, description=None,
+                 deadband=0, deadband_pct=0, on_change=False, max_silence=0, sdt_deviation=0):
         self.name = name
         self.type_ = type_
         self.source = source
@@ -83,6 +93,15 @@ class Tag:
         self.connector_name = connector_name
         self.is_log = is_log
         self.description = description
+        self.deadband = deadband or 0
+        self.deadband_pct = deadband_pct or 0
+        self.on_change = on_change
+        self.max_silence = max_silence or 0
+        self.sdt_deviation = sdt_deviation or 0
+        # последнее записанное в историю значение
+        self.log_value = None
+        self.log_status = None
+        self.log_time = None
         if type_ == TagType.BOOL:
             self.value = bool(value)
         elif type_ == TagType.INT:
@@ -98,10 +117,10 @@ class Tag:
         else:
             raise Exception(f'Unsupport tag type: {type_}<>{type(value)}')
 
-    def set(self, value, status):
+    def update(self, value, status):
         self.status = status
         self.update_time = datetime.now(timezone.utc)
-        if self.min_ == self.max_:
+        if value is None or self.min_ == self.max_:
             self.value = value
         elif value < self.min_:
             self.value = self.min_
@@ -111,8 +130,47 @@ class Tag:
             self.status = -1
         else:
             self.value = value
+
+    def set(self, value, status):
+        self.update(value, status)
         return TagValue(self)
 
+    def is_sdt(self):
+        return bool(self.sdt_deviation) and self.type_ == TagType.FLOAT
+
+    def is_compressed(self):
+        return bool(self.deadband or self.deadband_pct or self.on_change)
+
+    def need_log(self):
+        """
+        Нужно ли записать текущее значение в историю с учётом настроек сжатия,
+        если да - значение запоминается как последнее записанное.
+        """
+        if not self.is_log:
+            return False
+        if self.is_compressed() and self.log_time is not None and self.status == self.log_status:
+            silence = (self.update_time - self.log_time).total_seconds()
+            if not (self.max_silence and silence >= self.max_silence) and not self._out_of_deadband():
+                return False
+        self.log_value = self.value
+        self.log_status = self.status
+        self.log_time = self.update_time
+        return True
+
+    def _out_of_deadband(self):
+        if self.value is None or self.log_value is None or self.type_ not in (TagType.INT, TagType.FLOAT):
+            return self.value != self.log_value
+        deadband = self.deadband
+        if self.deadband_pct:
+            if self.max_ is not None and self.min_ is not None and self.max_ != self.min_:
+                span = self.max_ - self.min_
+            else:
+                span = self.log_value
+            deadband = max(deadband, abs(span) * self.deadband_pct / 100)
+        if deadband:
+            return abs(self.value - self.log_value) > deadband
+        return self.value != self.log_value
+
     def toJSON(self):
         return json.dumps(
             self,
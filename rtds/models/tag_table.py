@@ -0,0 +1,217 @@
+"""
+Таблица текущих значений тегов в разделяемой памяти.
+
+Раскладка сегмента фиксирована:
+- заголовок (HEADER_SIZE байт): сигнатура, признак устаревания, число тегов, поколение
+- каталог имён тегов: count * NAME_SIZE байт
+- слоты значений: count * SLOT_SIZE байт, по одному на тег (индекс тега = Tag.index)
+
+Каждый слот пишет только один процесс (коннектор тега или главный процесс),
+поэтому для согласованного чтения достаточно seqlock: писатель делает номер
+последовательности нечётным на время записи и чётным после неё, читатель
+повторяет чтение, если номер нечётный или изменился.
+"""
+import json
+import os
+import select
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+from models.tag import TagType
+
+
+MAGIC = b'RTDT'
+HEADER = struct.Struct('<4sIIQ')
+HEADER_SIZE = 64
+NAME_SIZE = 200
+
+SEQ = struct.Struct('<Q')
+# seq, timestamp, status, type, flags, int_value, float_value, var_len
+SLOT = struct.Struct('<QdiBB2xqdH6x')
+VAR_SIZE = 208
+SLOT_SIZE = SLOT.size + VAR_SIZE
+
+FLAG_VALUE = 1
+
+TYPES = list(TagType)
+
+TagSlot = namedtuple('TagSlot', ['seq', 'type_', 'status', 'update_time', 'value'])
+
+
+def _encode(type_: TagType, value):
+    if value is None:
+        return 0, 0, 0.0, b''
+    if type_ in (TagType.BOOL, TagType.INT):
+        return FLAG_VALUE, int(value), 0.0, b''
+    if type_ == TagType.FLOAT:
+        return FLAG_VALUE, 0, float(value), b''
+    var = json.dumps(value, default=str).encode('utf-8')
+    if len(var) > VAR_SIZE:
+        raise ValueError(f'value too long for tag table slot: {len(var)} > {VAR_SIZE} bytes')
+    return FLAG_VALUE, 0, 0.0, var
+
+
+def _decode(type_: TagType, flags, int_value, float_value, var):
+    if not flags & FLAG_VALUE:
+        return None
+    if type_ == TagType.BOOL:
+        return bool(int_value)
+    if type_ == TagType.INT:
+        return int_value
+    if type_ == TagType.FLOAT:
+        return float_value
+    return json.loads(var)
+
+
+class TagTable:
+
+    def __init__(self, shm: shared_memory.SharedMemory, names, notify_fds=None):
+        self.shm = shm
+        self.buf = shm.buf
+        self.names = names
+        self.count = len(names)
+        self.slots_offset = HEADER_SIZE + self.count * NAME_SIZE
+        self._notify_r, self._notify_w = notify_fds if notify_fds else (None, None)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, tags: dict, name=None):
+        """
+        Создать таблицу для тегов, индексы слотов берутся из Tag.index.
+        """
+        names = [None] * len(tags)
+        for tag in tags.values():
+            names[tag.index] = tag.name
+        size = HEADER_SIZE + len(names) * (NAME_SIZE + SLOT_SIZE)
+        if name:
+            try:
+                old = shared_memory.SharedMemory(name=name)
+                old.close()
+                old.unlink()
+            except FileNotFoundError:
+                pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, 0, len(names), time.time_ns())
+        for i, tag_name in enumerate(names):
+            raw = tag_name.encode('utf-8')[:NAME_SIZE]
+            shm.buf[HEADER_SIZE + i * NAME_SIZE:HEADER_SIZE + i * NAME_SIZE + len(raw)] = raw
+
+        notify_r, notify_w = os.pipe()
+        os.set_blocking(notify_r, False)
+        os.set_blocking(notify_w, False)
+        table = cls(shm, names, (notify_r, notify_w))
+        for tag in tags.values():
+            table.write(tag.index, tag.type_, tag.status, tag.value)
+        return table
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Подключиться к существующей таблице по имени (например, из процесса API).
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        magic, _, count, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f'shared memory {name} is not a tag table')
+        names = []
+        for i in range(count):
+            raw = bytes(shm.buf[HEADER_SIZE + i * NAME_SIZE:HEADER_SIZE + (i + 1) * NAME_SIZE])
+            names.append(raw.rstrip(b'\x00').decode('utf-8', errors='ignore'))
+        return cls(shm, names)
+
+    @property
+    def is_retired(self):
+        return HEADER.unpack_from(self.buf, 0)[1] != 0
+
+    def write(self, index, type_: TagType, status, value, update_time: float = None):
+        offset = self.slots_offset + index * SLOT_SIZE
+        try:
+            flags, int_value, float_value, var = _encode(type_, value)
+        except (ValueError, TypeError):
+            flags, int_value, float_value, var = 0, 0, 0.0, b''
+            status = -1
+        seq = SEQ.unpack_from(self.buf, offset)[0] + 1
+        SEQ.pack_into(self.buf, offset, seq)
+        SLOT.pack_into(self.buf, offset, seq,
+                       update_time if update_time is not None else time.time(),
+                       status if status is not None else 0,
+                       type_.value, flags, int_value, float_value, len(var))
+        if var:
+            start = offset + SLOT.size
+            self.buf[start:start + len(var)] = var
+        SEQ.pack_into(self.buf, offset, seq + 1)
+
+    def seq(self, index):
+        return SEQ.unpack_from(self.buf, self.slots_offset + index * SLOT_SIZE)[0]
+
+    def read(self, index, retries=100) -> TagSlot:
+        offset = self.slots_offset + index * SLOT_SIZE
+        for _ in range(retries):
+            seq, update_time, status, type_, flags, int_value, float_value, var_len = SLOT.unpack_from(self.buf, offset)
+            if seq & 1:
+                continue
+            var = bytes(self.buf[offset + SLOT.size:offset + SLOT.size + var_len]) if var_len else b''
+            if SEQ.unpack_from(self.buf, offset)[0] != seq:
+                continue
+            type_ = TYPES[type_]
+            return TagSlot(seq, type_, status, update_time, _decode(type_, flags, int_value, float_value, var))
+        raise TimeoutError(f'tag table slot {index} is busy')
+
+    def changed(self, indexes, seen):
+        """
+        Вернуть слоты, изменившиеся с прошлого чтения; seen - номера последовательностей по индексам.
+        """
+        for index in indexes:
+            if self.seq(index) != seen[index]:
+                slot = self.read(index)
+                seen[index] = slot.seq
+                yield index, slot
+
+    def notify(self):
+        if self._notify_w is not None:
+            try:
+                os.write(self._notify_w, b'\x01')
+            except BlockingIOError:
+                # читатель и так будет разбужен
+                pass
+
+    def wait(self, timeout):
+        """
+        Ждать уведомления от коннекторов не дольше timeout секунд.
+        """
+        if self._notify_r is None:
+            time.sleep(timeout)
+            return False
+        ready, _, _ = select.select([self._notify_r], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self._notify_r, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        return bool(ready)
+
+    def fileno(self):
+        return self._notify_r
+
+    def retire(self):
+        HEADER.pack_into(self.buf, 0, MAGIC, 1, self.count, time.time_ns())
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        for fd in (self._notify_r, self._notify_w):
+            if fd is not None:
+                os.close(fd)
+        self._notify_r = self._notify_w = None
+        self.retire()
+        self.close()
+        self.shm.unlink()
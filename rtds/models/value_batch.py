@@ -0,0 +1,112 @@
+"""
+Пакет значений тегов для передачи между процессами одним сообщением.
+
+Сообщение - это bytes:
+- заголовок: сигнатура, количество записей, размер области записей
+- записи фиксированного размера: индекс тега, тип, флаги, статус, время, значение
+- область переменной длины: значения строк, массивов и дат в JSON
+
+Для bool/int значение хранится как int64, для float - как float64,
+для остальных типов - смещение и длина в области переменной длины.
+"""
+import json
+import struct
+from dataclasses import dataclass, field
+from typing import List
+from models.tag import TagType
+
+MAGIC = b'RTVB'
+HEADER = struct.Struct('<4sII')
+# index, type, flags, status, update_time, value
+INT_RECORD = struct.Struct('<IBB2xidq')
+FLOAT_RECORD = struct.Struct('<IBB2xidd')
+VAR_RECORD = struct.Struct('<IBB2xidII')
+RECORD_SIZE = INT_RECORD.size
+
+FLAG_VALUE = 1
+FLAG_LOG = 2
+
+TYPES = list(TagType)
+
+
+@dataclass
+class TagDirectory:
+    """
+    Соответствие индексов тегов их именам, отправляется в процесс хранилища при загрузке конфигурации.
+    """
+    names: List[str] = field(default_factory=list)
+
+
+class ValueBatch:
+
+    def __init__(self):
+        self.records = bytearray()
+        self.var = bytearray()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, index, type_: TagType, status, value, update_time: float, is_log=False):
+        flags = FLAG_LOG if is_log else 0
+        if status is None:
+            status = 0
+        if value is None:
+            self.records += INT_RECORD.pack(index, type_.value, flags, status, update_time, 0)
+        elif type_ in (TagType.BOOL, TagType.INT):
+            self.records += INT_RECORD.pack(index, type_.value, flags | FLAG_VALUE, status, update_time, int(value))
+        elif type_ == TagType.FLOAT:
+            self.records += FLOAT_RECORD.pack(index, type_.value, flags | FLAG_VALUE, status, update_time, float(value))
+        else:
+            var = json.dumps(value, default=str).encode('utf-8')
+            self.records += VAR_RECORD.pack(index, type_.value, flags | FLAG_VALUE, status, update_time, len(self.var), len(var))
+            self.var += var
+        self.count += 1
+
+    def extend(self, records: bytes, count):
+        """
+        Добавить готовые записи фиксированного размера (без области переменной длины),
+        например собранные одним массивом numpy.
+        """
+        if len(records) != count * RECORD_SIZE:
+            raise ValueError(f'wrong records size: {len(records)} != {count} * {RECORD_SIZE}')
+        self.records += records
+        self.count += count
+
+    def clear(self):
+        self.records = bytearray()
+        self.var = bytearray()
+        self.count = 0
+
+    def to_bytes(self) -> bytes:
+        return HEADER.pack(MAGIC, self.count, len(self.records)) + self.records + self.var
+
+    @staticmethod
+    def is_batch(data) -> bool:
+        return isinstance(data, bytes) and data[:len(MAGIC)] == MAGIC
+
+    @staticmethod
+    def records_of(data: bytes):
+        """
+        Итератор записей пакета: (index, type_, status, update_time, value, is_log)
+        """
+        magic, count, records_size = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('wrong value batch format')
+        var_offset = HEADER.size + records_size
+        offset = HEADER.size
+        for _ in range(count):
+            index, type_, flags, status, update_time, value = INT_RECORD.unpack_from(data, offset)
+            type_ = TYPES[type_]
+            if not flags & FLAG_VALUE:
+                value = None
+            elif type_ == TagType.BOOL:
+                value = bool(value)
+            elif type_ == TagType.FLOAT:
+                value = FLOAT_RECORD.unpack_from(data, offset)[5]
+            elif type_ != TagType.INT:
+                start, size = VAR_RECORD.unpack_from(data, offset)[5:7]
+                start += var_offset
+                value = json.loads(data[start:start + size])
+            offset += RECORD_SIZE
+            yield index, type_, status, update_time, value, bool(flags & FLAG_LOG)
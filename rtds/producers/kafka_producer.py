@@ -1,8 +1,10 @@
 # producer/history_to_kafka.py
 import os, sys
 import time
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import Session
+import threading
+import zlib
+from collections import deque
+from sqlalchemy import select
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from kafka import KafkaProducer
 import json
@@ -12,8 +14,10 @@ from dotenv import load_dotenv
 sys.path.extend(['.','..'])
 
 from loggers import logger
-from store.sqldb import History, State, Tag
+from store.sqldb import State, Tag, select_history, add_counter, COUNTER_ACKED
+from store.engine import get_engine
 from metrics import server as metrics
+from producers import wire_format
 
 load_dotenv()
 
@@ -21,133 +25,274 @@ log = None
 shared_metrics_queue=None
 
 # Настройки
-DB_URL = os.getenv('STORE_DB_URL', "sqlite:///data/history.db")
-STORE_SQL_ENGINE_ECHO = os.getenv('STORE_SQL_ENGINE_ECHO', 'false').lower() in ('true', '1', 'on','yes')
 KAFKA_BOOTSTRAP_SERVERS = [host.strip() for host in os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092').split(',')]
 KAFKA_TOPIC = os.getenv('KAFKA_TOPIC','history_data')
 BATCH_SIZE = int(os.getenv('KAFKA_BATCH_SIZE', '100'))  # Количество записей в одном пакете
+# Формат сообщений: json - массив объектов, binary - producers/wire_format.py
+WIRE_FORMAT = os.getenv('KAFKA_WIRE_FORMAT', 'json').lower()
+# Сколько пачек может ждать подтверждения Kafka одновременно
+MAX_IN_FLIGHT = int(os.getenv('KAFKA_MAX_IN_FLIGHT', '8'))
+# Настройки KafkaProducer: ожидание наполнения, размер пачки в байтах, сжатие (gzip, snappy, lz4, zstd)
+LINGER_MS = int(os.getenv('KAFKA_LINGER_MS', '5'))
+PRODUCER_BATCH_BYTES = int(os.getenv('KAFKA_PRODUCER_BATCH_BYTES', '262144'))
+COMPRESSION_TYPE = os.getenv('KAFKA_COMPRESSION_TYPE', 'none').lower()
+# none - пачка целиком в одно сообщение, tag - пачка делится на сообщения по партициям по хэшу tag_id
+PARTITIONING = os.getenv('KAFKA_PARTITIONING', 'none').lower()
+# Как часто перечитывать число партиций топика
+PARTITIONS_REFRESH_SEC = 60
 
 engine = None
 producer = None
 shared_metrics_queue = None
 
+# Пачки, отправленные в Kafka и ещё не подтверждённые, в порядке id
+in_flight = deque()
+# id последней прочитанной из History записи
+cursor_id = None
+# id, до которого все записи подтверждены Kafka, и его значение, сохранённое в State
+acked_id = None
+saved_id = None
+# подтверждённые строки, ещё не добавленные в счётчик State
+acked_rows = 0
+# Типы тегов по id, вместо join с Tag на каждую пачку
+tag_types = {}
+# Партиции топика и время их чтения из метаданных
+topic_partitions = []
+topic_partitions_time = 0
+
+
+class InFlightBatch:
+    """
+    Отправленная пачка истории: подтверждается, когда Kafka подтвердила все её сообщения.
+    """
+
+    def __init__(self, max_id, rows_count, parts=1):
+        self.max_id = max_id
+        self.rows_count = rows_count
+        self.start_time = time.time()
+        self.error = None
+        self.done = threading.Event()
+        self._parts = parts
+        self._lock = threading.Lock()
+
+    def success(self, record_metadata):
+        log.debug(f"Kafka delivery successful: partition={record_metadata.partition}, offset={record_metadata.offset}")
+        with self._lock:
+            self._parts -= 1
+            if self._parts == 0:
+                self.done.set()
+
+    def failure(self, exception):
+        log.debug(f"Failed to deliver Kafka message: {exception}")
+        with self._lock:
+            self.error = exception
+            self.done.set()
+
+
 def init():
-    global engine, producer
-    # Создаём engine и producer
+    global engine, producer, cursor_id, acked_id, saved_id
+    # Engine общий для процесса, producer создаём один раз
     if not engine:
-        log.info('create engine ...')
-        engine = create_engine(DB_URL, echo=STORE_SQL_ENGINE_ECHO)
+        engine = get_engine()
         log.info('engine created success')
     if not producer:        
         log.info('creating producer ...')
         producer = KafkaProducer(
             bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            value_serializer=lambda v: json.dumps(v, default=str).encode('utf-8')
+            value_serializer=serialize,
+            linger_ms=LINGER_MS,
+            batch_size=PRODUCER_BATCH_BYTES,
+            compression_type=None if COMPRESSION_TYPE == 'none' else COMPRESSION_TYPE,
         )
-        log.info('producer created success')
+        log.info(f'producer created success, wire format: {WIRE_FORMAT}, max in flight: {MAX_IN_FLIGHT}, partitioning: {PARTITIONING}')
+    if acked_id is None:
+        acked_id = saved_id = load_last_id()
+        cursor_id = acked_id
+        log.info(f'producer starts after history ID: {acked_id}')
+
+def serialize(value):
+    # двоичная пачка уже закодирована
+    if isinstance(value, bytes):
+        return value
+    return json.dumps(value, default=str).encode('utf-8')
 
 def close_resources():
     if producer:
         log.info('Closing resources...')
+        # дождаться подтверждения отправленных пачек и сохранить позицию
+        producer.flush()
+        advance_acked()
+        save_last_id()
         producer.close()
 
-def send_history_batch():
+def load_last_id():
+    with engine.connect() as connection:
+        value = connection.execute(
+            select(State.value).where(State.id == 'producer_last_id')).scalar_one_or_none()
+    return int(value) if value else 0
+
+def save_last_id():
     """
-    Отправляет пачку записей из History в Kafka и обновляет State.
-    Выбирает записи с ID > producer_last_id.
+    Сохранить в State id, до которого вся история подтверждена Kafka.
     """
-    with Session(engine) as session:
-        try:
-            start_time = time.time()
-
-            # Получаем последний отправленный ID из State
-            state = session.execute(
-                select(State).where(State.id=='producer_last_id')).scalar_one_or_none()
-            if not state:
-                log.debug("State record not found!")
-                last_id = 0
-            else:
-                last_id = int(state.value)
-            
-            log.debug(f"Fetching history records after ID: {last_id}")
-
-            # Выбираем следующие записи (упорядочено по tag_time, tag_id)
-            stmt = (
-                select(History, Tag)
-                .join(Tag, History.tag_id == Tag.id)
-                .where(History.id > last_id)
-                .order_by(History.id)
-                .limit(BATCH_SIZE)
+    global saved_id, acked_rows
+    if acked_id == saved_id:
+        return
+    stmt = sqlite_insert(State).values({'id':'producer_last_id', 'value': f'{acked_id}'})
+    on_conflict_stmt = stmt.on_conflict_do_update(
+        index_elements=[State.id], set_={"value": stmt.excluded.value}
+    )
+    with engine.begin() as connection:
+        connection.execute(on_conflict_stmt)
+        add_counter(connection, COUNTER_ACKED, acked_rows)
+    saved_id = acked_id
+    acked_rows = 0
+    log.debug(f"Saved producer_last_id: {acked_id}")
+
+def load_tag_types():
+    global tag_types
+    with engine.connect() as connection:
+        tag_types = dict(connection.execute(select(Tag.id, Tag.type_)).all())
+
+def fetch_rows():
+    """
+    Следующие записи истории после cursor_id (keyset) по всем таблицам истории, с типами тегов из кэша.
+    """
+    with engine.connect() as connection:
+        rows = select_history(
+            connection,
+            where=lambda table: table.c.id > cursor_id,
+            order_by=lambda table: table.c.id,
+            limit=BATCH_SIZE
+        )
+
+    if any(row.tag_id not in tag_types for row in rows):
+        # конфигурация могла быть перезагружена
+        load_tag_types()
+    return rows
+
+def encode_rows(rows):
+    """
+    Сообщение Kafka из записей History.
+    """
+    if WIRE_FORMAT == 'binary':
+        return wire_format.encode_batch(
+            (row.tag_id, row.tag_time, tag_types[row.tag_id], row.status,
+             row.bool_value, row.int_value, row.float_value, row.var_value)
+            for row in rows
+        )
+    return [
+        {
+            "tg": row.tag_id,
+            "tm": f'{row.tag_time.isoformat()}Z',
+            "tp": tag_types[row.tag_id],
+            "st": row.status,
+            "bv": row.bool_value,
+            "iv": row.int_value,
+            "fv": row.float_value,
+            "vv": row.var_value
+        }
+        for row in rows
+    ]
+
+def advance_acked():
+    """
+    Сдвинуть acked_id по подтверждённым пачкам с начала очереди, по порядку:
+    пачка за неподтверждённой ждёт, даже если Kafka уже подтвердила её.
+    При ошибке доставки отправка повторяется с acked_id (at-least-once).
+    """
+    global acked_id, cursor_id, acked_rows
+    while in_flight and in_flight[0].done.is_set():
+        batch = in_flight.popleft()
+        if batch.error:
+            log.error(f"Error sending history batch: {batch.error}, resend after ID: {acked_id}")
+            put_metric('error', time.time() - batch.start_time)
+            # подтверждения остальных пачек больше не нужны, они будут отправлены повторно
+            in_flight.clear()
+            cursor_id = acked_id
+            time.sleep(1)
+            return
+        acked_id = batch.max_id
+        acked_rows += batch.rows_count
+        put_metric('ok', time.time() - batch.start_time)
+        log.debug(f"Sent {batch.rows_count} history records to Kafka. Last ID: {batch.max_id}")
+
+def put_metric(status, duration):
+    if shared_metrics_queue:
+        shared_metrics_queue.put(
+            metrics.Metric(
+                name = metrics.MetricEnum.KAFKA_PRODUCER_DURATION, 
+                labels = [status],
+                value  = duration
             )
-            rows = session.execute(stmt).all()
-
-            if not rows:
-                log.debug("No new history records to send.")
-                time.sleep(0.1)
-                return
-
-            # Подготовка данных для Kafka
-            messages = []
-            max_id = last_id
-
-            for row in rows:
-                msg = {
-                    "tg": row.History.tag_id,
-                    "tm": f'{row.History.tag_time.isoformat()}Z',
-                    "tp": row.Tag.type_,
-                    "st": row.History.status,
-                    "bv": row.History.bool_value,
-                    "iv": row.History.int_value,
-                    "fv": row.History.float_value,
-                    "vv": row.History.var_value
-                }
-                messages.append(msg)
-                max_id = row.History.id  # Обновляем до последней временной метки
-
-            # Отправка в Kafka
-            log.debug(f'Sending message: count={len(messages)}')
-            producer.send(KAFKA_TOPIC, value=messages).add_callback(success_callback).add_errback(error_callback)
-            producer.flush()  # Ждём подтверждения отправки
-
-            # Обновляем State
-            # Атомарный UPSERT для всех записей
-            stmt = sqlite_insert(State).values({'id':'producer_last_id', 'value': f'{max_id}'})
-            on_conflict_stmt = stmt.on_conflict_do_update(
-                index_elements=[State.id], set_={"value": stmt.excluded.value}
-            )            
-            session.execute(on_conflict_stmt)
-            session.commit()
-
-            log.debug(f"Sent {len(messages)} history records to Kafka. Last ID: {max_id}")
-            if shared_metrics_queue:
-                shared_metrics_queue.put(
-                    metrics.Metric(
-                        name = metrics.MetricEnum.KAFKA_PRODUCER_DURATION, 
-                        labels = ['ok'],
-                        value  = time.time() - start_time
-                    )
-                )
-        
-        except KeyboardInterrupt:
-            raise
-        except Exception as e:
-            session.rollback()
-            log.error(f"Error sending history batch: {e}", exc_info=True)
-            if shared_metrics_queue:
-                shared_metrics_queue.put(
-                    metrics.Metric(
-                        name = metrics.MetricEnum.KAFKA_PRODUCER_DURATION, 
-                        labels = ['error'],
-                        value  = time.time() - start_time
-                    )
-                )
-            raise
-
-def success_callback(records):
-    log.debug(f"Kafka delivery successful: partition={records.partition}, offset={records.offset}")
-
-def error_callback(exception):
-    log.debug(f"Failed to deliver Kafka message: {exception}")
+        )
+
+def get_partitions():
+    global topic_partitions, topic_partitions_time
+    if time.time() - topic_partitions_time > PARTITIONS_REFRESH_SEC:
+        partitions = producer.partitions_for(KAFKA_TOPIC)
+        if not partitions:
+            raise Exception(f'no partitions for topic {KAFKA_TOPIC}')
+        if len(partitions) != len(topic_partitions):
+            log.info(f'topic {KAFKA_TOPIC} partitions: {len(partitions)}')
+        topic_partitions = sorted(partitions)
+        topic_partitions_time = time.time()
+    return topic_partitions
+
+def partition_of(tag_id, partitions_count):
+    # crc32 не зависит от процесса (в отличие от hash), тег всегда попадает в одну партицию
+    return zlib.crc32(tag_id.encode('utf-8')) % partitions_count
+
+def split_by_partition(rows):
+    """
+    Разделить записи по партициям топика, порядок записей каждого тега сохраняется.
+    """
+    partitions = get_partitions()
+    parts = {}
+    for row in rows:
+        partition = partitions[partition_of(row.tag_id, len(partitions))]
+        parts.setdefault(partition, []).append(row)
+    return parts
+
+def send_history_batch():
+    """
+    Шаг конвейера отправки истории в Kafka:
+    учесть подтверждённые пачки, сохранить producer_last_id и, если очередь
+    неподтверждённых не заполнена, отправить следующую пачку, не дожидаясь подтверждения.
+    """
+    global cursor_id
+
+    advance_acked()
+    save_last_id()
+
+    if len(in_flight) >= MAX_IN_FLIGHT:
+        in_flight[0].done.wait(1)
+        return
+
+    rows = fetch_rows()
+    if not rows:
+        log.debug("No new history records to send.")
+        if in_flight:
+            in_flight[0].done.wait(0.1)
+        else:
+            time.sleep(0.1)
+        return
+
+    known_rows = [row for row in rows if row.tag_id in tag_types]
+    if len(known_rows) < len(rows):
+        log.warning(f'Skipped {len(rows) - len(known_rows)} history records of unknown tags')
+    parts = split_by_partition(known_rows) if PARTITIONING == 'tag' else {None: known_rows}
+
+    batch = InFlightBatch(rows[-1].id, len(rows), len(parts))
+    if known_rows:
+        for partition, part_rows in parts.items():
+            log.debug(f'Sending message: rows={len(part_rows)}, partition={partition}')
+            producer.send(KAFKA_TOPIC, value=encode_rows(part_rows), partition=partition).add_callback(batch.success).add_errback(batch.failure)
+    else:
+        # отправлять нечего, пачка сразу считается подтверждённой
+        batch.done.set()
+    in_flight.append(batch)
+    cursor_id = batch.max_id
 
 def run(log_queue=None, metrics_queue=None):    # Start up the server to expose the metrics.    
     global log, shared_metrics_queue
@@ -168,15 +313,17 @@ def run(log_queue=None, metrics_queue=None):    # Start up the server to expose
                     last_collect_metrics = time.time()
                     # Метрики kafka producer
                     metrics.collect_process_metrics('producer', metrics_queue)
-            time.sleep(0.1)  # Задержка между отправками
         except KeyboardInterrupt:
             log.info('KeyboardInterrupt received. Exiting...')
             break
         except Exception as e:
             log.error(f'Unhandled exception: {e}', exc_info=True)
+            time.sleep(1)
 
     close_resources()
 
 if __name__ == "__main__":
     log = logger.get_logger('kafka_producer')
+    init()
     send_history_batch()
+    close_resources()
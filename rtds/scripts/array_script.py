@@ -0,0 +1,132 @@
+"""
+Скрипт над группой тегов: одно выражение NumPy над значениями всех тегов группы.
+
+Текст скрипта:
+    #!array in=prefix:Boiler.T_ out=prefix:Boiler.TF_
+    x * 1.8 + 32
+
+Первая строка - заголовок с группами:
+- in=prefix:<префикс> | in=connector:<коннектор> - входная группа, теги по порядку имён
+- out=prefix:<префикс> - выходной тег для каждого входного: префикс + имя входного без префикса входной группы
+- out=tag:<имя> - один выходной тег, выражение возвращает скаляр (например x.sum())
+
+Остальные строки - выражение, в нём доступны x (значения, float64), s (статусы, int32) и np.
+Статус выходного тега - статус входного, для out=tag - первый ненулевой статус группы.
+Нечисловой элемент результата (NaN от входа без значения, бесконечность) пишется как None со статусом -1.
+"""
+import time
+import numpy as np
+from models.tag import TagType
+from scripts import script_compiler
+from scripts.script_abc import ScriptABC
+
+ARRAY_HEADER = '#!array'
+NUMERIC_TYPES = (TagType.BOOL, TagType.INT, TagType.FLOAT)
+CONVERTERS = {TagType.BOOL: bool, TagType.INT: int, TagType.FLOAT: float}
+# статус выхода без значения (NaN, бесконечность в результате)
+STATUS_NO_VALUE = -1
+
+
+def is_array_script(script):
+    return bool(script) and script.lstrip().startswith(ARRAY_HEADER)
+
+
+def parse_header(line):
+    """
+    '#!array in=prefix:A. out=prefix:B.' -> (('prefix', 'A.'), ('prefix', 'B.'))
+    """
+    options = {}
+    for item in line[len(ARRAY_HEADER):].split():
+        key, _, value = item.partition('=')
+        kind, _, arg = value.partition(':')
+        options[key.lower()] = (kind.lower(), arg)
+    source, target = options.get('in'), options.get('out')
+    if source is None or source[0] not in ('prefix', 'connector') or not source[1]:
+        raise script_compiler.ScriptError(f'array script: in=prefix:<prefix> or in=connector:<name> expected, header: {line}')
+    if target is None or target[0] not in ('prefix', 'tag') or not target[1]:
+        raise script_compiler.ScriptError(f'array script: out=prefix:<prefix> or out=tag:<name> expected, header: {line}')
+    return source, target
+
+
+class ArrayScript(ScriptABC):
+
+    def build(self, script):
+        header, _, expression = script.lstrip().partition('\n')
+        self.source, self.target = parse_header(header.strip())
+        self.script_object = script_compiler.compile_expression(self.name, expression)
+        self.info = script_compiler.ScriptInfo()
+        self.namespace_ = {'__builtins__': script_compiler.safe_builtins(), 'np': np}
+        self.inputs = []
+        self.outputs = []
+        self.output_index = np.empty(0, dtype=np.intp)
+
+    def bind(self, tags):
+        """
+        Разобрать группы по тегам конфигурации: входы, пары вход-выход для out=prefix.
+        """
+        kind, arg = self.source
+        if kind == 'prefix':
+            names = sorted(name for name in tags if name.startswith(arg))
+        else:
+            names = sorted(name for name, tag in tags.items() if tag.connector_name == arg)
+        # выходная группа может попасть под префикс входной
+        kind, target = self.target
+        names = [name for name in names if not (name.startswith(target) if kind == 'prefix' else name == target)]
+        inputs = [tags[name] for name in names if tags[name].type_ in NUMERIC_TYPES]
+        if len(inputs) != len(names):
+            self.log.warning(f'script {self.name}: {len(names) - len(inputs)} non numeric tags skipped')
+
+        outputs = []
+        if kind == 'prefix':
+            suffix_start = len(self.source[1]) if self.source[0] == 'prefix' else 0
+            for index, tag in enumerate(inputs):
+                output = tags.get(target + tag.name[suffix_start:])
+                if output is not None and output.type_ in NUMERIC_TYPES:
+                    outputs.append((index, output))
+            if len(outputs) != len(inputs):
+                self.log.warning(f'script {self.name}: no output tag for {len(inputs) - len(outputs)} inputs')
+        elif target in tags:
+            outputs.append((None, tags[target]))
+        else:
+            self.log.warning(f'script {self.name}: unknown output tag {target}')
+
+        self.inputs = inputs
+        self.output_index = np.array([index for index, _ in outputs if index is not None], dtype=np.intp)
+        self.outputs = [(tag, CONVERTERS[tag.type_]) for _, tag in outputs]
+        self.info = script_compiler.ScriptInfo(reads={tag.name for tag in inputs}, writes={tag.name for tag, _ in self.outputs})
+        super().bind(tags)
+
+    def call(self):
+        """
+        Одно вычисление над всей группой. Бюджет процессорного времени не применяется: выражение -
+        вызовы NumPy, которые трассировка строк не прерывает.
+        """
+        self.writes = []
+        start_time = time.time()
+        self.last_run = self.now()
+        try:
+            count = len(self.inputs)
+            namespace = self.namespace_
+            # None (нет значения) становится NaN
+            namespace['x'] = np.array([tag.value for tag in self.inputs], dtype=np.float64)
+            namespace['s'] = statuses = np.fromiter((tag.status for tag in self.inputs), dtype=np.int32, count=count)
+            result = eval(self.script_object, namespace)
+            if self.target[0] == 'tag':
+                if self.outputs:
+                    tag, convert = self.outputs[0]
+                    value = np.asarray(result).item()
+                    if np.isfinite(value):
+                        nonzero = np.flatnonzero(statuses)
+                        self.writes.append((tag, convert(value), int(statuses[nonzero[0]]) if nonzero.size else 0))
+                    else:
+                        self.writes.append((tag, None, STATUS_NO_VALUE))
+            else:
+                values = np.broadcast_to(np.asarray(result, dtype=np.float64), (count,))[self.output_index]
+                # NaN не переводится в int и становится True для bool: такие элементы пишутся без значения
+                finite = np.isfinite(values)
+                output_statuses = np.where(finite, statuses[self.output_index], STATUS_NO_VALUE).tolist()
+                for (tag, convert), value, is_finite, status in zip(self.outputs, values.tolist(), finite.tolist(), output_statuses):
+                    self.writes.append((tag, convert(value) if is_finite else None, status))
+        finally:
+            self.duration = time.time() - start_time
+        return self.writes
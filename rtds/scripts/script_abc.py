@@ -1,10 +1,36 @@
 from abc import ABC
 from datetime import datetime, timezone
+import os
+import sys
 import time
+from dotenv import load_dotenv
 from loggers import logger
+from models.tag import TagValue
 import metrics.server as metrics
+from scripts import script_compiler
+
+load_dotenv()
+
+# бюджет процессорного времени одного запуска скрипта, сек (0 - без ограничения)
+SCRIPT_CPU_BUDGET = float(os.getenv('SCRIPT_CPU_BUDGET', '1'))
+
+# запуск по периоду cycle или по изменению тегов, которые читает скрипт
+TRIGGER_CYCLE = 'cycle'
+TRIGGER_CHANGE = 'change'
+
+
+class ScriptTimeout(Exception):
+    pass
+
 
 class ScriptABC(ABC):
+    """
+    Скрипт компилируется в функцию с фиксированным пространством имён:
+    - get(name) -> TagValue, value(name), status(name) - чтение тегов
+    - set(tag_value), write(name, value, status=0) - запись, применяется после завершения скрипта одним пакетом
+    - self, log, now()
+    Теги с именем-константой привязываются к объектам Tag при загрузке конфигурации (bind).
+    """
     log = None
     name:str = None
     cycle:int = None
@@ -13,52 +39,169 @@ class ScriptABC(ABC):
     script_object: object = None
     last_run:datetime = None
     is_active:bool = False
+    trigger:str = TRIGGER_CYCLE
     description:str = None
 
-    def __init__(self, server, name, cycle, script, is_active=False, description=None):
+    def __init__(self, server, name, cycle, script, is_active=False, description=None, trigger=None):
         self.log = logger.get_logger(name, server.log_queue if server else None)
         self.server = server
         self.name = name
         self.cycle = cycle
         self.script = script
         self.description = description
-        if script and is_active:
+        self.trigger = (trigger or TRIGGER_CYCLE).lower()
+        if self.trigger not in (TRIGGER_CYCLE, TRIGGER_CHANGE):
+            self.log.warning(f'script {name}: unknown trigger {trigger}, {TRIGGER_CYCLE} is used')
+            self.trigger = TRIGGER_CYCLE
+        self.info = script_compiler.ScriptInfo()
+        self.function = None
+        self.tags = {}
+        self._all_tags = {}
+        self.writes = []
+        self.duration = 0
+        self.filename = script_compiler.script_filename(name)
+        if not script:
+            raise Exception('No text script')
+        if is_active:
             try:
-                self.script_object = compile(source=script, mode='exec', filename='')
+                self.build(script)
                 self.is_active = is_active
                 self.last_run = datetime.now(timezone.utc)
                 self.log.info(f'success build script: {name}')
             except Exception as e:
                 self.is_active = False
                 self.log.error(f"Script compile error, script text: '{script}', error: '{e}'")
+
+    def build(self, script):
+        self.script_object, self.info = script_compiler.compile_script(self.name, script)
+        self.function = script_compiler.make_function(self.script_object, self.namespace())
+
+    def namespace(self):
+        return {
+            'self': self,
+            'log': self.log,
+            'now': self.now,
+            'get': self.get,
+            'value': self.value,
+            'status': self.status,
+            'set': self.set,
+            'write': self.write,
+        }
+
+    def is_change(self):
+        return self.is_active and self.trigger == TRIGGER_CHANGE
+
+    def bind(self, tags):
+        """
+        Привязать теги скрипта к объектам Tag загруженной конфигурации.
+        """
+        self.tags = {}
+        for name in self.info.reads | self.info.writes:
+            tag = tags.get(name)
+            if tag is None:
+                self.log.warning(f'script {self.name}: unknown tag {name}')
+            else:
+                self.tags[name] = tag
+        self._all_tags = tags
+        if self.trigger == TRIGGER_CHANGE and not any(name in self.tags for name in self.info.reads):
+            self.log.warning(f'script {self.name}: no known tags read by constant name, {TRIGGER_CYCLE} trigger is used')
+            self.trigger = TRIGGER_CYCLE
+
+    def tag(self, name):
+        tag = self.tags.get(name)
+        if tag is None:
+            # имя вычислено в скрипте
+            tag = self._all_tags[name]
+        return tag
+
+    def now(self):
+        return datetime.now(timezone.utc)
+
+    def get(self, name):
+        return TagValue(self.tag(name))
+
+    def value(self, name):
+        return self.tag(name).value
+
+    def status(self, name):
+        return self.tag(name).status
+
+    def set(self, value):
+        if isinstance(value, TagValue):
+            self.writes.append((self.tag(value.name), value.value, value.status or 0))
         else:
-            raise Exception('No text script')
+            self.log.error(f'Unsupport type: {value}')
+
+    def write(self, name, value, status=0):
+        self.writes.append((self.tag(name), value, status))
 
     def run(self):
         if self.is_active and (datetime.now(timezone.utc) - self.last_run).total_seconds() > self.cycle:
-            start_time = time.time()
+            self.execute()
+
+    def call(self):
+        """
+        Выполнить функцию скрипта в текущем потоке, вернуть записи тегов.
+        Бюджет процессорного времени проверяется на каждой строке скрипта,
+        время внутри вызовов библиотек не прерывается.
+        """
+        self.writes = []
+        start_time = time.time()
+        self.last_run = datetime.now(timezone.utc)
+        trace = sys.gettrace()
+        if SCRIPT_CPU_BUDGET > 0:
+            self._deadline = time.thread_time() + SCRIPT_CPU_BUDGET
+            sys.settrace(self._trace)
+        try:
+            self.function()
+        finally:
+            if SCRIPT_CPU_BUDGET > 0:
+                sys.settrace(trace)
+            self.duration = time.time() - start_time
+        return self.writes
+
+    def _trace(self, frame, event, arg):
+        if frame.f_code.co_filename != self.filename:
+            return None
+        return self._trace_line
+
+    def _trace_line(self, frame, event, arg):
+        if event == 'line' and time.thread_time() > self._deadline:
+            raise ScriptTimeout(f'cpu budget {SCRIPT_CPU_BUDGET} sec exceeded')
+        return self._trace_line
+
+    def complete(self, writes, error=None):
+        """
+        Применить записи успешного запуска и отправить метрику. Вызывается в потоке главного цикла.
+        """
+        if error is None:
+            self.log.debug(f'script {self.name} executed success')
+            if self.server:
+                for tag, value, status in writes:
+                    self.server.write_tag(tag, value, status)
+        else:
+            # записи прерванного запуска не применяются
+            self.log.error(f'script {self.name} executed with error: {error}')
+        if self.server and self.server.metrics_queue:
+            self.server.metrics_queue.put(
+                metrics.Metric(
+                    name=metrics.MetricEnum.SCRIPT_DURATION,
+                    labels=(self.name, 'ok' if error is None else 'error'),
+                    value=self.duration
+                )
+            )
+
+    def execute(self):
+        """
+        Выполнить скрипт без проверки цикла, время запуска задаёт планировщик главного цикла
+        """
+        if self.is_active:
             try:
-                self.last_run = datetime.now(timezone.utc)
-                exec(self.script_object)
-                self.log.debug(f'script {self.name} executed success')
-                if self.server and self.server.metrics_queue:
-                    self.server.metrics_queue.put(
-                        metrics.Metric(
-                            name=metrics.MetricEnum.SCRIPT_DURATION,
-                            labels=(self.name,'ok'),
-                            value=time.time() - start_time
-                        )
-                    )
+                writes = self.call()
             except KeyboardInterrupt:
                 self.log.warning(f'script {self.name} executed with KeyboardInterrupt')
+                return
             except Exception as e:
-                self.log.error(f'script {self.name} executed  with error', e)
-                if self.server and self.server.metrics_queue:
-                    self.server.metrics_queue.put(
-                        metrics.Metric(
-                            name=metrics.MetricEnum.SCRIPT_DURATION,
-                            labels=(self.name,'error'),
-                            value=time.time() - start_time
-                        )
-                    )
-    
+                self.complete([], e)
+                return
+            self.complete(writes)
@@ -0,0 +1,187 @@
+"""
+Разбор и компиляция скриптов.
+
+Текст скрипта становится телом функции script() с фиксированным пространством имён:
+локальные переменные скрипта - быстрые локальные переменные функции, встроенные функции и импорт ограничены.
+Ограничения защищают от ошибок в скриптах, а не от злонамеренного кода.
+"""
+import ast
+import builtins
+import os
+import sys
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# модули, разрешённые для импорта в скриптах
+SCRIPT_IMPORTS = {name.strip() for name in os.getenv('SCRIPT_IMPORTS', 'math,cmath,random,statistics,datetime,time,json,re,itertools,functools,collections').split(',') if name.strip()}
+
+SAFE_BUILTINS = {name: getattr(builtins, name) for name in (
+    'abs', 'all', 'any', 'bool', 'bytes', 'chr', 'dict', 'divmod', 'enumerate', 'filter', 'float', 'format',
+    'frozenset', 'hash', 'int', 'isinstance', 'iter', 'len', 'list', 'map', 'max', 'min', 'next', 'ord', 'pow',
+    'print', 'range', 'repr', 'reversed', 'round', 'set', 'slice', 'sorted', 'str', 'sum', 'tuple', 'zip',
+    'ArithmeticError', 'Exception', 'IndexError', 'KeyError', 'OverflowError', 'RuntimeError', 'StopIteration',
+    'TypeError', 'ValueError', 'ZeroDivisionError',
+)}
+
+# функции доступа к тегам в пространстве имён скрипта
+TAG_READERS = {'get', 'value', 'status'}
+TAG_WRITERS = {'write'}
+TAG_FUNCTIONS = TAG_READERS | TAG_WRITERS | {'set'}
+
+
+class ScriptError(Exception):
+    pass
+
+
+def safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # библиотеки (numpy) импортируют свои модули через __import__ кадра скрипта, загруженные модули разрешены
+    if level or (name.split('.')[0] not in SCRIPT_IMPORTS and name not in sys.modules):
+        raise ImportError(f'import of {name} is not allowed in scripts')
+    return __import__(name, globals, locals, fromlist, level)
+
+
+@dataclass
+class ScriptInfo:
+    """
+    Теги, которые скрипт читает и пишет, по вызовам функций доступа с именем-константой.
+    is_dynamic - есть обращения по вычисляемому имени, полный список тегов неизвестен.
+    """
+    reads: set = field(default_factory=set)
+    writes: set = field(default_factory=set)
+    is_dynamic: bool = False
+
+
+class _Analyzer(ast.NodeTransformer):
+    """
+    Проверяет ограничения и собирает теги. Вызовы self.server.get/set заменяются
+    функциями пространства имён скрипта, чтобы запись шла через пакет записей.
+    """
+
+    def __init__(self):
+        self.info = ScriptInfo()
+        # переменная -> тег, для set(tgv) после tgv = get('name')
+        self.variables = {}
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._check_import(alias.name)
+        return node
+
+    def visit_ImportFrom(self, node):
+        if node.level:
+            raise ScriptError(f'line {node.lineno}: relative import is not allowed')
+        self._check_import(node.module)
+        return node
+
+    def _check_import(self, name):
+        if name.split('.')[0] not in SCRIPT_IMPORTS:
+            raise ScriptError(f'import of {name} is not allowed, allowed: {", ".join(sorted(SCRIPT_IMPORTS))}')
+
+    def visit_Name(self, node):
+        if node.id.startswith('__'):
+            raise ScriptError(f'line {node.lineno}: name {node.id} is not allowed')
+        return node
+
+    def visit_Attribute(self, node):
+        if node.attr.startswith('_'):
+            raise ScriptError(f'line {node.lineno}: attribute {node.attr} is not allowed')
+        return self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        name = self._tag_name(node.value, TAG_READERS)
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if name is not None:
+                    self.variables[target.id] = name
+                else:
+                    self.variables.pop(target.id, None)
+        return node
+
+    def visit_Call(self, node):
+        if _is_server_call(node.func):
+            node.func = ast.copy_location(ast.Name(id=node.func.attr, ctx=ast.Load()), node.func)
+        self.generic_visit(node)
+
+        function = node.func.id if isinstance(node.func, ast.Name) else None
+        if function in TAG_READERS or function in TAG_WRITERS:
+            name = self._tag_name(node, TAG_READERS | TAG_WRITERS)
+            if name is None:
+                self.info.is_dynamic = True
+            elif function in TAG_READERS:
+                self.info.reads.add(name)
+            else:
+                self.info.writes.add(name)
+        elif function == 'set' and node.args:
+            argument = node.args[0]
+            if isinstance(argument, ast.Name) and argument.id in self.variables:
+                self.info.writes.add(self.variables[argument.id])
+            elif (name := self._tag_name(argument, TAG_READERS)) is not None:
+                self.info.writes.add(name)
+            else:
+                self.info.is_dynamic = True
+        return node
+
+    @staticmethod
+    def _tag_name(node, functions):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in functions
+                and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            return node.args[0].value
+        return None
+
+
+def _is_server_call(func):
+    # self.server.get(...) / self.server.set(...) из прежних скриптов
+    return (isinstance(func, ast.Attribute) and func.attr in ('get', 'set')
+            and isinstance(func.value, ast.Attribute) and func.value.attr == 'server'
+            and isinstance(func.value.value, ast.Name) and func.value.value.id == 'self')
+
+
+def analyze(script):
+    """
+    Разобрать текст скрипта: дерево функции script() и теги скрипта.
+    """
+    tree = ast.parse(script)
+    analyzer = _Analyzer()
+    tree = analyzer.visit(tree)
+    return tree, analyzer.info
+
+
+def compile_script(name, script):
+    """
+    Скомпилировать скрипт в код модуля, определяющего функцию script().
+    Номера строк в ошибках совпадают с текстом скрипта.
+    """
+    tree, info = analyze(script)
+    module = ast.parse('def script():\n    pass\n')
+    function = module.body[0]
+    function.body = tree.body or function.body
+    ast.fix_missing_locations(module)
+    return compile(module, filename=script_filename(name), mode='exec'), info
+
+
+def compile_expression(name, text):
+    """
+    Скомпилировать одно выражение с теми же ограничениями, что и скрипт.
+    """
+    tree = _Analyzer().visit(ast.parse(text.strip(), mode='eval'))
+    return compile(tree, filename=script_filename(name), mode='eval')
+
+
+def script_filename(name):
+    return f'<script {name}>'
+
+
+def safe_builtins():
+    return dict(SAFE_BUILTINS, __import__=safe_import)
+
+
+def make_function(code, namespace):
+    """
+    Функция скрипта с пространством имён namespace и ограниченными встроенными функциями.
+    """
+    namespace['__builtins__'] = safe_builtins()
+    exec(code, namespace)
+    return namespace.pop('script')
@@ -0,0 +1,13 @@
+from scripts.script import Script
+from scripts.array_script import ArrayScript, is_array_script
+
+
+def get_script(server, name, cycle, script, is_active=False, description=None, trigger=None):
+    """
+    Скрипт по тексту: #!array в первой строке - скрипт над группой тегов, иначе обычный скрипт
+    """
+    if is_array_script(script):
+        return ArrayScript(server=server, name=name, cycle=cycle, script=script, is_active=is_active,
+                           description=description, trigger=trigger)
+    return Script(server=server, name=name, cycle=cycle, script=script, is_active=is_active,
+                  description=description, trigger=trigger)
@@ -0,0 +1,76 @@
+"""
+Граф зависимостей скриптов по тегам: скрипт B зависит от A, если читает тег, который пишет A.
+
+Скрипты с запуском по изменению (trigger=change) отмечаются изменёнными при изменении тегов,
+которые они читают. Изменённый скрипт запускается, когда среди изменённых и выполняющихся нет его предков:
+независимые скрипты запускаются одновременно, скрипт ниже по графу - после предков, один раз.
+"""
+
+
+class ScriptGraph:
+
+    def __init__(self, scripts, log):
+        """
+        scripts - список скриптов в порядке имён, теги скриптов привязаны (bind)
+        """
+        self.log = log
+        writers = {}
+        for script in scripts:
+            for name in script.info.writes:
+                writers.setdefault(name, []).append(script.name)
+        self.parents = {
+            script.name: {writer for name in script.info.reads for writer in writers.get(name, ()) if writer != script.name}
+            for script in scripts
+        }
+        self.levels = self._levels([script.name for script in scripts])
+        self.level = {name: index for index, level in enumerate(self.levels) for name in level}
+        self.order = {name: index for index, name in enumerate(name for level in self.levels for name in level)}
+        self.ancestors = {name: self._ancestors(name) for name in self.parents}
+        self.scripts = {script.name: script for script in scripts}
+        # тег -> скрипты, запускаемые по его изменению
+        self.triggers = {}
+        for script in scripts:
+            if script.is_change():
+                for name in script.info.reads:
+                    tag = script.tags.get(name)
+                    if tag is not None:
+                        self.triggers.setdefault(tag.index, []).append(script.name)
+
+    def _levels(self, names):
+        """
+        Уровни топологической сортировки, скрипты уровня не зависят друг от друга.
+        """
+        levels = []
+        placed = set()
+        remaining = list(names)
+        while remaining:
+            level = [name for name in remaining if self.parents[name] <= placed]
+            if not level:
+                # цикл зависимостей: скрипты цикла выполняются последними в порядке имён
+                self.log.warning(f'script dependency cycle: {", ".join(remaining)}')
+                level = remaining
+            levels.append(level)
+            placed.update(level)
+            remaining = [name for name in remaining if name not in placed]
+        return levels
+
+    def _ancestors(self, name):
+        # только предки с уровней выше: связи внутри цикла зависимостей не учитываются
+        ancestors = set()
+        stack = [name]
+        while stack:
+            child = stack.pop()
+            for parent in self.parents[child]:
+                if parent not in ancestors and self.level[parent] < self.level[child]:
+                    ancestors.add(parent)
+                    stack.append(parent)
+        return ancestors
+
+    def ready(self, changed, running):
+        """
+        Изменённые скрипты, которые можно запустить сейчас, в порядке уровней графа.
+        """
+        blocked = changed | running
+        return sorted((self.scripts[name] for name in changed
+                       if name not in running and not self.ancestors[name] & blocked),
+                      key=lambda script: self.order[script.name])
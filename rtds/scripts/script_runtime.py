@@ -0,0 +1,85 @@
+"""
+Выполнение скриптов в пуле потоков.
+
+Скрипт выполняется в потоке пула, записи тегов применяются в потоке главного цикла (collect):
+завершение будит главный цикл через канал, fileno() регистрируется в его selector.
+Скрипт, предыдущий запуск которого не завершён, пропускается.
+"""
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ScriptRuntime:
+
+    def __init__(self, workers, log):
+        self.log = log
+        # workers=0 - скрипты выполняются в потоке главного цикла
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='script') if workers > 0 else None
+        self.done = queue.SimpleQueue()
+        self.running = set()
+        # поколение конфигурации: результаты скриптов до перезагрузки не применяются
+        self.generation = 0
+        self._notify_r, self._notify_w = os.pipe()
+        os.set_blocking(self._notify_r, False)
+        os.set_blocking(self._notify_w, False)
+
+    def fileno(self):
+        return self._notify_r
+
+    @property
+    def is_pool(self):
+        return self.executor is not None
+
+    def reset(self):
+        self.generation += 1
+        self.running.clear()
+
+    def submit(self, script):
+        """
+        Запустить скрипт, False - предыдущий запуск ещё выполняется.
+        """
+        if self.executor is None:
+            script.execute()
+            return True
+        if script.name in self.running:
+            self.log.warning(f'script {script.name} is still running, run skipped')
+            return False
+        self.running.add(script.name)
+        generation = self.generation
+        future = self.executor.submit(script.call)
+        future.add_done_callback(lambda future: self._done(generation, script, future))
+        return True
+
+    def _done(self, generation, script, future):
+        self.done.put((generation, script, future))
+        try:
+            os.write(self._notify_w, b'\x01')
+        except BlockingIOError:
+            pass
+
+    def collect(self):
+        """
+        Применить результаты завершённых скриптов, вернуть их количество.
+        """
+        try:
+            while os.read(self._notify_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        count = 0
+        while not self.done.empty():
+            generation, script, future = self.done.get()
+            if generation != self.generation:
+                continue
+            self.running.discard(script.name)
+            error = future.exception()
+            script.complete([] if error else future.result(), error)
+            count += 1
+        return count
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        for fd in (self._notify_r, self._notify_w):
+            os.close(fd)
@@ -0,0 +1,76 @@
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_URL = os.getenv('STORE_DB_URL', 'sqlite:///data/history.db')
+SQL_ENGINE_ECHO = os.getenv('STORE_SQL_ENGINE_ECHO', 'false').lower() in ('true', '1', 'on','yes')
+
+# Настройки пула соединений
+POOL_SIZE = int(os.getenv('STORE_POOL_SIZE', '5'))
+POOL_MAX_OVERFLOW = int(os.getenv('STORE_POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = float(os.getenv('STORE_POOL_TIMEOUT', '30'))
+
+# PRAGMA SQLite, применяются один раз при открытии соединения
+SQLITE_JOURNAL_MODE = os.getenv('STORE_SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('STORE_SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('STORE_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv('STORE_SQLITE_CACHE_SIZE', '-65536'))  # отрицательное значение - размер в KiB
+SQLITE_BUSY_TIMEOUT = int(os.getenv('STORE_SQLITE_BUSY_TIMEOUT', '5000'))  # мс
+
+engine: Engine = None
+engine_pid: int = None
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+        cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        cursor.execute(f'PRAGMA cache_size={SQLITE_CACHE_SIZE}')
+    finally:
+        cursor.close()
+
+
+def _create_engine(url=DB_URL) -> Engine:
+    db_url = make_url(url)
+    if db_url.get_backend_name() != 'sqlite':
+        return create_engine(url, echo=SQL_ENGINE_ECHO,
+                             pool_size=POOL_SIZE,
+                             max_overflow=POOL_MAX_OVERFLOW,
+                             pool_timeout=POOL_TIMEOUT,
+                             pool_pre_ping=True)
+
+    if db_url.database in (None, '', ':memory:'):
+        # база в памяти живёт в одном соединении, пул не нужен
+        return create_engine(url, echo=SQL_ENGINE_ECHO)
+
+    new_engine = create_engine(url, echo=SQL_ENGINE_ECHO,
+                               pool_size=POOL_SIZE,
+                               max_overflow=POOL_MAX_OVERFLOW,
+                               pool_timeout=POOL_TIMEOUT,
+                               connect_args={'check_same_thread': False})
+    event.listen(new_engine, 'connect', _set_sqlite_pragmas)
+    return new_engine
+
+
+def get_engine() -> Engine:
+    """
+    Engine хранилища, один на процесс.
+
+    Дочерний процесс после fork получает копию engine родителя, его соединения
+    использовать нельзя, поэтому в новом процессе создаётся свой engine.
+    """
+    global engine, engine_pid
+
+    if engine is None or engine_pid != os.getpid():
+        if engine is not None:
+            # соединения родительского процесса не закрываем, только забываем
+            engine.dispose(close=False)
+        engine = _create_engine()
+        engine_pid = os.getpid()
+    return engine
@@ -1,7 +1,9 @@
 import multiprocessing as mp
 import time
 from typing import Optional
-from sqlalchemy import create_engine, String, Integer, Boolean, Float, DateTime, Text, func, select, delete, and_
+import re
+from sqlalchemy import create_engine, String, Integer, Boolean, Float, DateTime, Text, MetaData, Table, func, select, insert, delete, and_, inspect, union_all, cast
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, timedelta, timezone
@@ -11,10 +13,12 @@ from dotenv import load_dotenv
 sys.path.extend(['.', '..'])
 
 from models.tag import Tag as DTag, TagType, TagValue, get_tag_type, get_tag_value
+from models.value_batch import ValueBatch, TagDirectory
 from connectors.connector_factory import get_connector
-from scripts.script import Script as DScript
+from scripts.script_factory import get_script
 from loggers import logger
 from metrics import server as metrics
+from store.engine import get_engine, DB_URL
 
 load_dotenv()
 
@@ -22,8 +26,9 @@ log = logger.get_logger('store')
 
 BATCH_SIZE = int(os.getenv('STORE_BATCH_SIZE', '100'))
 STORE_HISTORY_HOURS = int(os.getenv('STORE_HISTORY_HOURS', '24'))
-SQL_ENGINE_ECHO = os.getenv('STORE_SQL_ENGINE_ECHO', 'false').lower() in ('true', '1', 'on','yes')
-DB_URL = os.getenv('STORE_DB_URL','sqlite:///data/history.db')
+# table - вся история в таблице history, hourly - почасовые таблицы history_ГГГГММДДЧЧ,
+# устаревшие таблицы удаляются целиком
+STORE_HISTORY_LAYOUT = os.getenv('STORE_HISTORY_LAYOUT', 'table').lower()
 
 metrics_queue = None
 
@@ -44,6 +49,8 @@ class Script(Base):
     id: Mapped[str] = mapped_column(String(10), primary_key=True)
     cycle: Mapped[int] = mapped_column(Integer, default=1)
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
+    # cycle - запуск по периоду, change - по изменению тегов, которые читает скрипт
+    trigger: Mapped[str] = mapped_column(String(10), default='cycle')
     script: Mapped[str] = mapped_column(Text)
     description: Mapped[Optional[str]] = mapped_column(String(200))
     updated_at: Mapped[datetime] = mapped_column(DateTime)
@@ -55,6 +62,11 @@ class Tag(Base):
     min_: Mapped[float] = mapped_column(Float, default=0)
     max_: Mapped[float] = mapped_column(Float, default=0)
     is_log: Mapped[bool] = mapped_column(Boolean, default=False)
+    deadband: Mapped[float] = mapped_column(Float, default=0)
+    deadband_pct: Mapped[float] = mapped_column(Float, default=0)
+    on_change: Mapped[bool] = mapped_column(Boolean, default=False)
+    max_silence: Mapped[float] = mapped_column(Float, default=0)
+    sdt_deviation: Mapped[float] = mapped_column(Float, default=0)
     connector_name: Mapped[Optional[str]] = mapped_column(String(100))
     source: Mapped[Optional[str]] = mapped_column(String(100))
     value: Mapped[Optional[str]] = mapped_column(String(100))
@@ -89,7 +101,7 @@ class State(Base):
     description: Mapped[Optional[str]] = mapped_column(String(500))    
 
 def set_connectors(connectors:dict):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session: 
         for item in connectors.values():
             log.debug(f'save connector item: {item}')
@@ -107,7 +119,7 @@ def set_connectors(connectors:dict):
             session.commit()
 
 def set_tags(tags:dict):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session: 
         for item in tags.values():
             log.debug(f'save tag item: {item}')
@@ -117,6 +129,11 @@ def set_tags(tags:dict):
                 min_=item.min_,
                 max_=item.max_,
                 is_log=item.is_log,
+                deadband=item.deadband,
+                deadband_pct=item.deadband_pct,
+                on_change=item.on_change,
+                max_silence=item.max_silence,
+                sdt_deviation=item.sdt_deviation,
                 connector_name=item.connector_name,            
                 source=item.source,
                 value=item.value,
@@ -128,7 +145,7 @@ def set_tags(tags:dict):
             session.commit()
 
 def set_scripts(scripts:dict):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session: 
         for item in scripts.values():
             log.debug(f'save script item: {item}')
@@ -136,6 +153,7 @@ def set_scripts(scripts:dict):
                 id=item.name,
                 cycle=item.cycle,
                 is_active=item.is_active,
+                trigger=item.trigger,
                 script=item.script,
                 description=item.description,
                 updated_at=datetime.now(timezone.utc)
@@ -153,7 +171,7 @@ def get_config(server):
     connectors = {}
     scripts = {}
 
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session:
         for item in session.scalars(select(Tag)).all():
             tag = DTag(name=item.id, 
@@ -164,7 +182,12 @@ def get_config(server):
                     min_=item.min_, 
                     source=item.source,
                     value=item.value,
-                    description=item.description
+                    description=item.description,
+                    deadband=item.deadband,
+                    deadband_pct=item.deadband_pct,
+                    on_change=item.on_change,
+                    max_silence=item.max_silence,
+                    sdt_deviation=item.sdt_deviation
                     )
             tags[tag.name] = tag
 
@@ -175,20 +198,28 @@ def get_config(server):
                                   tags=[(key, tag) for key, tag in tags.items() if tag.connector_name==item.id],
                                   is_read_only=item.is_read_only,
                                   read_queue=mp.Queue(),
-                                  write_queue=mp.Queue() if item.is_read_only else None,
+                                  write_queue=mp.Queue() if not item.is_read_only else None,
                                   log_queue=server.log_queue if server else None,
                                   metrics_queue=server.metrics_queue if server else None,
                                   description=item.description
                                   )
             connectors[connector.name] = connector
+            # теги, добавленные самим коннектором (нагрузочный режим ConnectorTest)
+            generated = [tag for key, tag in connector.tags if key not in tags]
+            for tag in generated:
+                tags[tag.name] = tag
+            if generated:
+                add_generated_tags(session, generated)
+                session.commit()
 
         for item in session.scalars(select(Script)).all():
-            script = DScript(
+            script = get_script(
                 server=server,
                 name=item.id,
                 cycle=item.cycle,
                 script=item.script,
                 is_active=item.is_active,
+                trigger=item.trigger,
                 description=item.description)
             scripts[script.name] = script
 
@@ -197,12 +228,34 @@ def get_config(server):
 
     return connectors, tags, scripts
 
+def add_generated_tags(session, tags):
+    """
+    Сохранить в Tag теги, созданные коннектором, если их ещё нет: по Tag продюсер узнаёт типы тегов истории
+    """
+    now = datetime.now(timezone.utc)
+    session.execute(sqlite_insert(Tag).on_conflict_do_nothing(index_elements=[Tag.id]), [
+        {
+            'id': tag.name,
+            'type_': tag.get_type_name(),
+            'min_': tag.min_ or 0,
+            'max_': tag.max_ or 0,
+            'is_log': tag.is_log,
+            'connector_name': tag.connector_name,
+            'source': tag.source,
+            'value': tag.value,
+            'description': tag.description,
+            'updated_at': now,
+        }
+        for tag in tags
+    ])
+
 def set_config(connectors, tags, scripts):
     """
     Сохранить конфигурацию в БД
     """
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
 
+    drop_history_buckets(engine)
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)    
 
@@ -224,7 +277,7 @@ def export_config():
     connectors = {}
     scripts = {}
 
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session:
         for item in session.scalars(select(Tag)).all():
             tag = { 
@@ -236,7 +289,12 @@ def export_config():
                     "min_": item.min_, 
                     "source": item.source,
                     "value": item.value,
-                    "description": item.description
+                    "description": item.description,
+                    "deadband": item.deadband,
+                    "deadband_pct": item.deadband_pct,
+                    "on_change": item.on_change,
+                    "max_silence": item.max_silence,
+                    "sdt_deviation": item.sdt_deviation
                   }
             tags[tag["name"]] = tag
 
@@ -258,6 +316,7 @@ def export_config():
                 "cycle": item.cycle,
                 "script": item.script,
                 "is_active": item.is_active,
+                "trigger": item.trigger,
                 "description": item.description
             }
             scripts[script["name"]] = script
@@ -275,27 +334,32 @@ def get_history(start_time, size):
         else:
             start_time = datetime.now(timezone.utc) - timedelta(days=1)
 
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
-    with Session(engine) as session:
+    engine = get_engine()
+    with engine.connect() as connection:
         if start_time:
-            query = (
-                select(History, Tag)
-                .join(Tag, History.tag_id == Tag.id)
-                .filter(History.tag_time > start_time)
-                .order_by(History.tag_time.asc()).limit(size)
+            tag_types = dict(connection.execute(select(Tag.id, Tag.type_)).all())
+            rows = select_history(
+                connection,
+                where=lambda table: table.c.tag_time > start_time,
+                order_by=lambda table: table.c.tag_time,
+                limit=size
             )
-            for row in session.execute(query).all():
+            for row in rows:
+                # история удалённых тегов не отдаётся
+                type_ = tag_types.get(row.tag_id)
+                if type_ is None:
+                    continue
                 yield {
-                    "id": row.History.tag_id,
-                    "tm": f"{row.History.tag_time.isoformat()}Z", # это время в UTC
-                    "tp": row.Tag.type_,  # Тип тега из Tag
-                    "st": row.History.status,
+                    "id": row.tag_id,
+                    "tm": f"{row.tag_time.isoformat()}Z", # это время в UTC
+                    "tp": type_,  # Тип тега из Tag
+                    "st": row.status,
                     "vl": get_tag_value(
-                        type_ = row.Tag.type_, 
-                        bool_value = row.History.bool_value,
-                        int_value = row.History.int_value,
-                        float_value = row.History.float_value,
-                        var_value = row.History.var_value
+                        type_ = type_, 
+                        bool_value = row.bool_value,
+                        int_value = row.int_value,
+                        float_value = row.float_value,
+                        var_value = row.var_value
                     )
                 }
 
@@ -304,7 +368,7 @@ def get_current():
     """
     Получить текущие значения тегов
     """
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session:
         query = (
             select(Current, Tag)
@@ -325,12 +389,62 @@ def get_current():
                 )
             }
 
+# Записи State, которые пишет загрузка конфигурации
+CONFIG_STATES = ['connectors', 'tags', 'scripts', 'config_time']
+
+# Счётчики строк истории в State, по ним считаются размер буфера и отставание producer без count(*)
+COUNTER_INSERTED = 'history_rows_inserted'
+COUNTER_DELETED = 'history_rows_deleted'
+COUNTER_ACKED = 'history_rows_acked'
+COUNTERS = {
+    COUNTER_INSERTED: 'history rows inserted',
+    COUNTER_DELETED: 'history rows removed by retention',
+    COUNTER_ACKED: 'history rows acknowledged by kafka',
+}
+
+def add_counter(connection, counter, value):
+    """
+    Увеличить счётчик в State в транзакции соединения
+    """
+    if not value:
+        return
+    stmt = sqlite_insert(State).values(id=counter, value=str(value), description=COUNTERS[counter])
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[State.id],
+        set_={'value': cast(cast(State.value, Integer) + value, String)}
+    ))
+
+def get_counters(connection):
+    values = dict(connection.execute(select(State.id, State.value).where(State.id.in_(list(COUNTERS)))).all())
+    return {counter: int(values.get(counter) or 0) for counter in COUNTERS}
+
+def init_counters():
+    """
+    Заполнить счётчики один раз для базы, созданной до их появления
+    """
+    engine = get_engine()
+    with engine.begin() as connection:
+        if connection.execute(select(State.id).where(State.id == COUNTER_INSERTED)).scalar():
+            return
+        rows_count = history_rows_count(connection)
+        last_id = connection.execute(select(State.value).where(State.id == 'producer_last_id')).scalar()
+        acked_count = 0
+        if last_id:
+            acked_count = sum(connection.execute(select(func.count()).select_from(table).where(table.c.id <= int(last_id))).scalar()
+                              for table in get_history_tables(connection))
+        connection.execute(insert(State), [
+            {'id': COUNTER_INSERTED, 'value': str(rows_count), 'description': COUNTERS[COUNTER_INSERTED]},
+            {'id': COUNTER_DELETED, 'value': '0', 'description': COUNTERS[COUNTER_DELETED]},
+            {'id': COUNTER_ACKED, 'value': str(acked_count), 'description': COUNTERS[COUNTER_ACKED]},
+        ])
+        log.info(f'history counters initialized: rows {rows_count}, acked {acked_count}')
+
 def set_state(connectors, tags, scripts):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     
     with Session(engine) as session:
-        # удалить старые записи
-        session.query(State).delete()
+        # удалить старые записи конфигурации, счётчики истории и позиция producer остаются
+        session.query(State).filter(State.id.in_(CONFIG_STATES)).delete()
 
         if connectors:
             count = len(connectors)
@@ -372,7 +486,7 @@ def get_state():
     """
     Получить текущие состояние системы
     """
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     with Session(engine) as session:
         query = select(State)
         for state in session.scalars(query).all():
@@ -388,13 +502,160 @@ def init_db(log_queue=None):
 
     log = logger.get_logger('store', log_queue)
 
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
     log.info('database initialized')
 
+def add_missing_columns(engine):
+    """
+    Добавить колонки, появившиеся в моделях после создания базы (create_all их не добавляет)
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                default = ''
+                if column.default is not None and column.default.is_scalar:
+                    arg = column.default.arg
+                    if isinstance(arg, bool):
+                        arg = int(arg)
+                    elif isinstance(arg, str):
+                        arg = f"'{arg}'"
+                    default = f' DEFAULT {arg}'
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}{default}')
+                log.info(f'added column {table.name}.{column.name}')
+
+# Почасовые таблицы истории: строка попадает в таблицу часа записи (UTC),
+# id сквозной и растёт от таблицы к таблице, поэтому читатели по id (producer)
+# проходят таблицы по порядку имён
+BUCKET_PREFIX = 'history_'
+BUCKET_PATTERN = re.compile(r'^history_\d{10}$')
+bucket_metadata = MetaData()
+bucket_insert_sql = {}
+history_next_id = None
+
+def bucket_name(moment: datetime):
+    return f'{BUCKET_PREFIX}{moment:%Y%m%d%H}'
+
+def bucket_time(name):
+    return datetime.strptime(name[len(BUCKET_PREFIX):], '%Y%m%d%H').replace(tzinfo=timezone.utc)
+
+def bucket_table(name) -> Table:
+    table = bucket_metadata.tables.get(name)
+    if table is None:
+        table = History.__table__.to_metadata(bucket_metadata, name=name)
+    return table
+
+def get_history_tables(connection):
+    """
+    Таблицы истории от старой к новой
+    """
+    if STORE_HISTORY_LAYOUT != 'hourly':
+        return [History.__table__]
+    names = sorted(name for name in inspect(connection).get_table_names() if BUCKET_PATTERN.match(name))
+    return [bucket_table(name) for name in names]
+
+def select_history(connection, where, order_by, limit):
+    """
+    Выбрать строки истории по всем таблицам истории.
+    where и order_by - функции от таблицы (или подзапроса), возвращающие условие и колонку сортировки.
+    """
+    tables = get_history_tables(connection)
+    if not tables:
+        return []
+    selects = [
+        select(*[table.c[column] for column in HISTORY_SELECT_COLUMNS])
+        .where(where(table))
+        .order_by(order_by(table))
+        .limit(limit)
+        for table in tables
+    ]
+    if len(selects) == 1:
+        return connection.execute(selects[0]).all()
+    # в каждой таблице берём не больше limit строк, затем общая сортировка
+    union = union_all(*[query.subquery().select() for query in selects]).subquery()
+    return connection.execute(select(union).order_by(order_by(union)).limit(limit)).all()
+
+def history_rows_count(connection):
+    return sum(connection.execute(select(func.count()).select_from(table)).scalar()
+               for table in get_history_tables(connection))
+
+def drop_history_buckets(engine):
+    with engine.begin() as connection:
+        for table in get_history_tables(connection) if STORE_HISTORY_LAYOUT == 'hourly' else []:
+            table.drop(connection)
+
+def get_history_next_id(connection):
+    """
+    Следующий id истории: больше всех id в таблицах истории и уже отправленного producer
+    """
+    global history_next_id
+    if history_next_id is None:
+        max_id = connection.execute(select(func.max(History.id))).scalar() or 0
+        for table in get_history_tables(connection):
+            max_id = max(max_id, connection.execute(select(func.max(table.c.id))).scalar() or 0)
+        last_id = connection.execute(select(State.value).where(State.id == 'producer_last_id')).scalar()
+        history_next_id = max(max_id, int(last_id) if last_id else 0) + 1
+    return history_next_id
+
+def drop_old_history_buckets():
+    """
+    Удалить почасовые таблицы истории старше STORE_HISTORY_HOURS,
+    если producer уже отправил все их строки
+    """
+    engine = get_engine()
+    start_time = time.time()
+    try:
+        delete_time = datetime.now(timezone.utc) - timedelta(hours=STORE_HISTORY_HOURS)
+        dropped = []
+        with engine.begin() as connection:
+            last_id = connection.execute(select(State.value).where(State.id == 'producer_last_id')).scalar()
+            for table in get_history_tables(connection):
+                # таблица часа целиком старше границы
+                if bucket_time(table.name) + timedelta(hours=1) > delete_time:
+                    break
+                if last_id:
+                    if (connection.execute(select(func.max(table.c.id))).scalar() or 0) > int(last_id):
+                        break
+                # id в таблице идут подряд, число строк без count(*)
+                min_id, max_id = connection.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+                table.drop(connection)
+                bucket_insert_sql.pop(table.name, None)
+                if max_id is not None:
+                    add_counter(connection, COUNTER_DELETED, max_id - min_id + 1)
+                dropped.append(table.name)
+
+        if dropped:
+            log.debug(f'dropped old history tables: {dropped}')
+        if metrics_queue:
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.STORE_DURATION,
+                    labels  = ['delete_old_history','ok'],
+                    value   = time.time() - start_time
+                )
+            )
+    except Exception as e:
+        log.error(f'Error dropping old history tables: {e}')
+        if metrics_queue:
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.STORE_DURATION,
+                    labels  = ['delete_old_history','error'],
+                    value   = time.time() - start_time
+                )
+            )
+
 def delete_old_history():
-    if STORE_HISTORY_HOURS:
-        engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    if STORE_HISTORY_HOURS and STORE_HISTORY_LAYOUT == 'hourly':
+        drop_old_history_buckets()
+    elif STORE_HISTORY_HOURS:
+        engine = get_engine()
         with Session(engine) as session:
         
             start_time = time.time()
@@ -423,6 +684,7 @@ def delete_old_history():
             
                 result = session.execute(query)  
                 deleted_count = result.rowcount
+                add_counter(session, COUNTER_DELETED, deleted_count)
                 session.commit()
                 
                 if deleted_count > 0:
@@ -451,7 +713,8 @@ def delete_old_history():
                     )
 
 def clear_config():
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
+    engine = get_engine()
+    drop_history_buckets(engine)
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
     log.info('database initialized') 
@@ -460,42 +723,103 @@ def collect_store_metrics():
     metrics.collect_process_metrics('store', metrics_queue)
 
     if metrics_queue:
-        engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
-        with Session(engine) as session:
-            query = (
-                select(func.count())
-                .select_from(History)
-            )
-            rows_count = session.execute(query).scalar()
+        engine = get_engine()
+        with engine.connect() as connection:
+            counters = get_counters(connection)
             metrics_queue.put(
                 metrics.Metric(
                     name    = metrics.MetricEnum.STORE_ROWS_GAUGE,
-                    value   = rows_count
+                    value   = counters[COUNTER_INSERTED] - counters[COUNTER_DELETED]
                 )
             )
-            
-        path = DB_URL[10:]
-        try: 
-            size_in_bytes = os.path.getsize(path)
-            size_in_mb = size_in_bytes / 1024 / 1024
 
+            # отставание producer: неподтверждённые строки и возраст самой старой из них
+            last_id = connection.execute(select(State.value).where(State.id == 'producer_last_id')).scalar()
+            rows = select_history(
+                connection,
+                where=lambda table: table.c.id > int(last_id or 0),
+                order_by=lambda table: table.c.id,
+                limit=1
+            )
+            lag_seconds = (datetime.now(timezone.utc).replace(tzinfo=None) - rows[0].tag_time).total_seconds() if rows else 0
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.PRODUCER_LAG_ROWS,
+                    value   = max(0, counters[COUNTER_INSERTED] - counters[COUNTER_ACKED])
+                )
+            )
             metrics_queue.put(
                 metrics.Metric(
-                    name    = metrics.MetricEnum.STORE_SIZE_GAUGE,
-                    value   = size_in_mb
+                    name    = metrics.MetricEnum.PRODUCER_LAG_SECONDS,
+                    value   = max(0, lag_seconds)
                 )
             )
-        except Exception as e:
-            log.warning(f'Fail get store size {e}')
+
+        db_url = make_url(DB_URL)
+        if db_url.get_backend_name() == 'sqlite' and db_url.database not in (None, '', ':memory:'):
+            try: 
+                size_in_bytes = os.path.getsize(db_url.database)
+                # в режиме WAL ещё не перенесённые в базу страницы лежат в файле -wal
+                if os.path.exists(f'{db_url.database}-wal'):
+                    size_in_bytes += os.path.getsize(f'{db_url.database}-wal')
+                size_in_mb = size_in_bytes / 1024 / 1024
+
+                metrics_queue.put(
+                    metrics.Metric(
+                        name    = metrics.MetricEnum.STORE_SIZE_GAUGE,
+                        value   = size_in_mb
+                    )
+                )
+            except Exception as e:
+                log.warning(f'Fail get store size {e}')
         
+def _var_value(type_, value):
+    if value is None or type_ not in [TagType.DATETIME, TagType.STR, TagType.ARRAY]:
+        return None
+    if type_ == TagType.ARRAY:
+        return ','.join([str(a) for a in value])
+    return str(value)
+
+# Порядок колонок в кортежах строк для executemany
+HISTORY_COLUMNS = ['tag_time', 'tag_id', 'status', 'bool_value', 'int_value', 'float_value', 'var_value']
+HISTORY_SELECT_COLUMNS = ['id'] + HISTORY_COLUMNS
+CURRENT_COLUMNS = ['tag_id', 'tag_time', 'status', 'bool_value', 'int_value', 'float_value', 'var_value']
+
+write_statements = None
+
+def get_write_statements():
+    """
+    Скомпилировать один раз SQL вставки истории и upsert текущих значений
+    и функцию преобразования времени для драйвера.
+    """
+    global write_statements
+
+    engine = get_engine()
+    if write_statements is None or write_statements[0] is not engine:
+        history_sql = insert(History.__table__).compile(dialect=engine.dialect, column_keys=HISTORY_COLUMNS)
+        stmt = sqlite_insert(Current.__table__)
+        current_sql = stmt.on_conflict_do_update(
+            index_elements=['tag_id'],
+            set_={column: stmt.excluded[column] for column in CURRENT_COLUMNS[1:]}
+        ).compile(dialect=engine.dialect, column_keys=CURRENT_COLUMNS)
+        time_type = History.__table__.c.tag_time.type.dialect_impl(engine.dialect)
+        time_processor = time_type.bind_processor(engine.dialect) or (lambda value: value)
+        write_statements = (engine, str(history_sql), str(current_sql), time_processor)
+    return write_statements
+
 def run(log_queue, store_queue, metricsq):
     global metrics_queue
 
     batch = []
-    currents = []
+    currents = {}
+    names = []
 
     log = logger.get_logger('store', log_queue)   
     log.info('store process started')
+    try:
+        init_counters()
+    except Exception as e:
+        log.error(f'fail init history counters: {e}')
     
     if metricsq:
         metrics_queue = metricsq
@@ -516,44 +840,21 @@ def run(log_queue, store_queue, metricsq):
                     continue
 
                 item = store_queue.get()
-            
-                if not isinstance(item, TagValue):
+
+                if isinstance(item, TagDirectory):
+                    names = item.names
+                    log.debug(f'tag directory loaded: {len(names)} tags')
+                    continue
+
+                values = read_values(item, names)
+                if values is None:
                     log.warning(f'Unsupport type: {item}')
                     continue
-                
-                if item.is_log:
-                    history = History(
-                        tag_id=item.name,
-                        tag_time=item.update_time,
-                        status=item.status,
-                        bool_value = item.value if item.type_==TagType.BOOL else None,
-                        int_value = item.value if item.type_==TagType.INT else None,
-                        float_value = item.value if item.type_==TagType.FLOAT else None,
-                        var_value = ','.join([str(a) for a in item.value]) if item.type_ in [TagType.DATETIME, TagType.STR, TagType.ARRAY] else None                
-                    )                    
-                    batch.append(history)                    
-                    
-                current = {
-                    "tag_id": item.name,
-                    "tag_time": item.update_time,
-                    "status": item.status,
-                    "bool_value": item.value if item.type_==TagType.BOOL else None,
-                    "int_value": item.value if item.type_==TagType.INT else None,
-                    "float_value": item.value if item.type_==TagType.FLOAT else None,
-                    "var_value": ','.join([str(a) for a in item.value]) if item.type_ in [TagType.DATETIME, TagType.STR, TagType.ARRAY] else None
-                }                
-                currents.append(current)
-
-                if len(batch) >= BATCH_SIZE or store_queue.empty():
-                    batch_write(batch)                        
-                    batch = []
-                
-                if len(currents) >= BATCH_SIZE or store_queue.empty():
-                    currents_write(currents)                        
-                    currents = []
+                add_values(values, batch, currents)
 
-                # удалить старые записи из history
-                if len(batch) >= BATCH_SIZE or len(currents) >= BATCH_SIZE or store_queue.empty():
+                if store_queue.empty():
+                    flush_values(batch, currents)
+                    # удалить старые записи из history
                     delete_old_history()
                     
             except KeyboardInterrupt:
@@ -563,76 +864,145 @@ def run(log_queue, store_queue, metricsq):
                 log.error(f'fail store value: {item}, error: {e}')
         
 
-def batch_write(batch):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
-    with Session(engine) as session:
-        start_time = time.time()
-        try:
-            session.bulk_save_objects(batch)
-            session.commit()
-            log.debug(f'success stored batch: {len(batch)}')
-            if metrics_queue:
-                metrics_queue.put(
-                    metrics.Metric(
-                        name    = metrics.MetricEnum.STORE_DURATION,
-                        labels  = ['batch_write','ok'],
-                        value   = time.time() - start_time
-                    )
-                )
-        except Exception as e:
-            log.error(f'fail store batch: {len(batch)}, error: {e}')
-            if metrics_queue:
-                metrics_queue.put(
-                    metrics.Metric(
-                        name    = metrics.MetricEnum.STORE_DURATION,
-                        labels  = ['batch_write','error'],
-                        value   = time.time() - start_time
-                    )
+def read_values(item, names):
+    """
+    Значения из сообщения очереди хранилища: кортежи (name, type_, status, update_time, value, is_log),
+    None - если тип сообщения не поддерживается
+    """
+    if ValueBatch.is_batch(item):
+        return [
+            (names[index], type_, status, datetime.fromtimestamp(update_time, timezone.utc), value, is_log)
+            for index, type_, status, update_time, value, is_log in ValueBatch.records_of(item)
+        ]
+    if isinstance(item, TagValue):
+        return [(item.name, item.type_, item.status, item.update_time, item.value, item.is_log)]
+    return None
+
+def add_values(values, batch: list, currents: dict):
+    """
+    Разложить значения по строкам истории и текущих значений, заполненные пачки записать
+    """
+    _, _, _, time_processor = get_write_statements()
+    for name, type_, status, update_time, value, is_log in values:
+        tag_time = time_processor(update_time)
+        bool_value = value if type_==TagType.BOOL else None
+        int_value = value if type_==TagType.INT else None
+        float_value = value if type_==TagType.FLOAT else None
+        var_value = _var_value(type_, value)
+        if is_log:
+            batch.append((tag_time, name, status, bool_value, int_value, float_value, var_value))
+        # в текущих значениях остаётся только последнее значение тега
+        currents[name] = (name, tag_time, status, bool_value, int_value, float_value, var_value)
+
+        if len(batch) >= BATCH_SIZE:
+            batch_write(batch)
+            batch.clear()
+
+        if len(currents) >= BATCH_SIZE:
+            currents_write(list(currents.values()))
+            currents.clear()
+
+def flush_values(batch: list, currents: dict):
+    """
+    Записать неполные пачки истории и текущих значений
+    """
+    if batch:
+        batch_write(batch)
+        batch.clear()
+    if currents:
+        currents_write(list(currents.values()))
+        currents.clear()
+
+def batch_write(rows):
+    """
+    Записать строки истории одним executemany, строки - кортежи в порядке HISTORY_COLUMNS
+    """
+    engine, history_sql, _, _ = get_write_statements()
+    start_time = time.time()
+    try:
+        if STORE_HISTORY_LAYOUT == 'hourly':
+            bucket_write(engine, rows)
+        else:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(history_sql, rows)
+                add_counter(connection, COUNTER_INSERTED, len(rows))
+        log.debug(f'success stored batch: {len(rows)}')
+        if metrics_queue:
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.STORE_DURATION,
+                    labels  = ['batch_write','ok'],
+                    value   = time.time() - start_time
                 )
-
-def currents_write(items):
-    engine = create_engine(DB_URL, echo=SQL_ENGINE_ECHO)
-    with Session(engine) as session:
-        start_time = time.time()
-        try:
-            #Атомарный UPSERT для всех записей
-            stmt = sqlite_insert(Current).values(items)
-            on_conflict_stmt = stmt.on_conflict_do_update(
-                    index_elements=[Current.tag_id],
-                    set_={
-                        "tag_time": stmt.excluded.tag_time,
-                        "status": stmt.excluded.status,
-                        "bool_value": stmt.excluded.bool_value,
-                        "int_value": stmt.excluded.int_value,
-                        "float_value": stmt.excluded.float_value,
-                        "var_value": stmt.excluded.var_value
-                    }
+            )
+    except Exception as e:
+        log.error(f'fail store batch: {len(rows)}, error: {e}')
+        if metrics_queue:
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.STORE_DURATION,
+                    labels  = ['batch_write','error'],
+                    value   = time.time() - start_time
                 )
-            
-            session.execute(on_conflict_stmt)
-            session.commit()
+            )
 
-            log.debug(f'success stored current: {len(items)}')
-            
-            if metrics_queue:
-                metrics_queue.put(
-                    metrics.Metric(
-                        name    = metrics.MetricEnum.STORE_DURATION,
-                        labels  = ['currents_write','ok'],
-                        value   = time.time() - start_time
-                    )
+def bucket_write(engine, rows):
+    """
+    Записать строки истории в таблицу текущего часа, id назначаются подряд
+    """
+    global history_next_id
+
+    name = bucket_name(datetime.now(timezone.utc))
+    try:
+        with engine.begin() as connection:
+            history_sql = bucket_insert_sql.get(name)
+            if history_sql is None:
+                table = bucket_table(name)
+                table.create(connection, checkfirst=True)
+                history_sql = str(insert(table).compile(dialect=engine.dialect, column_keys=HISTORY_SELECT_COLUMNS))
+            next_id = get_history_next_id(connection)
+            connection.exec_driver_sql(history_sql, [(next_id + i, *row) for i, row in enumerate(rows)])
+            add_counter(connection, COUNTER_INSERTED, len(rows))
+    except Exception:
+        # таблицы могли удалить при перезагрузке конфигурации, при следующей записи всё определяется заново
+        bucket_insert_sql.pop(name, None)
+        history_next_id = None
+        raise
+    bucket_insert_sql[name] = history_sql
+    history_next_id = next_id + len(rows)
+
+def currents_write(rows):
+    """
+    Обновить текущие значения одним executemany, строки - кортежи в порядке CURRENT_COLUMNS
+    """
+    engine, _, current_sql, _ = get_write_statements()
+    start_time = time.time()
+    try:
+        # UPSERT для всех записей в одной транзакции
+        with engine.begin() as connection:
+            connection.exec_driver_sql(current_sql, rows)
+
+        log.debug(f'success stored current: {len(rows)}')
+        
+        if metrics_queue:
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.STORE_DURATION,
+                    labels  = ['currents_write','ok'],
+                    value   = time.time() - start_time
                 )
+            )
 
-        except Exception as e:
-            log.error(f'fail store current: {len(items)}, error: {e}')
-            if metrics_queue:
-                metrics_queue.put(
-                    metrics.Metric(
-                        name    = metrics.MetricEnum.STORE_DURATION,
-                        labels  = ['currents_write','error'],
-                        value   = time.time() - start_time
-                    )
+    except Exception as e:
+        log.error(f'fail store current: {len(rows)}, error: {e}')
+        if metrics_queue:
+            metrics_queue.put(
+                metrics.Metric(
+                    name    = metrics.MetricEnum.STORE_DURATION,
+                    labels  = ['currents_write','error'],
+                    value   = time.time() - start_time
                 )
+            )
 
 if __name__ == '__main__':    
     engine = create_engine(DB_URL, echo=True)
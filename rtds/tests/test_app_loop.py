@@ -0,0 +1,97 @@
+import multiprocessing as mp
+import time
+import unittest
+import sys
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+import app
+from scripts.script_compiler import ScriptInfo
+from scripts.script_runtime import ScriptRuntime
+
+
+class FakeScript:
+
+    def __init__(self, name, cycle, runs):
+        self.name = name
+        self.cycle = cycle
+        self.is_active = True
+        self.runs = runs
+        self.info = ScriptInfo()
+        self.tags = {}
+
+    def is_change(self):
+        return False
+
+    def bind(self, tags):
+        pass
+
+    def execute(self):
+        self.runs.append(self.name)
+
+
+class FakeConnector:
+
+    def __init__(self, name):
+        self.name = name
+        self.read_queue = mp.Queue()
+
+
+class AppLoopMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.runs = []
+        self.connectors = {name: FakeConnector(name) for name in ('b', 'a')}
+        self.scripts = {name: FakeScript(name, cycle, self.runs) for name, cycle in (('s2', 1.0), ('s1', 1.0), ('s3', 5.0))}
+        runtime = ScriptRuntime(0, app.log)
+        self.addCleanup(runtime.shutdown)
+        patcher = mock.patch.multiple(app, connectors=self.connectors, scripts=self.scripts, tag_table=None, api_command_queue=None,
+                                      script_runtime=runtime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app.init_schedule()
+        self.addCleanup(app.selector.close)
+
+    def test_order_precomputed(self):
+        self.assertEqual(['a', 'b'], [connector.name for connector in app.connector_list])
+        self.assertEqual(['s1', 's2', 's3'], [script.name for script in app.script_list])
+
+    def test_scripts_run_when_due(self):
+        now = time.monotonic()
+        self.assertEqual(0, app.run_scripts(now))
+        self.assertEqual(2, app.run_scripts(now + 1.5))
+        self.assertEqual(['s1', 's2'], self.runs)
+        # следующий запуск через цикл от расчётного времени
+        self.assertEqual(0, app.run_scripts(now + 1.9))
+        self.assertEqual(3, app.run_scripts(now + 5.5))
+        self.assertEqual(['s1', 's2', 's1', 's2', 's3'], self.runs)
+
+    def test_missed_runs_not_repeated(self):
+        now = time.monotonic()
+        self.assertEqual(3, app.run_scripts(now + 100))
+        self.assertEqual(0, app.run_scripts(now + 100.5))
+        self.assertAlmostEqual(now + 101, app.script_timers[0][0])
+
+    def test_next_timeout(self):
+        now = time.monotonic()
+        self.assertAlmostEqual(0.5, app.next_timeout(now, now + 0.5))
+        self.assertAlmostEqual(1.0, app.next_timeout(now, now + 10), places=2)
+        self.assertEqual(0, app.next_timeout(now + 20, now + 10))
+
+    def test_event_cycle_reads_ready_connector(self):
+        self.connectors['b'].read_queue.put('value')
+        with mock.patch.object(app, 'connector_read') as connector_read:
+            self.assertTrue(app.event_cycle(1))
+        connector_read.assert_called_once_with(self.connectors['b'])
+
+    def test_event_cycle_timeout(self):
+        start_time = time.monotonic()
+        with mock.patch.object(app, 'connector_read') as connector_read:
+            self.assertFalse(app.event_cycle(0.05))
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.04)
+        connector_read.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
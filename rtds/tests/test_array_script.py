@@ -0,0 +1,98 @@
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from models.tag import Tag, TagType
+from scripts.array_script import ArrayScript
+from scripts.script import Script
+from scripts.script_factory import get_script
+
+
+class FakeServer:
+    log_queue = None
+    metrics_queue = None
+
+    def __init__(self):
+        self.writes = []
+
+    def write_tag(self, tag, value, status):
+        self.writes.append((tag.name, value, status))
+
+
+def make_tags():
+    tags = {}
+    for i in range(3):
+        tags[f'T_{i}'] = Tag(name=f'T_{i}', type_=TagType.FLOAT, value=10.0 * i, connector_name='plc')
+        tags[f'TF_{i}'] = Tag(name=f'TF_{i}', type_=TagType.FLOAT, value=0.0)
+    tags['TF_0'] = Tag(name='TF_0', type_=TagType.INT, value=0)
+    tags['T_sum'] = Tag(name='T_sum', type_=TagType.FLOAT, value=0.0)
+    tags['T_name'] = Tag(name='T_name', type_=TagType.STR, value='text')
+    return tags
+
+
+class ArrayScriptMethods(unittest.TestCase):
+
+    def make_script(self, text, tags=None):
+        self.server = FakeServer()
+        script = get_script(server=self.server, name='array', cycle=1, script=text, is_active=True)
+        self.assertIsInstance(script, ArrayScript)
+        self.assertTrue(script.is_active)
+        script.bind(tags or make_tags())
+        return script
+
+    def test_factory(self):
+        script = get_script(server=FakeServer(), name='plain', cycle=1, script="write('a', 1)", is_active=True)
+        self.assertIsInstance(script, Script)
+
+    def test_prefix_groups(self):
+        tags = make_tags()
+        tags['T_1'].status = -1
+        script = self.make_script('#!array in=prefix:T_ out=prefix:TF_\nx * 1.8 + 32', tags)
+        # T_name - не число, T_sum - без выходного тега
+        self.assertEqual({'T_0', 'T_1', 'T_2', 'T_sum'}, script.info.reads)
+        self.assertEqual({'TF_0', 'TF_1', 'TF_2'}, script.info.writes)
+        script.execute()
+        self.assertEqual([('TF_0', 32, 0), ('TF_1', 50.0, -1), ('TF_2', 68.0, 0)], self.server.writes)
+        self.assertIsInstance(self.server.writes[0][1], int)
+
+    def test_missing_input(self):
+        tags = make_tags()
+        tags['T_0'].value = None
+        tags['T_1'].value = None
+        tags['TF_1'] = Tag(name='TF_1', type_=TagType.BOOL, value=False)
+        script = self.make_script('#!array in=prefix:T_ out=prefix:TF_\nx * 1.8 + 32', tags)
+        script.execute()
+        # входы без значения не прерывают группу: остальные выходы записаны
+        self.assertEqual([('TF_0', None, -1), ('TF_1', None, -1), ('TF_2', 68.0, 0)], self.server.writes)
+
+    def test_missing_input_to_tag(self):
+        tags = make_tags()
+        tags['T_0'].value = None
+        tags['T_sum'] = Tag(name='T_sum', type_=TagType.INT, value=0)
+        script = self.make_script('#!array in=connector:plc out=tag:T_sum\nx.sum()', tags)
+        script.execute()
+        self.assertEqual([('T_sum', None, -1)], self.server.writes)
+
+    def test_connector_group_to_tag(self):
+        tags = make_tags()
+        tags['T_2'].status = 3
+        script = self.make_script('#!array in=connector:plc out=tag:T_sum\nx.sum()', tags)
+        script.execute()
+        self.assertEqual([('T_sum', 30.0, 3)], self.server.writes)
+
+    def test_missing_value_is_nan(self):
+        tags = make_tags()
+        tags['T_1'].value = None
+        script = self.make_script('#!array in=connector:plc out=tag:T_sum\nnp.nansum(x)', tags)
+        script.execute()
+        self.assertEqual([('T_sum', 20.0, 0)], self.server.writes)
+
+    def test_header_errors(self):
+        for text in ('#!array in=prefix:T_\nx', '#!array in=group:T_ out=tag:T_sum\nx', '#!array in=prefix:T_ out=tag:T_sum\nx.__class__'):
+            script = get_script(server=FakeServer(), name='bad', cycle=1, script=text, is_active=True)
+            self.assertFalse(script.is_active, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,19 @@
+import struct
 import unittest
 import sys
+from unittest import mock
 
 sys.path.extend(['.','..'])
 
+from loggers import logger
+from models.tag import Tag, TagType
 from connectors.connector_modbus import ConnectorModbus;
+from connectors.modbus_planner import ReadItem, parse_source, build_read_plan, encode_write
 
 class ConnectorModbusMethods(unittest.TestCase):
    
     def setUp(self):
-        self.connector = ConnectorModbus('modbus', 1, 'host=0.0.0.0;port=502;unit_id=1;timeout=1;auto_open=true;auto_close=false', None, None, True, None)
+        self.connector = ConnectorModbus(logger.get_logger('modbus'), 'modbus', 1, 'host=0.0.0.0;port=502;unit_id=1;timeout=1;auto_open=true;auto_close=false', [], None, True, None)
 
 #    def tearDown(self):
 #        self.connector.dispose()
@@ -50,5 +55,131 @@ class ConnectorModbusMethods(unittest.TestCase):
             self.connector._source_parse(source)
         self.assertIsNotNone(cm.exception)
 
+class ModbusPlannerMethods(unittest.TestCase):
+
+    def _items(self, sources):
+        items = []
+        for i, source in enumerate(sources):
+            tag = Tag(name=f'tag_{i}', type_=TagType.INT, source=source)
+            items.append(ReadItem(key=tag.name, tag=tag, source=parse_source(source)))
+        return items
+
+    def test_merge_adjacent(self):
+        items = self._items(['RH:0:1', 'RH:1:2', 'RH:3:1'])
+        blocks = build_read_plan(items)
+        self.assertEqual(1, len(blocks))
+        self.assertEqual((0, 4), (blocks[0].addr, blocks[0].count))
+        self.assertEqual([0, 1, 3], [item.offset for item in blocks[0].items])
+
+    def test_gap_tolerance(self):
+        items = self._items(['RH:0:1', 'RH:5:1'])
+        self.assertEqual(2, len(build_read_plan(items, max_gap=0)))
+
+        items = self._items(['RH:0:1', 'RH:5:1'])
+        blocks = build_read_plan(items, max_gap=4)
+        self.assertEqual(1, len(blocks))
+        self.assertEqual(6, blocks[0].count)
+        self.assertEqual(5, blocks[0].items[1].offset)
+
+    def test_split_by_area(self):
+        items = self._items(['C:0:1', 'DI:0:1', 'RI:0:1', 'RH:0:1', 'C:1:1'])
+        blocks = build_read_plan(items)
+        self.assertEqual(['C', 'DI', 'RI', 'RH'], [block.area for block in blocks])
+        self.assertEqual(2, blocks[0].count)
+
+    def test_protocol_limit(self):
+        items = self._items([f'RH:{i * 10}:10' for i in range(25)])
+        blocks = build_read_plan(items)
+        self.assertEqual(3, len(blocks))
+        self.assertTrue(all(block.count <= 125 for block in blocks))
+
+        items = self._items([f'C:{i * 100}:100' for i in range(25)])
+        blocks = build_read_plan(items)
+        self.assertEqual(2, len(blocks))
+        self.assertEqual(2000, blocks[0].count)
+
+    def test_overlapping(self):
+        items = self._items(['RH:0:4', 'RH:2:1'])
+        blocks = build_read_plan(items)
+        self.assertEqual(1, len(blocks))
+        self.assertEqual(4, blocks[0].count)
+
+def float_words(value, order):
+    # слова float32 в порядке байт order, например 'CDAB'
+    data = dict(zip('ABCD', struct.pack('>f', value)))
+    raw = bytes(data[char] for char in order)
+    return list(struct.unpack('>2H', raw))
+
+
+class TypedSourceMethods(unittest.TestCase):
+
+    def decode(self, source, words, offset=0):
+        source = parse_source(source)
+        block = build_read_plan([ReadItem(key='t', tag=None, source=source)])[0]
+        words = [0] * offset + words
+        block.count = len(words)
+        block.prepare()
+        return source.codec.decode(block.buffers(words), offset)
+
+    def test_untyped_unchanged(self):
+        self.assertEqual(65535, self.decode('RH:0:1', [65535]))
+        self.assertEqual([1, 2, 3], self.decode('RH:0:3', [1, 2, 3]))
+        self.assertEqual([True, False], parse_source('C:0:2').codec.decode(([False, True, False], None), 1))
+
+    def test_float32_orders(self):
+        for order, options in (('ABCD', ''), ('CDAB', ':wo=little'), ('BADC', ':bo=little'), ('DCBA', ':bo=little:wo=little')):
+            value = self.decode(f'RH:10:2:float32{options}', float_words(1.5, order), offset=3)
+            self.assertEqual(1.5, value, order)
+
+    def test_integers(self):
+        self.assertEqual(-2, self.decode('RI:0:1:int16', [0xFFFE]))
+        self.assertEqual(0x00010002, self.decode('RH:0:2:uint32', [1, 2]))
+        self.assertEqual(0x00020001, self.decode('RH:0:2:uint32:wo=little', [1, 2]))
+        self.assertEqual(-1, self.decode('RH:0:4:int64', [0xFFFF] * 4))
+
+    def test_array(self):
+        words = float_words(1.0, 'ABCD') + float_words(-2.5, 'ABCD')
+        self.assertEqual([1.0, -2.5], self.decode('RH:0:4:float32', words))
+
+    def test_scale_offset(self):
+        self.assertAlmostEqual(-15.0, self.decode('RI:0:1:int16:scale=0.1:offset=-40', [250]))
+        self.assertEqual([2.0, 4.0], self.decode('RH:0:2:scale=2', [1, 2]))
+
+    def test_bit(self):
+        self.assertIs(True, self.decode('RH:0:1:bit=3', [0b1000]))
+        self.assertIs(False, self.decode('RH:0:1:bit=2', [0b1000]))
+        self.assertIs(True, self.decode('RH:0:2:uint32:bit=16', [1, 0]))
+
+    def test_wrong_type(self):
+        for source in ('RH:0:1:float32', 'RH:0:2:real', 'RH:0:2:float32:bit=1', 'RH:0:1:bit=16',
+                       'C:0:1:int16', 'RH:0:1:wo=middle', 'RH:0:1:scale=a', 'RH:0:1:size=2'):
+            with self.assertRaises(ValueError, msg=source):
+                parse_source(source)
+
+    def test_encode_typed(self):
+        self.assertEqual(float_words(1.5, 'CDAB'), encode_write(parse_source('RH:0:2:float32:wo=little'), 1.5))
+        self.assertEqual([250], encode_write(parse_source('RH:0:1:int16:scale=0.1:offset=-40'), -15.0))
+        self.assertEqual([0xFFFE], encode_write(parse_source('RH:0:1:int16'), -2))
+        with self.assertRaises(ValueError):
+            encode_write(parse_source('RH:0:1:int16'), 40000)
+        with self.assertRaises(ValueError):
+            encode_write(parse_source('RH:0:1:bit=1'), True)
+
+    def test_put_block(self):
+        tags = [(name, Tag(name=name, type_=TagType.FLOAT, source=source)) for name, source in
+                (('t1', 'RH:0:2:float32'), ('t2', 'RH:2:2:float32:wo=little'), ('t3', 'RH:4:1:int16'))]
+        connector = ConnectorModbus(logger.get_logger('modbus'), 'modbus', 1,
+                                    'host=0.0.0.0;port=502;unit_id=1;timeout=1;auto_open=true;auto_close=false',
+                                    tags, None, True, None)
+        self.assertEqual(1, len(connector.read_plan))
+        with mock.patch.object(connector, '_put_value') as put_value:
+            connector._put_block(connector.read_plan[0], float_words(0.5, 'ABCD') + float_words(2.0, 'CDAB') + [0xFFFF])
+            self.assertEqual([mock.call('t1', tags[0][1], 0, 0.5), mock.call('t2', tags[1][1], 0, 2.0),
+                              mock.call('t3', tags[2][1], 0, -1)], put_value.call_args_list)
+            put_value.reset_mock()
+            connector._put_block(connector.read_plan[0], None)
+            self.assertEqual([-1, -1, -1], [call.args[2] for call in put_value.call_args_list])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,93 @@
+import logging
+import math
+import queue
+import time
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from connectors.connector_test import ConnectorTest
+from models.tag import Tag, TagType
+from models.value_batch import ValueBatch
+
+
+def make_connector(sources, connection_string='connector=ConnectorTest', type_=TagType.FLOAT, cycle=1):
+    tags = []
+    for i, source in enumerate(sources):
+        tag = Tag(name=f'tag_{i}', type_=type_, source=source, connector_name='test')
+        tags.append((tag.name, tag))
+    return ConnectorTest(log=logging.getLogger('test'), name='test', cycle=cycle, connection_string=connection_string,
+                         tags=tags, read_queue=queue.Queue())
+
+
+class ConnectorTestMethods(unittest.TestCase):
+
+    def test_functions(self):
+        connector = make_connector([
+            'func=line;scale=5',
+            'func=sin;period=1;scale=10',
+            'func=cos;period=1;scale=10',
+            'func=sawtooth;period=1;scale=2.5',
+            'func=square;period=1;scale=3',
+            None,
+        ])
+        steps = [connector.calc_values() for _ in range(4)]
+
+        self.assertEqual([5.0] * 4, [values[0] for values in steps])
+        # синус: фаза растёт на 360 * cycle / (60 * period) градусов за цикл
+        for i, values in enumerate(steps):
+            self.assertAlmostEqual(10 * math.sin(math.radians(6 * i)), values[1])
+            self.assertAlmostEqual(10 * math.cos(math.radians(6 * i)), values[2])
+        self.assertEqual([1.0, 2.0, 0.0, 1.0], [values[3] for values in steps])
+        self.assertEqual([3.0, -3.0, -3.0, 3.0], [values[4] for values in steps])
+        self.assertEqual([0.0] * 4, [values[5] for values in steps])
+
+    def test_random_in_range(self):
+        values = make_connector(['func=rnd;scale=4'] * 1000).calc_values()
+        self.assertTrue(((values >= 0) & (values <= 4)).all())
+
+    def test_unsupported_function(self):
+        with self.assertRaises(Exception):
+            make_connector(['func=tan'])
+
+    def test_instances_keep_own_state(self):
+        first = make_connector(['func=sawtooth;period=1;scale=100'])
+        second = make_connector(['func=sawtooth;period=1;scale=100'])
+        first.calc_values()
+        first.calc_values()
+        self.assertEqual(1.0, second.calc_values()[0])
+
+    def test_stress_tags(self):
+        connector = make_connector([], connection_string='connector=ConnectorTest;stress_tags=1000;stress_log=0')
+        self.assertEqual(1000, len(connector.tags))
+        name, tag = connector.tags[0]
+        self.assertEqual('test.stress_0', name)
+        self.assertEqual('test', tag.connector_name)
+        self.assertFalse(tag.is_log)
+
+    def test_read_batch(self):
+        connector = make_connector(['func=line;scale=1.5', 'func=line;scale=-2.7'], type_=TagType.FLOAT)
+        connector.tags.append(('int', Tag(name='int', type_=TagType.INT, source='func=line;scale=-2.7')))
+        connector.tags.append(('str', Tag(name='str', type_=TagType.STR, value='')))
+        connector = ConnectorTest(log=connector.log, name='test', cycle=1, connection_string='connector=ConnectorTest',
+                                  tags=connector.tags, read_queue=queue.Queue())
+        for index, (_, tag) in enumerate(connector.tags):
+            tag.index = index
+
+        start_time = time.time()
+        connector.read()
+        connector._read_done()
+        records = list(ValueBatch.records_of(connector.read_queue.get()))
+
+        self.assertEqual([
+            (0, TagType.FLOAT, 0, 1.5, False),
+            (1, TagType.FLOAT, 0, -2.7, False),
+            (2, TagType.INT, 0, -2, False),
+            (3, TagType.STR, 0, 0.0, False),
+        ], [(index, type_, status, value, is_log) for index, type_, status, _, value, is_log in records])
+        self.assertTrue(all(update_time >= start_time for _, _, _, update_time, _, _ in records))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import sys
+from collections import namedtuple
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+from loggers import logger
+from producers import kafka_producer as producer
+
+
+class Metadata:
+    partition = 0
+    offset = 0
+
+
+class KafkaProducerMethods(unittest.TestCase):
+
+    def setUp(self):
+        producer.log = logger.get_logger('producer')
+        producer.in_flight.clear()
+        producer.acked_id = producer.cursor_id = 0
+
+    def send(self, max_id, parts=1):
+        batch = producer.InFlightBatch(max_id, 10, parts)
+        producer.in_flight.append(batch)
+        producer.cursor_id = max_id
+        return batch
+
+    def test_acked_in_order(self):
+        first = self.send(10)
+        second = self.send(20)
+        second.success(Metadata())
+        producer.advance_acked()
+        self.assertEqual(0, producer.acked_id)
+
+        first.success(Metadata())
+        producer.advance_acked()
+        self.assertEqual(20, producer.acked_id)
+        self.assertFalse(producer.in_flight)
+
+    def test_all_parts_acked(self):
+        batch = self.send(10, parts=2)
+        batch.success(Metadata())
+        producer.advance_acked()
+        self.assertEqual(0, producer.acked_id)
+        batch.success(Metadata())
+        producer.advance_acked()
+        self.assertEqual(10, producer.acked_id)
+
+    def test_error_resends_from_acked(self):
+        self.send(10).success(Metadata())
+        self.send(20).failure(Exception('timeout'))
+        self.send(30).success(Metadata())
+        with mock.patch('time.sleep'):
+            producer.advance_acked()
+        self.assertEqual(10, producer.acked_id)
+        self.assertEqual(10, producer.cursor_id)
+        self.assertFalse(producer.in_flight)
+
+    def test_split_by_partition(self):
+        Row = namedtuple('Row', ['id', 'tag_id'])
+        rows = [Row(i, f'tag_{i % 7}') for i in range(50)]
+        with mock.patch.object(producer, 'get_partitions', return_value=[0, 1, 2]):
+            parts = producer.split_by_partition(rows)
+        self.assertEqual(50, sum(len(part) for part in parts.values()))
+        for partition, part in parts.items():
+            for row in part:
+                self.assertEqual(partition, producer.partition_of(row.tag_id, 3))
+            # порядок записей в сообщении как в History
+            self.assertEqual(sorted(row.id for row in part), [row.id for row in part])
+
+
+if __name__ == '__main__':
+    unittest.main()
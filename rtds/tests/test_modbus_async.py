@@ -0,0 +1,74 @@
+import asyncio
+import struct
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from connectors.modbus_async import AsyncModbusClient, ModbusError, MBAP_HEADER
+
+
+async def handle_client(reader, writer):
+    # отвечает на запросы в обратном порядке, чтобы проверить сопоставление по transaction id
+    requests = []
+    while len(requests) < 2:
+        header = await reader.readexactly(MBAP_HEADER.size)
+        transaction_id, _, length, unit_id = MBAP_HEADER.unpack(header)
+        pdu = await reader.readexactly(length - 1)
+        requests.append((transaction_id, unit_id, pdu))
+    for transaction_id, unit_id, pdu in reversed(requests):
+        function = pdu[0]
+        addr, count = struct.unpack('>HH', pdu[1:5])
+        if function == 0x03:
+            data = struct.pack(f'>{count}H', *range(addr, addr + count))
+            body = bytes([function, len(data)]) + data
+        elif function == 0x01:
+            body = bytes([function, 1, 0b00000101])
+        elif function in (0x0F, 0x10):
+            body = pdu[:5]
+        else:
+            body = bytes([function | 0x80, 0x02])
+        writer.write(MBAP_HEADER.pack(transaction_id, 0, len(body) + 1, unit_id) + body)
+    await writer.drain()
+
+
+class AsyncModbusClientMethods(unittest.TestCase):
+
+    def _run(self, requests):
+        async def main():
+            server = await asyncio.start_server(handle_client, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncModbusClient('127.0.0.1', port, unit_id=1, timeout=2)
+            try:
+                await client.open()
+                return await asyncio.gather(*requests(client), return_exceptions=True)
+            finally:
+                await client.close()
+                server.close()
+        return asyncio.run(main())
+
+    def test_pipelined_reads(self):
+        results = self._run(lambda client: [
+            client.read_holding_registers(10, 3),
+            client.read_coils(0, 4),
+        ])
+        self.assertEqual([10, 11, 12], results[0])
+        self.assertEqual([True, False, True, False], results[1])
+
+    def test_exception_response(self):
+        results = self._run(lambda client: [
+            client.read_holding_registers(0, 1),
+            client.read_input_registers(0, 1),
+        ])
+        self.assertEqual([0], results[0])
+        self.assertIsInstance(results[1], ModbusError)
+
+    def test_pipelined_writes(self):
+        results = self._run(lambda client: [
+            client.write_multiple_registers(0, [1, 2, 3]),
+            client.write_multiple_coils(8, [True, False, True]),
+        ])
+        self.assertEqual([True, True], results)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import queue
+import socket
+import time
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from pyModbusTCP.server import ModbusServer
+from loggers import logger
+from models.tag import Tag, TagType, TagValue
+from models.value_batch import ValueBatch
+from connectors.connector_abc import STATUS_WRITE_ERROR
+from connectors.connector_modbus import ConnectorModbus
+from connectors.modbus_planner import WriteItem, parse_source, encode_write, build_write_plan
+
+
+def write_item(key, source, value):
+    source = parse_source(source)
+    return WriteItem(key=key, tag=None, source=source, value=value, words=encode_write(source, value))
+
+
+class FakeClient:
+
+    def __init__(self, fail_addr=None):
+        self.calls = []
+        self.fail_addr = fail_addr
+
+    def _call(self, name, addr, values):
+        self.calls.append((name, addr, values))
+        return addr != self.fail_addr
+
+    def write_single_coil(self, addr, value):
+        return self._call('coil', addr, value)
+
+    def write_multiple_coils(self, addr, values):
+        return self._call('coils', addr, values)
+
+    def write_single_register(self, addr, value):
+        return self._call('register', addr, value)
+
+    def write_multiple_registers(self, addr, values):
+        return self._call('registers', addr, values)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class WritePlanMethods(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual([0xFFFF], encode_write(parse_source('RH:0:1'), -1))
+        self.assertEqual([True, False], encode_write(parse_source('C:0:2'), [1, 0]))
+        with self.assertRaises(ValueError):
+            encode_write(parse_source('RI:0:1'), 1)
+        with self.assertRaises(ValueError):
+            encode_write(parse_source('RH:0:2'), [1])
+
+    def test_merge_contiguous(self):
+        blocks = build_write_plan([write_item('a', 'RH:1:1', 1), write_item('b', 'RH:0:1', 0),
+                                   write_item('c', 'RH:2:2', [2, 3]), write_item('d', 'RH:10:1', 10),
+                                   write_item('e', 'C:0:1', True)])
+        self.assertEqual([('C', 0, [True]), ('RH', 0, [0, 1, 2, 3]), ('RH', 10, [10])],
+                         [(block.area, block.addr, block.values) for block in blocks])
+        self.assertEqual(['b', 'a', 'c'], [item.key for item in blocks[1].items])
+
+    def test_overlap_last_wins(self):
+        blocks = build_write_plan([write_item('a', 'RH:0:2', [1, 1]), write_item('b', 'RH:1:1', 5)])
+        self.assertEqual([[1, 5]], [block.values for block in blocks])
+
+    def test_max_count(self):
+        blocks = build_write_plan([write_item(f't{i}', f'RH:{i}:1', i) for i in range(130)])
+        self.assertEqual([123, 7], [block.count for block in blocks])
+
+
+class ConnectorWriteMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = []
+        for i, source in enumerate(['RH:0:1', 'RH:1:1', 'C:5:1', 'RH:20:1', 'RI:0:1']):
+            tag = Tag(name=f'tag_{i}', type_=TagType.INT, connector_name='modbus', source=source)
+            tag.index = i
+            self.tags.append((tag.name, tag))
+        self.read_queue = queue.Queue()
+        self.write_queue = queue.Queue()
+
+    def make_connector(self, port=502):
+        return ConnectorModbus(logger.get_logger('modbus'), 'modbus', 1,
+                               f'host=127.0.0.1;port={port};unit_id=1;timeout=1;auto_open=true;auto_close=false',
+                               self.tags, self.read_queue, False, self.write_queue)
+
+    def results(self):
+        results = {}
+        while not self.read_queue.empty():
+            for index, _, status, _, value, _ in ValueBatch.records_of(self.read_queue.get()):
+                results[index] = (status, value)
+        return results
+
+    def test_coalesce_and_report(self):
+        connector = self.make_connector()
+        pending = {}
+        for name, value in (('tag_0', 1), ('tag_1', 2), ('tag_0', 3), ('tag_2', 1), ('tag_3', 7)):
+            connector._add_write(pending, TagValue(name=name, type_=TagType.INT, status=0, value=value))
+        client = FakeClient(fail_addr=20)
+        connector._write_pending(client, pending)
+        self.assertEqual([('coil', 5, True), ('registers', 0, [3, 2]), ('register', 20, 7)], client.calls)
+        self.assertEqual({0: (0, 3), 1: (0, 2), 2: (0, 1), 3: (STATUS_WRITE_ERROR, None)}, self.results())
+
+    def test_read_only_area(self):
+        connector = self.make_connector()
+        pending = {}
+        connector._add_write(pending, TagValue(name='tag_4', type_=TagType.INT, status=0, value=1))
+        self.assertEqual({}, pending)
+        self.assertEqual({4: (STATUS_WRITE_ERROR, None)}, self.results())
+
+    def test_writer_thread(self):
+        port = free_port()
+        server = ModbusServer(host='127.0.0.1', port=port, no_block=True)
+        server.start()
+        self.addCleanup(server.stop)
+        connector = self.make_connector(port)
+        self.write_queue.put(TagValue(name='tag_0', type_=TagType.INT, status=0, value=11))
+        self.write_queue.put(TagValue(name='tag_1', type_=TagType.INT, status=0, value=12))
+        connector.write()
+        deadline = time.monotonic() + 5
+        results = {}
+        while len(results) < 2 and time.monotonic() < deadline:
+            results.update(self.results())
+            time.sleep(0.01)
+        self.assertEqual({0: (0, 11), 1: (0, 12)}, results)
+        self.assertEqual([11, 12], server.data_bank.get_holding_registers(0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import logging
+import unittest
+import sys
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+import app
+from models.tag import Tag, TagType
+from scripts.script import Script
+from scripts.script_graph import ScriptGraph
+from scripts.script_runtime import ScriptRuntime
+
+log = logging.getLogger('test')
+
+
+def make_tags(*names):
+    tags = {}
+    for index, name in enumerate(names):
+        tags[name] = Tag(name=name, type_=TagType.FLOAT, value=0.0)
+        tags[name].index = index
+    return tags
+
+
+def make_scripts(server, tags, items):
+    scripts = {}
+    for name, trigger, text in items:
+        script = Script(server=server, name=name, cycle=1, script=text, is_active=True, trigger=trigger)
+        script.bind(tags)
+        scripts[name] = script
+    return scripts
+
+
+class ScriptGraphMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = make_tags('in', 'a', 'b', 'c', 'other')
+        self.scripts = make_scripts(None, self.tags, [
+            ('s_c', 'change', "write('c', value('a') + value('b'))"),
+            ('s_a', 'change', "write('a', value('in'))"),
+            ('s_b', 'change', "write('b', value('in') * 2)"),
+            ('s_other', 'cycle', "write('other', 1)"),
+        ])
+        self.graph = ScriptGraph(list(self.scripts.values()), log)
+
+    def test_levels(self):
+        self.assertEqual([['s_a', 's_b', 's_other'], ['s_c']], self.graph.levels)
+        self.assertEqual({'s_a', 's_b'}, self.graph.ancestors['s_c'])
+
+    def test_triggers(self):
+        self.assertEqual(['s_a', 's_b'], sorted(self.graph.triggers[self.tags['in'].index]))
+        self.assertEqual(['s_c'], self.graph.triggers[self.tags['a'].index])
+        self.assertNotIn(self.tags['c'].index, self.graph.triggers)
+
+    def test_ready_waits_for_ancestors(self):
+        ready = self.graph.ready({'s_a', 's_b', 's_c'}, set())
+        self.assertEqual(['s_a', 's_b'], [script.name for script in ready])
+        self.assertEqual([], self.graph.ready({'s_c'}, {'s_a'}))
+        self.assertEqual(['s_c'], [script.name for script in self.graph.ready({'s_c'}, set())])
+
+    def test_cycle(self):
+        tags = make_tags('x', 'y')
+        scripts = make_scripts(None, tags, [
+            ('s_x', 'change', "write('x', value('y'))"),
+            ('s_y', 'change', "write('y', value('x'))"),
+        ])
+        with self.assertLogs(log, level='WARNING'):
+            graph = ScriptGraph(list(scripts.values()), log)
+        self.assertEqual(['s_x', 's_y'], [script.name for script in graph.ready({'s_x', 's_y'}, set())])
+
+
+class ChangeTriggerMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = make_tags('in', 'a', 'b', 'c')
+        self.scripts = make_scripts(app, self.tags, [
+            ('s_c', 'change', "write('c', value('a') + value('b'))"),
+            ('s_a', 'change', "write('a', value('in'))"),
+            ('s_b', 'change', "write('b', value('in') * 2)"),
+        ])
+        runtime = ScriptRuntime(0, app.log)
+        self.addCleanup(runtime.shutdown)
+        patcher = mock.patch.multiple(app, connectors={}, tags=self.tags, scripts=self.scripts, tag_table=None,
+                                      api_command_queue=None, script_runtime=runtime, TAG_TABLE_ENABLED=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app.init_tag_table()
+        app.init_schedule()
+        self.addCleanup(app.selector.close)
+
+    def test_change_propagates_once(self):
+        # первый запуск после загрузки
+        self.assertEqual(3, app.run_changed_scripts())
+        self.assertEqual(0, app.run_changed_scripts())
+
+        app._set_tag(self.tags['in'], 2.0, 0)
+        with mock.patch.object(self.scripts['s_c'], 'call', wraps=self.scripts['s_c'].call) as call:
+            self.assertEqual(3, app.run_changed_scripts())
+        call.assert_called_once()
+        self.assertEqual(6.0, self.tags['c'].value)
+
+    def test_unchanged_value_skips_scripts(self):
+        app.run_changed_scripts()
+        app._set_tag(self.tags['in'], 0.0, 0)
+        self.assertEqual(0, app.run_changed_scripts())
+
+    def test_change_scripts_have_no_timer(self):
+        self.assertEqual([], app.script_timers)
+
+
+if __name__ == '__main__':
+    unittest.main()
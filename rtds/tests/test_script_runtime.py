@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+import sys
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+from models.tag import Tag, TagType
+from scripts import script_abc
+from scripts.script import Script
+from scripts.script_compiler import ScriptError, analyze
+from scripts.script_runtime import ScriptRuntime
+
+
+class FakeServer:
+    log_queue = None
+    metrics_queue = None
+
+    def __init__(self):
+        self.writes = []
+
+    def write_tag(self, tag, value, status):
+        self.writes.append((tag.name, value, status))
+
+
+def make_tags():
+    return {name: Tag(name=name, type_=TagType.FLOAT, value=value) for name, value in (('a', 1.0), ('b', 2.0), ('out', 0.0))}
+
+
+class ScriptCompilerMethods(unittest.TestCase):
+
+    def test_tags_of_script(self):
+        _, info = analyze("x = value('a') + get('b').value\ntgv = self.server.get('out')\ntgv.value = x\nself.server.set(tgv)\n")
+        self.assertEqual({'a', 'b', 'out'}, info.reads)
+        self.assertEqual({'out'}, info.writes)
+        self.assertFalse(info.is_dynamic)
+
+    def test_dynamic_name(self):
+        _, info = analyze("for name in ('a', 'b'):\n    write(name, 1)\n")
+        self.assertTrue(info.is_dynamic)
+
+    def test_restrictions(self):
+        for script in ('import os', 'from subprocess import run', 'x = (1).__class__', '__import__("os")'):
+            with self.assertRaises(ScriptError, msg=script):
+                analyze(script)
+        analyze('import math\nfrom datetime import timedelta')
+
+
+class ScriptMethods(unittest.TestCase):
+
+    def make_script(self, text, server=None):
+        script = Script(server=server or FakeServer(), name='test', cycle=1, script=text, is_active=True)
+        self.assertTrue(script.is_active)
+        script.bind(make_tags())
+        return script
+
+    def test_writes_applied_after_run(self):
+        server = FakeServer()
+        script = self.make_script("tgv = self.server.get('out')\ntgv.value = value('a') + value('b')\nself.server.set(tgv)\nwrite('a', 5.0, 1)\n", server)
+        script.execute()
+        self.assertEqual([('out', 3.0, 0), ('a', 5.0, 1)], server.writes)
+
+    def test_writes_dropped_on_error(self):
+        server = FakeServer()
+        script = self.make_script("write('out', 1.0)\nraise ValueError('bad')\n", server)
+        script.execute()
+        self.assertEqual([], server.writes)
+
+    def test_restricted_builtins(self):
+        server = FakeServer()
+        script = self.make_script("open('/etc/passwd')\nwrite('out', 1.0)\n", server)
+        script.execute()
+        self.assertEqual([], server.writes)
+
+    def test_compile_error_disables_script(self):
+        script = Script(server=FakeServer(), name='bad', cycle=1, script='import os', is_active=True)
+        self.assertFalse(script.is_active)
+
+    def test_cpu_budget(self):
+        script = self.make_script("while True:\n    pass\n")
+        with mock.patch.object(script_abc, 'SCRIPT_CPU_BUDGET', 0.05):
+            with self.assertRaises(script_abc.ScriptTimeout):
+                script.call()
+
+
+class ScriptRuntimeMethods(unittest.TestCase):
+
+    def test_pool_skips_running_script(self):
+        server = FakeServer()
+        release = threading.Event()
+        script = Script(server=server, name='slow', cycle=1, script="wait()\nwrite('out', 1.0)\n", is_active=True)
+        script.bind(make_tags())
+        script.function.__globals__['wait'] = lambda: release.wait(5)
+        runtime = ScriptRuntime(2, script.log)
+        self.addCleanup(runtime.shutdown)
+
+        self.assertTrue(runtime.submit(script))
+        self.assertFalse(runtime.submit(script))
+        release.set()
+        deadline = time.monotonic() + 5
+        while not runtime.collect() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([('out', 1.0, 0)], server.writes)
+        self.assertTrue(runtime.submit(script))
+
+    def test_reset_drops_old_results(self):
+        server = FakeServer()
+        script = Script(server=server, name='fast', cycle=1, script="write('out', 1.0)\n", is_active=True)
+        script.bind(make_tags())
+        runtime = ScriptRuntime(1, script.log)
+        self.addCleanup(runtime.shutdown)
+        runtime.submit(script)
+        runtime.executor.submit(lambda: None).result()
+        time.sleep(0.05)
+        runtime.reset()
+        self.assertEqual(0, runtime.collect())
+        self.assertEqual([], server.writes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from sqlalchemy import text
+from store import engine as store_engine
+
+
+class StoreEngineMethods(unittest.TestCase):
+
+    def test_sqlite_pragmas(self):
+        with tempfile.TemporaryDirectory() as path:
+            engine = store_engine._create_engine(f'sqlite:///{os.path.join(path, "test.db")}')
+            try:
+                with engine.connect() as connection:
+                    self.assertEqual('wal', connection.execute(text('PRAGMA journal_mode')).scalar().lower())
+                    self.assertEqual(1, connection.execute(text('PRAGMA synchronous')).scalar())
+                    self.assertEqual(store_engine.SQLITE_BUSY_TIMEOUT, connection.execute(text('PRAGMA busy_timeout')).scalar())
+                    self.assertEqual(store_engine.SQLITE_CACHE_SIZE, connection.execute(text('PRAGMA cache_size')).scalar())
+            finally:
+                engine.dispose()
+
+    def test_engine_per_process(self):
+        engine = store_engine.get_engine()
+        self.assertIs(engine, store_engine.get_engine())
+        store_engine.engine_pid = -1
+        self.assertIsNot(engine, store_engine.get_engine())
+
+if __name__ == '__main__':
+    unittest.main()
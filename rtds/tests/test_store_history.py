@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+from sqlalchemy import insert
+from store import engine as store_engine
+from store import sqldb
+
+
+class HourlyHistoryMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.TemporaryDirectory()
+        self.engine = store_engine._create_engine(f'sqlite:///{os.path.join(self.path.name, "test.db")}')
+        self.patches = [
+            mock.patch.object(store_engine, 'engine', self.engine),
+            mock.patch.object(store_engine, 'engine_pid', os.getpid()),
+            mock.patch.object(sqldb, 'STORE_HISTORY_LAYOUT', 'hourly'),
+            mock.patch.object(sqldb, 'history_next_id', None),
+            mock.patch.object(sqldb, 'bucket_insert_sql', {}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        sqldb.Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.engine.dispose()
+        self.path.cleanup()
+
+    def add_bucket(self, hours_ago, first_id, count):
+        moment = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+        table = sqldb.bucket_table(sqldb.bucket_name(moment))
+        with self.engine.begin() as connection:
+            table.create(connection)
+            connection.execute(insert(table), [
+                {'id': first_id + i, 'tag_time': moment.replace(tzinfo=None), 'tag_id': 'tag', 'status': 0, 'float_value': float(first_id + i)}
+                for i in range(count)
+            ])
+        return table.name
+
+    def test_select_spans_buckets(self):
+        self.add_bucket(3, 1, 5)
+        self.add_bucket(2, 6, 5)
+        with self.engine.connect() as connection:
+            rows = sqldb.select_history(connection, where=lambda table: table.c.id > 3,
+                                        order_by=lambda table: table.c.id, limit=4)
+            self.assertEqual([4, 5, 6, 7], [row.id for row in rows])
+            self.assertEqual(10, sqldb.history_rows_count(connection))
+
+    def test_write_continues_ids(self):
+        self.add_bucket(2, 1, 5)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        sqldb.batch_write([(now, 'tag', 0, None, None, 1.0, None), (now, 'tag', 0, None, None, 2.0, None)])
+        with self.engine.connect() as connection:
+            rows = sqldb.select_history(connection, where=lambda table: table.c.id > 5,
+                                        order_by=lambda table: table.c.id, limit=10)
+        self.assertEqual([6, 7], [row.id for row in rows])
+
+    def test_drop_only_sent_buckets(self):
+        old = self.add_bucket(30, 1, 5)
+        unsent = self.add_bucket(26, 6, 5)
+        recent = self.add_bucket(1, 11, 5)
+        with self.engine.begin() as connection:
+            connection.execute(insert(sqldb.State), {'id': 'producer_last_id', 'value': '7'})
+
+        sqldb.delete_old_history()
+        with self.engine.connect() as connection:
+            names = [table.name for table in sqldb.get_history_tables(connection)]
+        self.assertEqual([unsent, recent], names)
+        self.assertNotIn(old, names)
+        with self.engine.connect() as connection:
+            self.assertEqual(5, sqldb.get_counters(connection)[sqldb.COUNTER_DELETED])
+
+    def test_store_metrics_from_counters(self):
+        self.add_bucket(2, 1, 5)
+        with self.engine.begin() as connection:
+            connection.execute(insert(sqldb.State), {'id': 'producer_last_id', 'value': '3'})
+        sqldb.init_counters()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        sqldb.batch_write([(now, 'tag', 0, None, None, 1.0, None)])
+
+        queue = mock.Mock()
+        with mock.patch.object(sqldb, 'metrics_queue', queue), mock.patch.object(sqldb.metrics, 'collect_process_metrics'):
+            sqldb.collect_store_metrics()
+        values = {call.args[0].name: call.args[0].value for call in queue.put.call_args_list}
+        self.assertEqual(6, values[sqldb.metrics.MetricEnum.STORE_ROWS_GAUGE])
+        self.assertEqual(3, values[sqldb.metrics.MetricEnum.PRODUCER_LAG_ROWS])
+        self.assertAlmostEqual(2 * 3600, values[sqldb.metrics.MetricEnum.PRODUCER_LAG_SECONDS], delta=60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import math
+import queue
+import random
+import unittest
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+sys.path.extend(['.','..'])
+
+import app
+from models.swinging_door import SwingingDoor
+from models.tag import Tag, TagType
+from models.value_batch import ValueBatch
+
+
+class SwingingDoorMethods(unittest.TestCase):
+
+    def feed(self, door, values, deviation, max_interval=0, status=0, index=0):
+        archived = []
+        for t, value in enumerate(values):
+            archived.extend(door.add(index, float(t), value, status, deviation, max_interval))
+        return archived
+
+    def test_first_point_archived(self):
+        door = SwingingDoor(1)
+        self.assertEqual(((0.0, 5.0, 0),), door.add(0, 0.0, 5.0, 0, 0.1))
+
+    def test_ramp_keeps_end_points(self):
+        door = SwingingDoor(1)
+        archived = self.feed(door, [i * 0.5 for i in range(100)], deviation=0.01)
+        archived.extend(door.flush(0))
+        self.assertEqual([(0.0, 0.0, 0), (99.0, 49.5, 0)], archived)
+
+    def test_corridor_break_archives_previous_point(self):
+        door = SwingingDoor(1)
+        archived = self.feed(door, [0.0, 1.0, 2.0, 3.0, 3.0, 3.0], deviation=0.1)
+        self.assertEqual([(0.0, 0.0, 0), (3.0, 3.0, 0)], archived)
+
+    def test_max_interval(self):
+        door = SwingingDoor(1)
+        archived = self.feed(door, [1.0] * 10, deviation=0.1, max_interval=3)
+        self.assertEqual([0.0, 3.0, 6.0, 9.0], [t for t, _, _ in archived])
+
+    def test_status_change_and_missing_value(self):
+        door = SwingingDoor(1)
+        door.add(0, 0.0, 1.0, 0, 0.1)
+        door.add(0, 1.0, 1.0, 0, 0.1)
+        self.assertEqual(((1.0, 1.0, 0), (2.0, 1.0, -1)), door.add(0, 2.0, 1.0, -1, 0.1))
+        self.assertEqual(((3.0, None, -1),), door.add(0, 3.0, None, -1, 0.1))
+        self.assertEqual(((4.0, 1.0, -1),), door.add(0, 4.0, 1.0, -1, 0.1))
+
+    def test_tags_are_independent(self):
+        door = SwingingDoor(2)
+        door.add(0, 0.0, 1.0, 0, 0.1)
+        self.assertEqual(((0.0, 7.0, 0),), door.add(1, 0.0, 7.0, 0, 0.1))
+        self.assertEqual((), door.add(0, 1.0, 1.0, 0, 0.1))
+
+    def test_reconstruction_error(self):
+        rnd = random.Random(1)
+        values = [math.sin(t / 50) + rnd.gauss(0, 0.005) for t in range(5000)]
+        deviation = 0.02
+        door = SwingingDoor(1)
+        archived = self.feed(door, values, deviation)
+        archived.extend(door.flush(0))
+        self.assertLess(len(archived), len(values) / 10)
+
+        for (t0, v0, _), (t1, v1, _) in zip(archived, archived[1:]):
+            for t in range(int(t0), int(t1) + 1):
+                restored = v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+                self.assertLessEqual(abs(restored - values[t]), 2 * deviation + 1e-9)
+
+
+class AppFlushMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.store_queue = queue.Queue()
+        patcher = mock.patch.multiple(app, tags=self.make_tags(), tag_list=[], connectors={}, tag_table=None,
+                                      tag_triggers={}, TAG_TABLE_ENABLED=False, store_queue=self.store_queue,
+                                      store_batch=ValueBatch(), swinging_door=SwingingDoor(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app.init_tag_table()
+
+    @staticmethod
+    def make_tags():
+        return {'ramp': Tag(name='ramp', type_=TagType.FLOAT, is_log=True, sdt_deviation=0.01)}
+
+    def items(self):
+        items = []
+        while not self.store_queue.empty():
+            items.append(self.store_queue.get_nowait())
+        return items
+
+    def history(self, items):
+        return [(update_time, value) for item in items if ValueBatch.is_batch(item)
+                for _, _, _, update_time, value, is_log in ValueBatch.records_of(item) if is_log]
+
+    def test_reload_flushes_pending_point(self):
+        start = datetime(2026, 10, 18, tzinfo=timezone.utc)
+        times = [start + timedelta(seconds=t) for t in range(10)]
+        with mock.patch('models.tag.datetime') as tag_datetime:
+            tag_datetime.now.side_effect = times
+            for t in range(10):
+                app._set_tag(app.tags['ramp'], t * 0.5, 0)
+        app.flush_store_batch()
+        # на прямой в историю ушла только первая точка
+        self.assertEqual([(times[0].timestamp(), 0.0)], self.history(self.items()))
+
+        # перезагрузка конфигурации посреди прямой
+        app.tags = self.make_tags()
+        app.init_tag_table()
+
+        items = self.items()
+        self.assertEqual([(times[-1].timestamp(), 4.5)], self.history(items))
+        # последняя точка отправлена по прежнему справочнику тегов, до нового
+        self.assertIsInstance(items[-1], app.TagDirectory)
+        self.assertEqual(1, app.swinging_door.size)
+        self.assertEqual((), app.swinging_door.flush(0))
+
+    def test_flush_without_pending_points(self):
+        self.items()
+        app.flush_swinging_door()
+        self.assertEqual([], self.items())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import math
+import unittest
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.extend(['.','..'])
+
+from models.tag import Tag, TagType
+
+
+class TagDeadbandMethods(unittest.TestCase):
+
+    def feed(self, tag, values, step=1.0, status=0):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        logged = []
+        for i, value in enumerate(values):
+            tag.update(value, status)
+            tag.update_time = start + timedelta(seconds=i * step)
+            if tag.need_log():
+                logged.append(value)
+        return logged
+
+    def test_no_compression_logs_every_value(self):
+        tag = Tag(name='t', type_=TagType.FLOAT, is_log=True)
+        self.assertEqual([1.0, 1.0, 1.0], self.feed(tag, [1.0, 1.0, 1.0]))
+
+    def test_not_logged_tag(self):
+        tag = Tag(name='t', type_=TagType.FLOAT, is_log=False, deadband=1)
+        self.assertEqual([], self.feed(tag, [1.0, 5.0]))
+
+    def test_absolute_deadband(self):
+        tag = Tag(name='t', type_=TagType.FLOAT, is_log=True, deadband=0.5)
+        self.assertEqual([10.0, 10.6, 10.0], self.feed(tag, [10.0, 10.3, 10.6, 10.2, 10.0]))
+
+    def test_percent_deadband_of_range(self):
+        tag = Tag(name='t', type_=TagType.FLOAT, is_log=True, min_=0, max_=200, deadband_pct=1)
+        self.assertEqual([100.0, 102.5], self.feed(tag, [100.0, 101.5, 102.5, 101.0]))
+
+    def test_on_change(self):
+        tag = Tag(name='t', type_=TagType.STR, is_log=True, on_change=True, value='a')
+        self.assertEqual(['a', 'b', 'a'], self.feed(tag, ['a', 'a', 'b', 'b', 'a']))
+
+    def test_status_change_is_logged(self):
+        tag = Tag(name='t', type_=TagType.INT, is_log=True, on_change=True)
+        tag.update(1, 0)
+        tag.update_time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.assertTrue(tag.need_log())
+        tag.update(1, -1)
+        self.assertTrue(tag.need_log())
+
+    def test_max_silence_heartbeat(self):
+        tag = Tag(name='t', type_=TagType.FLOAT, is_log=True, deadband=1, max_silence=10)
+        logged = self.feed(tag, [5.0] * 25, step=1.0)
+        self.assertEqual(3, len(logged))
+
+    def test_slow_signal_reduction(self):
+        tag = Tag(name='t', type_=TagType.FLOAT, is_log=True, min_=0, max_=100, deadband_pct=0.5, max_silence=300)
+        values = [50 + 10 * math.sin(i / 600) + 0.05 * math.sin(i * 1.7) for i in range(3600)]
+        logged = self.feed(tag, values)
+        self.assertGreater(len(values) / len(logged), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
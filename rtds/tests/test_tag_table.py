@@ -0,0 +1,68 @@
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from models.tag import Tag, TagType
+from models.tag_table import TagTable
+
+
+class TagTableMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = {}
+        for i, type_ in enumerate([TagType.BOOL, TagType.INT, TagType.FLOAT, TagType.ARRAY, TagType.STR]):
+            tag = Tag(name=f'tag_{i}', type_=type_, value=0 if type_ not in [TagType.ARRAY, TagType.STR] else None)
+            tag.index = i
+            self.tags[tag.name] = tag
+        self.table = TagTable.create(self.tags, 'rtds_tags_test')
+
+    def tearDown(self):
+        self.table.unlink()
+
+    def test_write_read(self):
+        values = [True, 42, 1.5, [1, 2, 3], 'text']
+        for tag, value in zip(self.tags.values(), values):
+            self.table.write(tag.index, tag.type_, 0, value, update_time=100.0)
+        for tag, value in zip(self.tags.values(), values):
+            slot = self.table.read(tag.index)
+            self.assertEqual(value, slot.value)
+            self.assertEqual(tag.type_, slot.type_)
+            self.assertEqual(100.0, slot.update_time)
+            self.assertEqual(0, slot.seq & 1)
+
+    def test_none_value(self):
+        self.table.write(1, TagType.INT, -1, None)
+        slot = self.table.read(1)
+        self.assertIsNone(slot.value)
+        self.assertEqual(-1, slot.status)
+
+    def test_changed(self):
+        seen = [self.table.seq(i) for i in range(self.table.count)]
+        self.assertEqual([], list(self.table.changed(range(self.table.count), seen)))
+        self.table.write(2, TagType.FLOAT, 0, 3.0)
+        changed = list(self.table.changed(range(self.table.count), seen))
+        self.assertEqual([2], [index for index, _ in changed])
+        self.assertEqual([], list(self.table.changed(range(self.table.count), seen)))
+
+    def test_attach(self):
+        self.table.write(1, TagType.INT, 0, 7)
+        table = TagTable.attach('rtds_tags_test')
+        try:
+            self.assertEqual(list(self.tags), table.names)
+            self.assertEqual(7, table.read(1).value)
+            self.assertFalse(table.is_retired)
+            self.table.retire()
+            self.assertTrue(table.is_retired)
+        finally:
+            table.close()
+
+    def test_notify(self):
+        self.assertFalse(self.table.wait(0))
+        self.table.notify()
+        self.table.notify()
+        self.assertTrue(self.table.wait(0))
+        self.assertFalse(self.table.wait(0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import sys
+
+sys.path.extend(['.','..'])
+
+from models.tag import TagType
+from models.value_batch import ValueBatch
+
+
+class ValueBatchMethods(unittest.TestCase):
+
+    def test_round_trip(self):
+        batch = ValueBatch()
+        batch.append(0, TagType.BOOL, 0, True, 1.5, is_log=True)
+        batch.append(1, TagType.INT, 0, -42, 2.5)
+        batch.append(2, TagType.FLOAT, -1, 3.25, 3.5)
+        batch.append(3, TagType.ARRAY, 0, [1, 2, 3], 4.5)
+        batch.append(4, TagType.STR, 0, 'строка', 5.5)
+        batch.append(5, TagType.INT, -1, None, 6.5)
+        self.assertEqual(6, len(batch))
+
+        data = batch.to_bytes()
+        self.assertTrue(ValueBatch.is_batch(data))
+        self.assertEqual([
+            (0, TagType.BOOL, 0, 1.5, True, True),
+            (1, TagType.INT, 0, 2.5, -42, False),
+            (2, TagType.FLOAT, -1, 3.5, 3.25, False),
+            (3, TagType.ARRAY, 0, 4.5, [1, 2, 3], False),
+            (4, TagType.STR, 0, 5.5, 'строка', False),
+            (5, TagType.INT, -1, 6.5, None, False),
+        ], list(ValueBatch.records_of(data)))
+
+    def test_clear(self):
+        batch = ValueBatch()
+        batch.append(0, TagType.STR, 0, 'a', 1.0)
+        batch.clear()
+        self.assertFalse(batch)
+        self.assertEqual([], list(ValueBatch.records_of(batch.to_bytes())))
+
+    def test_is_batch(self):
+        self.assertFalse(ValueBatch.is_batch(b'[]'))
+        self.assertFalse(ValueBatch.is_batch(None))
+
+if __name__ == '__main__':
+    unittest.main()
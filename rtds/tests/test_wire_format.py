@@ -0,0 +1,43 @@
+import json
+import unittest
+import sys
+from datetime import datetime, timezone
+
+sys.path.extend(['.','..'])
+
+from producers import wire_format
+
+
+class WireFormatMethods(unittest.TestCase):
+
+    def test_round_trip(self):
+        tag_time = datetime(2025, 4, 5, 12, 0, 0, 123456)
+        rows = [
+            ('MOTOR_1.RUN', tag_time, 'bool', 0, True, None, None, None),
+            ('COUNTER', tag_time, 'int', 0, None, -42, None, None),
+            ('SENSOR_1.TEMP', tag_time, 'float', -1, None, None, 45.6, None),
+            ('TEXT', tag_time, 'str', 0, None, None, None, 'строка'),
+            ('SENSOR_1.TEMP', tag_time, 'float', -1, None, None, None, None),
+            ('MOTOR_1.RUN', tag_time, 'bool', 0, False, None, None, None),
+            ('ARR', tag_time, 'array', 0, None, None, None, '1,2,3'),
+        ]
+        data = wire_format.encode_batch(rows)
+        self.assertTrue(wire_format.is_binary(data))
+
+        utc_time = tag_time.replace(tzinfo=timezone.utc)
+        self.assertEqual([row[:1] + (utc_time,) + row[2:] for row in rows], wire_format.decode_batch(data))
+
+    def test_empty(self):
+        self.assertEqual([], wire_format.decode_batch(wire_format.encode_batch([])))
+
+    def test_json_is_not_binary(self):
+        self.assertFalse(wire_format.is_binary(json.dumps([{'tg': 'a'}]).encode('utf-8')))
+        self.assertFalse(wire_format.is_binary(json.dumps('[]').encode('utf-8')))
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            wire_format.encode_batch([('a', datetime(2025, 1, 1), 'decimal', 0, None, None, None, '1')])
+
+
+if __name__ == '__main__':
+    unittest.main()